@@ -1,27 +1,186 @@
+"""
+analysis_model.py
+Feature diagnostics: model importances, per-feature mean / variance / missing rate, Pearson
+correlation of every feature with the target, and highly correlated (redundant) feature pairs.
+
+All statistics come from FeatureMoments, a one-pass accumulator of running moments that can be
+updated chunk by chunk and merged (pairwise co-moment updates, Chan et al.). With --streaming the
+raw CSV is read in machine-complete partitions; worker processes build the features of a partition
+(only the model's columns), reduce it to a partial state of a few kilobytes and the parent merges
+the states, so the data never has to fit in memory.
+
+Usage:
+  python analysis_model.py
+  python analysis_model.py --streaming --data_path data/big_fleet.csv --workers 8
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 import joblib
 import pandas as pd
 import numpy as np
-from preprocessing import load_data, basic_cleaning
+from feature_store import load_features
+from preprocessing import iter_machine_partitions, basic_cleaning
 from features import create_rolling_features
 
 MODEL_PATH = "models/best_model.pkl"
 FEATURES_PATH = "models/feature_columns.pkl"
 DATA_PATH = "machine_data_1000.csv"
 HORIZON = 5
+TARGET = "failure_within_horizon"
+REDUNDANT_CORR = 0.95
+
+class FeatureMoments:
+    """
+    Mergeable one-pass statistics over feature columns plus a target.
+    - count / mean / M2 per feature over its non-missing values (mean, variance, missing rate)
+    - mean vector and co-moment matrix of [features, target] with missing values read as 0, the
+      same convention the column loop used, for feature-target and feature-feature correlation
+    States built from disjoint chunks merge into exactly the state of the concatenated data.
+    """
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        d = len(self.columns)
+        self.n = 0
+        self.count = np.zeros(d)
+        self.nm_mean = np.zeros(d)
+        self.nm_m2 = np.zeros(d)
+        self.mean = np.zeros(d + 1)
+        self.comoment = np.zeros((d + 1, d + 1))
+
+    def update(self, X, y):
+        """Fold in a chunk: X (rows x features, NaN = missing), y (rows,)."""
+        other = FeatureMoments(self.columns)
+        X = np.asarray(X, dtype=np.float64)
+        n = len(X)
+        if n == 0:
+            return self
+        other.n = n
+        valid = ~np.isnan(X)
+        other.count = valid.sum(axis=0).astype(float)
+        Z = np.where(valid, X, 0.0)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            other.nm_mean = np.where(other.count > 0, Z.sum(axis=0) / other.count, 0.0)
+        other.nm_m2 = (np.where(valid, X - other.nm_mean, 0.0) ** 2).sum(axis=0)
+        A = np.column_stack([Z, np.asarray(y, dtype=np.float64)])
+        other.mean = A.mean(axis=0)
+        A -= other.mean
+        other.comoment = A.T @ A
+        return self.merge(other)
+
+    def merge(self, other):
+        """Combine with the state of another, disjoint, chunk (in place)."""
+        if other.n == 0:
+            return self
+        if self.n == 0:
+            self.__dict__.update({k: (v.copy() if isinstance(v, np.ndarray) else v) for k, v in other.__dict__.items()})
+            return self
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.comoment += other.comoment + np.outer(delta, delta) * (self.n * other.n / n)
+        self.mean += delta * (other.n / n)
+        count = self.count + other.count
+        nm_delta = other.nm_mean - self.nm_mean
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.nm_m2 += other.nm_m2 + np.where(count > 0, nm_delta ** 2 * self.count * other.count / count, 0.0)
+            self.nm_mean += np.where(count > 0, nm_delta * other.count / count, 0.0)
+        self.count = count
+        self.n = n
+        return self
+
+    def correlation(self):
+        """Pearson correlation matrix of [features, target] (NaN where a column is constant)."""
+        sd = np.sqrt(np.diag(self.comoment))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = self.comoment / np.outer(sd, sd)
+        corr[:, sd == 0] = np.nan
+        corr[sd == 0, :] = np.nan
+        return corr
+
+    def feature_stats(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            variance = np.where(self.count > 1, self.nm_m2 / (self.count - 1), np.nan)
+        return pd.DataFrame({
+            "feature": self.columns,
+            "mean": np.where(self.count > 0, self.nm_mean, np.nan),
+            "variance": variance,
+            "missing_rate": 1 - self.count / max(self.n, 1),
+            "corr": self.correlation()[:-1, -1],
+        })
 
-def main():
-    print("Loading and rebuilding features...")
-    df = load_data(DATA_PATH)
-    dfc = basic_cleaning(df)
-    df_feat = create_rolling_features(dfc, window_sizes=[5,10,20], lag_features=[1,3,5], target_horizon=HORIZON)
+    def redundant_pairs(self, threshold=REDUNDANT_CORR):
+        """Feature pairs with |correlation| >= threshold, strongest first."""
+        corr = self.correlation()[:-1, :-1]
+        i, j = np.triu_indices(len(self.columns), k=1)
+        r = corr[i, j]
+        keep = np.abs(r) >= threshold
+        pairs = pd.DataFrame({"feature_a": np.asarray(self.columns)[i[keep]],
+                              "feature_b": np.asarray(self.columns)[j[keep]], "corr": r[keep]})
+        return pairs.reindex(pairs["corr"].abs().sort_values(ascending=False).index).reset_index(drop=True)
+
+def frame_moments(df, feature_cols, chunk_rows=1_000_000):
+    """FeatureMoments of an in-memory feature frame, a chunk at a time to bound temporaries."""
+    state = FeatureMoments(feature_cols)
+    for start in range(0, len(df), chunk_rows):
+        part = df.iloc[start:start + chunk_rows]
+        state.update(part.reindex(columns=feature_cols).to_numpy(dtype=np.float64), part[TARGET].to_numpy())
+    return state
+
+def _partition_moments(part, feature_cols, horizon):
+    # same window / lag parameters as the cached feature frame, so the same rows are kept
+    feats = create_rolling_features(basic_cleaning(part), window_sizes=[5, 10, 20], lag_features=[1, 3, 5],
+                                    target_horizon=horizon, columns=feature_cols)
+    return frame_moments(feats, feature_cols), len(part)
+
+def stream_moments(path, feature_cols, horizon=HORIZON, workers=None, rows_per_partition=500_000,
+                   chunksize=500_000, presorted=True):
+    """
+    One pass over a raw telemetry CSV: machine-complete partitions are featurized and reduced to
+    FeatureMoments in `workers` processes and merged here. Memory is bounded by the partitions in flight.
+    """
+    workers = workers or os.cpu_count() or 1
+    total = FeatureMoments(feature_cols)
+    t0 = time.perf_counter()
+    rows = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = set()
+
+        def collect(done):
+            nonlocal rows
+            for f in done:
+                state, n = f.result()
+                total.merge(state)
+                rows += n
+            print(f"  {rows:,} rows, {rows / max(time.perf_counter() - t0, 1e-9):,.0f} rows/sec")
+
+        for part in iter_machine_partitions(path, chunksize=chunksize, rows_per_partition=rows_per_partition,
+                                            presorted=presorted):
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            pending.add(pool.submit(_partition_moments, part, feature_cols, horizon))
+        if pending:
+            collect(wait(pending)[0])
+    return total
+
+def main(args):
     feat_cols = joblib.load(FEATURES_PATH)
-    print(f"Rebuilt feature frame shape: {df_feat.shape}")
-    if 'failure_within_horizon' not in df_feat.columns:
-        print("No target column found. Exiting.")
-        return
-    # use numpy arrays to avoid pandas ExtensionArray typing issues
-    y = df_feat['failure_within_horizon'].to_numpy(dtype=int)
-    print(f"Positives: {int(y.sum())} / {len(y)} (rate {y.mean():.3f})")
+    if args.streaming:
+        print(f"Streaming {args.data_path} in machine-complete partitions ({args.workers or os.cpu_count()} workers)...")
+        moments = stream_moments(args.data_path, feat_cols, horizon=HORIZON, workers=args.workers,
+                                 rows_per_partition=args.rows_per_partition, presorted=not args.unsorted)
+    else:
+        print("Loading features (feature cache or rebuild)...")
+        df_feat = load_features(args.data_path, window_sizes=[5,10,20], lag_features=[1,3,5], target_horizon=HORIZON)
+        print(f"Rebuilt feature frame shape: {df_feat.shape}")
+        if TARGET not in df_feat.columns:
+            print("No target column found. Exiting.")
+            return
+        moments = frame_moments(df_feat, feat_cols)
+    positives = moments.mean[-1] * moments.n
+    print(f"Positives: {int(round(positives))} / {moments.n} (rate {moments.mean[-1]:.3f})")
 
     model = joblib.load(MODEL_PATH)
     importances = model.feature_importances_ if hasattr(model, 'feature_importances_') else None
@@ -33,26 +192,34 @@ def main():
     else:
         print("Model does not expose feature_importances_ or mismatch with feature list.")
 
-    # compute Pearson correlation with binary target as a quick diagnostic
-    X = df_feat[feat_cols].fillna(0)
-    corrs = []
-    for c in feat_cols:
-        try:
-            # ensure numeric numpy arrays
-            a = X[c].to_numpy(dtype=float)
-            b = y.astype(float)
-            if np.nanstd(a) == 0 or np.nanstd(b) == 0:
-                corr = np.nan
-            else:
-                corr = np.corrcoef(a, b)[0,1]
-        except Exception:
-            corr = np.nan
-        corrs.append((c, corr))
-    corr_df = pd.DataFrame(corrs, columns=['feature','corr']).dropna()
+    # Pearson correlation with the binary target as a quick diagnostic
+    stats = moments.feature_stats()
+    corr_df = stats[['feature', 'corr']].dropna().copy()
     corr_df['abs_corr'] = corr_df['corr'].abs()
     corr_df = corr_df.sort_values('abs_corr', ascending=False).reset_index(drop=True)
     print("Top 15 features by absolute Pearson correlation with target:")
     print(corr_df.head(15).to_string(index=False))
 
+    missing = stats[stats['missing_rate'] > 0]
+    print(f"Features with missing values: {len(missing)} of {len(stats)}")
+    if len(missing):
+        print(missing.sort_values('missing_rate', ascending=False).head(15)[['feature', 'missing_rate']].to_string(index=False))
+    pairs = moments.redundant_pairs(args.redundant_corr)
+    print(f"Feature pairs with |corr| >= {args.redundant_corr}: {len(pairs)}")
+    print(pairs.head(15).to_string(index=False))
+    stats.to_csv(f"{args.out_dir}/feature_diagnostics.csv", index=False)
+    pairs.to_csv(f"{args.out_dir}/redundant_features.csv", index=False)
+    print(f"Saved feature_diagnostics.csv and redundant_features.csv under {args.out_dir}/")
+
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--data_path", default=DATA_PATH)
+    parser.add_argument("--streaming", action="store_true",
+                        help="one pass over the raw CSV in partitions instead of loading the whole feature frame")
+    parser.add_argument("--workers", type=int, default=None, help="processes for --streaming (default: all cores)")
+    parser.add_argument("--rows_per_partition", type=int, default=500_000)
+    parser.add_argument("--unsorted", action="store_true", help="with --streaming: input is not grouped by machine_id")
+    parser.add_argument("--redundant_corr", type=float, default=REDUNDANT_CORR,
+                        help="report feature pairs correlated at least this strongly")
+    parser.add_argument("--out_dir", default="models")
+    main(parser.parse_args())
@@ -0,0 +1,189 @@
+"""
+batch_score.py
+Offline scoring of raw telemetry files: raw readings -> cleaning -> engineered features -> failure probabilities.
+
+The input CSV is streamed in machine-complete partitions (see preprocessing.iter_machine_partitions),
+which are scored in parallel by a process pool. Every worker opens the model bundle once; random
+forests are scored with the flattened-forest engine straight from the bundle's memory-mapped arrays,
+shared by all workers through the page cache (other models are unpickled per worker). Each partition
+goes to its own output file (Parquet when pyarrow is installed, otherwise gzipped CSV). A partition file only appears once it is
+complete, and `_manifest.json` records the run parameters, so an interrupted run started again with
+the same arguments skips the partitions already written and carries on from there.
+Rows without enough history for the lag features (the first cycles of each machine) get no score,
+as in training.
+
+Usage:
+  python batch_score.py --input data/historian_dump.csv --out scores/ --workers 8
+  python batch_score.py --input data/unsorted.csv --out scores/ --unsorted --spill_dir /scratch
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from preprocessing import iter_machine_partitions, basic_cleaning
+from features import create_rolling_features, parse_feature_plan
+from model_bundle import ModelBundle, BUNDLE_PATH
+from tree_engine import ForestEngine
+from utils import peak_rss_mb
+
+try:
+    import pyarrow  # noqa: F401
+    OUTPUT_FORMAT = "parquet"
+except Exception:
+    OUTPUT_FORMAT = "csv.gz"
+
+logger = logging.getLogger("pm")
+MANIFEST = "_manifest.json"
+ENGINE_CHUNK_ROWS = 8192
+
+# per-worker state, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(bundle_path):
+    bundle = ModelBundle(bundle_path)
+    engine, model = None, None
+    if bundle.has_forest():
+        # the forest's node arrays are memory-mapped from the bundle, so all workers share one copy
+        engine = ForestEngine(bundle.forest_arrays())
+    else:
+        model = bundle.load_model()
+        if hasattr(model, "n_jobs"):
+            model.n_jobs = 1  # parallelism comes from the pool
+    sensors, windows, lags = parse_feature_plan(bundle.feature_cols)
+    _worker.update(bundle=bundle, engine=engine, model=model, scaler=bundle.load_object("scaler"),
+                   feature_cols=bundle.feature_cols, windows=windows, lags=lags)
+
+
+def _predict_proba(X):
+    if _worker["engine"] is None:
+        return _worker["model"].predict_proba(_worker["scaler"].transform(X))[:, 1]
+    # the engine takes raw features (scaler folded in); chunks bound its rows x trees node arrays
+    return np.concatenate([_worker["engine"].predict_proba(X[a:a + ENGINE_CHUNK_ROWS])
+                           for a in range(0, len(X), ENGINE_CHUNK_ROWS)])
+
+
+def partition_path(out_dir, index, fmt=OUTPUT_FORMAT):
+    return Path(out_dir) / f"part-{index:05d}.{fmt}"
+
+
+def score_partition(df, index, out_dir, fmt=OUTPUT_FORMAT):
+    """Clean, featurize and score one machine-complete partition; returns (index, rows_in, rows_scored, seconds, peak_rss_mb)."""
+    t0 = time.perf_counter()
+    rows_in = len(df)
+    if "failure" not in df.columns:
+        # historian dumps carry no labels; the label columns are dropped below
+        df = df.assign(failure=0)
+    # partitions come from the float32 loader; features are built in float64 as in training, so
+    # rolling statistics near a split threshold land on the same side
+    sensors = [c for c in df.columns if c.startswith("sensor_")]
+    df = df.astype({c: np.float64 for c in sensors})
+    # only the rolling/lag/delta columns the model was trained on are computed
+    feats = create_rolling_features(basic_cleaning(df), window_sizes=_worker["windows"] or [5],
+                                    lag_features=_worker["lags"] or [1], columns=_worker["feature_cols"])
+    X = feats.reindex(columns=_worker["feature_cols"], fill_value=0).to_numpy(dtype=np.float64)
+    probs = _predict_proba(X) if len(X) else np.empty(0)
+    out = pd.DataFrame({
+        "machine_id": feats["machine_id"].to_numpy(),
+        "cycle": feats["cycle"].to_numpy(),
+        "probability": probs,
+        "prediction": (probs >= 0.5).astype(np.int8),
+    })
+    path = partition_path(out_dir, index, fmt)
+    tmp = path.with_name(path.name + f".tmp{os.getpid()}")
+    if fmt == "parquet":
+        out.to_parquet(tmp, index=False)
+    else:
+        out.to_csv(tmp, index=False, compression="gzip")
+    # the rename publishes the partition; a file that exists is always complete
+    os.replace(tmp, path)
+    return index, rows_in, len(out), time.perf_counter() - t0, peak_rss_mb()
+
+
+def _check_manifest(out_dir, params, resume):
+    path = Path(out_dir) / MANIFEST
+    if path.exists():
+        previous = json.loads(path.read_text())
+        if previous != params and resume:
+            raise ValueError(f"{out_dir} holds output from a run with different parameters; "
+                             f"use a new --out or --no_resume to overwrite")
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(params, indent=2))
+
+
+def run(input_path, out_dir, bundle_path=BUNDLE_PATH, workers=None, rows_per_partition=250_000,
+        chunksize=500_000, presorted=True, spill_dir=None, resume=True, fmt=OUTPUT_FORMAT):
+    """
+    Score `input_path` into `out_dir`/part-NNNNN.<fmt>. Returns a summary dict (rows, seconds, rows_per_sec, ...).
+    Partition numbering is deterministic for a given input and parameters, which is what makes resuming safe.
+    """
+    workers = workers or os.cpu_count() or 1
+    stat = os.stat(input_path)
+    bundle_stat = os.stat(bundle_path)
+    params = {
+        "input": str(Path(input_path).resolve()), "input_size": stat.st_size, "input_mtime_ns": stat.st_mtime_ns,
+        "bundle": str(Path(bundle_path).resolve()), "bundle_mtime_ns": bundle_stat.st_mtime_ns,
+        "rows_per_partition": rows_per_partition, "chunksize": chunksize, "presorted": presorted, "format": fmt,
+    }
+    _check_manifest(out_dir, params, resume)
+    if not resume:
+        for p in Path(out_dir).glob(f"part-*.{fmt}"):
+            p.unlink()
+
+    t0 = time.perf_counter()
+    done = {"partitions": 0, "skipped": 0, "rows_in": 0, "rows_scored": 0, "worker_peak_rss_mb": 0.0}
+
+    def collect(futures):
+        for f in futures:
+            index, rows_in, rows_scored, seconds, rss = f.result()
+            done["partitions"] += 1
+            done["rows_in"] += rows_in
+            done["rows_scored"] += rows_scored
+            done["worker_peak_rss_mb"] = max(done["worker_peak_rss_mb"], rss)
+            elapsed = time.perf_counter() - t0
+            print(f"part {index:05d}: {rows_in:,} rows in {seconds:.1f}s | total {done['rows_in']:,} rows, "
+                  f"{done['rows_in'] / max(elapsed, 1e-9):,.0f} rows/sec")
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(str(bundle_path),)) as pool:
+        pending = set()
+        partitions = iter_machine_partitions(input_path, chunksize=chunksize, rows_per_partition=rows_per_partition,
+                                             presorted=presorted, spill_dir=spill_dir)
+        for index, part in enumerate(partitions):
+            if resume and partition_path(out_dir, index, fmt).exists():
+                done["skipped"] += 1
+                continue
+            # at most two partitions per worker in flight keeps the parent's memory bounded
+            if len(pending) >= 2 * workers:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                collect(finished)
+            pending.add(pool.submit(score_partition, part, index, out_dir, fmt))
+        collect(wait(pending)[0])
+
+    elapsed = time.perf_counter() - t0
+    summary = {**done, "seconds": elapsed, "rows_per_sec": done["rows_in"] / max(elapsed, 1e-9),
+               "parent_peak_rss_mb": peak_rss_mb()}
+    print(f"Scored {done['rows_in']:,} rows in {done['partitions']} partitions ({done['skipped']} already done) "
+          f"in {elapsed:.1f}s: {summary['rows_per_sec']:,.0f} rows/sec")
+    return summary
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input", required=True, help="raw telemetry CSV (machine_id, cycle, sensor_*)")
+    parser.add_argument("--out", required=True, help="output directory for part-NNNNN files")
+    parser.add_argument("--bundle", default=BUNDLE_PATH, help="model bundle (python resave_artifacts.py --bundle)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--rows_per_partition", type=int, default=250_000)
+    parser.add_argument("--chunksize", type=int, default=500_000, help="CSV rows read per chunk")
+    parser.add_argument("--unsorted", action="store_true", help="input is not grouped by machine_id; hash-spill it first")
+    parser.add_argument("--spill_dir", default=None, help="where to spill with --unsorted (default: system temp)")
+    parser.add_argument("--no_resume", action="store_true", help="rescore every partition")
+    args = parser.parse_args()
+    run(args.input, args.out, bundle_path=args.bundle, workers=args.workers, rows_per_partition=args.rows_per_partition,
+        chunksize=args.chunksize, presorted=not args.unsorted, spill_dir=args.spill_dir, resume=not args.no_resume)
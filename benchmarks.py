@@ -0,0 +1,235 @@
+"""
+benchmarks.py
+Offline micro-benchmarks for the data, training and inference hot paths.
+
+For each fleet size a dataset is generated with simulate_data.generate_dataset (kept in --data_dir
+between runs) and the suite times load_data, basic_cleaning, create_rolling_features, scaler
+fit/transform, a fixed RandomForest fit, and serve_model.scale_and_predict at batch sizes 1..10k.
+Every case records the median / min wall time over --repeat runs, rows/sec and peak memory
+(peak RSS, reset before each case on Linux so the delta belongs to that case).
+
+Results go to a JSON file. With --compare, the new run is checked against a stored baseline:
+cases that got slower (or used more memory) beyond --tolerance are listed and the exit code is 1.
+
+Usage:
+  python benchmarks.py --sizes small,medium --out bench/results.json
+  python benchmarks.py --sizes small --out bench/new.json --compare bench/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import sklearn
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+from simulate_data import generate_dataset
+from preprocessing import load_data, basic_cleaning
+from features import create_rolling_features
+from tree_engine import ForestEngine
+from utils import peak_rss_mb
+
+# name -> (machines, cycles per machine)
+FLEET_SIZES = {
+    "tiny": (5, 300),
+    "small": (20, 1000),
+    "medium": (100, 2000),
+    "large": (500, 2000),
+}
+BATCH_SIZES = (1, 10, 100, 1000, 10000)
+# a timing change below these is treated as noise, whatever the ratio
+MIN_SECONDS_DELTA = 0.001
+MIN_MB_DELTA = 16.0
+
+
+def _current_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1e3
+    except OSError:
+        pass
+    return peak_rss_mb()
+
+
+def _reset_peak_rss():
+    # Linux only: writing 5 to clear_refs resets the VmHWM high-water mark read by peak_rss_mb()
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def measure(name, fn, rows, repeat=3, **labels):
+    """Run fn() `repeat` times; returns (result dict, last return value)."""
+    reset = _reset_peak_rss()
+    rss_before = _current_rss_mb()
+    times = []
+    out = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        times.append(time.perf_counter() - t0)
+    peak = peak_rss_mb()
+    median = float(np.median(times))
+    result = {
+        "name": name, **labels, "rows": int(rows), "repeat": repeat,
+        "median_s": median, "min_s": float(min(times)),
+        "rows_per_sec": rows / median if median > 0 else None,
+        "peak_rss_mb": peak,
+        # without a resettable high-water mark the delta would include earlier cases
+        "peak_delta_mb": max(0.0, peak - rss_before) if reset and peak is not None else None,
+    }
+    print(f"{name:<24} {labels.get('size', ''):<7} {str(labels.get('batch', '')):>6} {rows:>10,} rows "
+          f"{median * 1000:10.2f} ms  {result['rows_per_sec'] or 0:>14,.0f} rows/s  peak {peak or 0:8.0f} MB")
+    return result, out
+
+
+def _predict_cases(model, scaler, feature_cols, X_df, repeat):
+    import serve_model
+    # score through the real serving function with an artifact set built in memory
+    serve_model.artifacts = serve_model.ArtifactSet(scaler=scaler, feature_cols=feature_cols, signature=None,
+                                                    model=model, engine=ForestEngine.from_model(model, scaler))
+    results = []
+    for batch in BATCH_SIZES:
+        if batch > len(X_df):
+            break
+        rows = X_df.iloc[:batch]
+        n = max(repeat, min(200, 20_000 // batch))
+        res, _ = measure("scale_and_predict", lambda: serve_model.scale_and_predict(rows), batch, repeat=n,
+                         batch=batch)
+        results.append(res)
+    return results
+
+
+def run_suite(sizes=("small",), data_dir="bench/data", repeat=3, seed=42):
+    results = []
+    for size in sizes:
+        machines, cycles = FLEET_SIZES[size]
+        path = Path(data_dir) / f"fleet_{size}_{seed}.csv"
+        if not path.exists():
+            generate_dataset(n_machines=machines, cycles_per_machine=cycles, out_path=path, seed=seed)
+        n = machines * cycles
+        lab = {"size": size}
+
+        res, raw = measure("load_data", lambda: load_data(path), n, repeat, **lab)
+        results.append(res)
+        res, clean = measure("basic_cleaning", lambda: basic_cleaning(raw), n, repeat, **lab)
+        results.append(res)
+        res, feats = measure("create_rolling_features", lambda: create_rolling_features(clean), n, repeat, **lab)
+        results.append(res)
+
+        feature_cols = [c for c in feats.columns if c.startswith("sensor_")]
+        X_df = feats[feature_cols]
+        # the server hands the scaler a bare float matrix, so fit it on one too
+        X = X_df.to_numpy(dtype=float)
+        y = feats["failure_within_horizon"].to_numpy()
+        res, scaler = measure("scaler_fit", lambda: StandardScaler().fit(X), len(X), repeat, **lab)
+        results.append(res)
+        res, X_scaled = measure("scaler_transform", lambda: scaler.transform(X), len(X), repeat, **lab)
+        results.append(res)
+        # fixed, modest forest so fit time tracks the data path rather than the search
+        res, model = measure(
+            "model_fit",
+            lambda: RandomForestClassifier(n_estimators=50, max_depth=10, random_state=0, n_jobs=-1).fit(X_scaled, y),
+            len(X), 1, **lab)
+        results.append(res)
+        for r in _predict_cases(model, scaler, feature_cols, X_df, repeat):
+            results.append({**r, "size": size})
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def environment():
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": _git_commit(),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def _key(r):
+    return (r["name"], r.get("size"), r.get("batch"))
+
+
+def compare(results, baseline, tolerance=0.25):
+    """
+    Cases slower (median_s) or hungrier (peak_delta_mb) than the baseline by more than `tolerance`
+    (relative) and the noise floors. Returns a list of regression dicts.
+    """
+    base = {_key(r): r for r in baseline}
+    regressions = []
+    for r in results:
+        b = base.get(_key(r))
+        if b is None:
+            continue
+        if r["median_s"] > b["median_s"] * (1 + tolerance) and r["median_s"] - b["median_s"] > MIN_SECONDS_DELTA:
+            regressions.append({"case": _key(r), "metric": "median_s", "baseline": b["median_s"], "new": r["median_s"],
+                                "ratio": r["median_s"] / b["median_s"]})
+        rm, bm = r.get("peak_delta_mb"), b.get("peak_delta_mb")
+        if rm is not None and bm is not None and rm > bm * (1 + tolerance) and rm - bm > MIN_MB_DELTA:
+            regressions.append({"case": _key(r), "metric": "peak_delta_mb", "baseline": bm, "new": rm,
+                                "ratio": rm / bm if bm else None})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="small", help=f"comma-separated fleet sizes: {', '.join(FLEET_SIZES)}")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--data_dir", default="bench/data", help="generated datasets are cached here")
+    parser.add_argument("--out", default="bench/results.json")
+    parser.add_argument("--compare", default=None, help="baseline results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown before flagging")
+    args = parser.parse_args(argv)
+
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in FLEET_SIZES]
+    if unknown:
+        parser.error(f"unknown sizes {unknown}; choose from {list(FLEET_SIZES)}")
+    results = run_suite(sizes, data_dir=args.data_dir, repeat=args.repeat)
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+    print(f"Wrote {len(results)} results to {args.out}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if not regressions:
+            print(f"No regressions against {args.compare} (tolerance {args.tolerance:.0%})")
+            return 0
+        print(f"{len(regressions)} regression(s) against {args.compare}:")
+        for r in regressions:
+            name, size, batch = r["case"]
+            where = f"{name} [{size}{f', batch {batch}' if batch else ''}]"
+            print(f"  {where:<44} {r['metric']:<14} {r['baseline']:.4g} -> {r['new']:.4g}"
+                  + (f" ({r['ratio']:.2f}x)" if r["ratio"] else ""))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
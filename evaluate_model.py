@@ -10,8 +10,7 @@ from sklearn.metrics import classification_report, confusion_matrix, roc_auc_sco
 import matplotlib.pyplot as plt
 import seaborn as sns
 import shap
-from preprocessing import load_data, basic_cleaning
-from features import create_rolling_features
+from feature_store import load_features
 from sklearn.model_selection import GroupShuffleSplit
 
 def load_artifacts():
@@ -21,9 +20,7 @@ def load_artifacts():
     return model, scaler, feature_cols
 
 def prepare_holdout(df_path, horizon=5, test_size=0.2):
-    df = load_data(df_path)
-    df = basic_cleaning(df)
-    df = create_rolling_features(df, window_sizes=[5,10,20], lag_features=[1,3,5], target_horizon=horizon)
+    df = load_features(df_path, window_sizes=[5,10,20], lag_features=[1,3,5], target_horizon=horizon)
     # split by machine for holdout
     machines = df['machine_id'].unique()
     gss = GroupShuffleSplit(n_splits=1, test_size=test_size, random_state=42)
@@ -0,0 +1,201 @@
+"""
+explainer.py
+Per-prediction feature contributions for the /explain endpoint.
+
+Methods, from most to least exact:
+- tree_shap:  exact TreeSHAP values from `shap.TreeExplainer` (optional dependency), built once per
+              artifact set, on its first /explain call.
+- path:       path attribution on the flattened forest (ForestEngine.contributions): each split's
+              change in positive-class probability is credited to its feature. Contributions plus
+              the base value add up to the predicted probability, and it costs about two predictions.
+- occlusion:  for models without a forest engine when shap is missing: each feature in turn is set
+              to its training mean (the scaler's mean_) and the drop in probability is its
+              contribution. One batched predict_proba over rows x features; contributions do not add up.
+
+Latency budget: rows are explained exactly in chunks on a thread pool, as many as the running
+estimate of the exact cost says fit in the budget on the pool threads that are free (after a cold
+start, one chunk per free thread). Rows that do not fit, and chunks still running when the budget
+runs out, are explained with the cheaper method (path when a forest engine is available, otherwise
+occlusion). Every explanation reports the method that produced it.
+
+Chunks that already started cannot be stopped, so an abandoned chunk finishes in the background
+after its request has returned: at most EXPLAIN_THREADS chunks of EXPLAIN_CHUNK_ROWS rows. Those
+threads count as busy, and while the pool is fully busy new requests skip the exact method rather
+than queueing behind it.
+"""
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import numpy as np
+
+try:
+    import shap
+except Exception:
+    shap = None  # type: ignore
+
+logger = logging.getLogger("pm")
+
+# set to 0 to never build the exact explainer (e.g. to keep artifact loads fast)
+EXPLAIN_EXACT = os.environ.get("EXPLAIN_EXACT", "1") not in ("0", "false", "")
+EXPLAIN_THREADS = int(os.environ.get("EXPLAIN_THREADS", min(4, os.cpu_count() or 1)))
+EXPLAIN_CHUNK_ROWS = int(os.environ.get("EXPLAIN_CHUNK_ROWS", 16))
+
+_pool = None
+_pool_lock = threading.Lock()
+# exact chunks submitted to the pool and not yet finished or cancelled, across all requests
+_outstanding = 0
+
+
+def _get_pool():
+    # created on first use, so each forked server worker gets its own threads
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=EXPLAIN_THREADS, thread_name_prefix="explain")
+        return _pool
+
+
+def _chunk_done(_future):
+    global _outstanding
+    with _pool_lock:
+        _outstanding -= 1
+
+
+def _free_threads():
+    with _pool_lock:
+        return max(0, EXPLAIN_THREADS - _outstanding)
+
+
+def _submit(fn, *args):
+    global _outstanding
+    pool = _get_pool()
+    with _pool_lock:
+        _outstanding += 1
+    future = pool.submit(fn, *args)
+    future.add_done_callback(_chunk_done)
+    return future
+
+
+class Explainer:
+    """
+    Contributions for one artifact set.
+    model_getter: returns the fitted model (ArtifactSet.model is lazy for bundles)
+    """
+
+    def __init__(self, scaler, feature_cols, engine=None, model_getter=None, tree_explainer=None):
+        self.scaler = scaler
+        self.feature_cols = list(feature_cols)
+        self.engine = engine
+        self.model_getter = model_getter
+        self.tree_explainer = tree_explainer
+        self.exact_method = "tree_shap" if tree_explainer is not None else None
+        self.cheap_method = "path" if engine is not None else "occlusion"
+        # running estimate of exact seconds per row, for deciding up front what fits the budget
+        self._exact_row_s = None
+        self._estimate_lock = threading.Lock()
+
+    @classmethod
+    def build(cls, scaler, feature_cols, engine=None, model_getter=None, exact=EXPLAIN_EXACT):
+        tree_explainer = None
+        if exact and shap is not None and model_getter is not None:
+            try:
+                t0 = time.perf_counter()
+                tree_explainer = shap.TreeExplainer(model_getter())
+                logger.info(f"TreeSHAP explainer built in {time.perf_counter() - t0:.2f}s")
+            except Exception as e:
+                logger.warning(f"No exact explainer for this model ({e}); /explain uses the approximation")
+        return cls(scaler, feature_cols, engine=engine, model_getter=model_getter, tree_explainer=tree_explainer)
+
+    def _exact(self, X):
+        t0 = time.perf_counter()
+        values = self.tree_explainer.shap_values(self.scaler.transform(X), check_additivity=False)
+        # binary classifiers: a [negative, positive] list, or a (rows, features, classes) array
+        if isinstance(values, list):
+            values = values[-1]
+        values = np.asarray(values)
+        if values.ndim == 3:
+            values = values[:, :, -1]
+        base = float(np.atleast_1d(self.tree_explainer.expected_value)[-1])
+        per_row = (time.perf_counter() - t0) / max(len(X), 1)
+        with self._estimate_lock:
+            self._exact_row_s = per_row if self._exact_row_s is None else 0.8 * self._exact_row_s + 0.2 * per_row
+        return values, np.full(len(X), base)
+
+    def _predict(self, X):
+        if self.engine is not None:
+            return self.engine.predict_proba(X)
+        return self.model_getter().predict_proba(self.scaler.transform(X))[:, 1]
+
+    def _cheap(self, X):
+        if self.engine is not None:
+            contrib, bias = self.engine.contributions(X)
+            return contrib, np.full(len(X), bias)
+        n, f = X.shape
+        mean = np.asarray(self.scaler.mean_, dtype=np.float64)
+        occluded = np.repeat(X, f, axis=0)
+        cols = np.tile(np.arange(f), n)
+        occluded[np.arange(n * f), cols] = mean[cols]
+        p = self._predict(np.vstack([X, mean[None, :], occluded]))
+        contrib = p[:n, None] - p[n + 1:].reshape(n, f)
+        return contrib, np.full(n, p[n])
+
+    def explain(self, X, budget_s=None):
+        """
+        X: raw feature matrix in feature_cols order.
+        returns (contributions (rows x features), base values (rows,), method per row)
+        """
+        X = np.asarray(X, dtype=np.float64)
+        n = len(X)
+        contrib = np.zeros(X.shape)
+        base = np.zeros(n)
+        methods = np.array([self.cheap_method] * n, dtype=object)
+        cheap_rows = np.ones(n, dtype=bool)
+        if self.tree_explainer is not None and n and budget_s != 0:
+            t0 = time.perf_counter()
+            n_exact = n
+            if budget_s is not None:
+                free = _free_threads()
+                with self._estimate_lock:
+                    row_s = self._exact_row_s
+                if row_s:
+                    n_exact = min(n, int(budget_s * free / row_s))
+                else:
+                    # cold start: no estimate yet, so try one chunk per free thread
+                    n_exact = min(n, free * EXPLAIN_CHUNK_ROWS)
+            bounds = [(a, min(a + EXPLAIN_CHUNK_ROWS, n_exact)) for a in range(0, n_exact, EXPLAIN_CHUNK_ROWS)]
+            futures = {_submit(self._exact, X[a:b]): (a, b) for a, b in bounds}
+            done, not_done = wait(futures, timeout=None if budget_s is None else max(0.0, budget_s - (time.perf_counter() - t0)))
+            for f in not_done:
+                f.cancel()
+            for f in done:
+                a, b = futures[f]
+                try:
+                    contrib[a:b], base[a:b] = f.result()
+                except Exception:
+                    logger.exception("Exact explanation failed; using the approximation for these rows")
+                    continue
+                methods[a:b] = self.exact_method
+                cheap_rows[a:b] = False
+        if cheap_rows.any():
+            contrib[cheap_rows], base[cheap_rows] = self._cheap(X[cheap_rows])
+        return contrib, base, methods.tolist()
+
+    def top_k(self, X, contrib, base, methods, probs, k=5):
+        """JSON-ready explanations: the k largest |contributions| per row, strongest first."""
+        k = max(1, min(int(k), len(self.feature_cols)))
+        order = np.argsort(-np.abs(contrib), axis=1, kind="stable")[:, :k]
+        out = []
+        for i in range(len(contrib)):
+            # missing inputs are reported as null (NaN is not valid JSON)
+            values = [None if np.isnan(v) else float(v) for v in X[i]]
+            out.append({
+                "probability": float(probs[i]),
+                "prediction": int(probs[i] >= 0.5),
+                "base_value": float(base[i]),
+                "method": methods[i],
+                "contributions": [{"feature": self.feature_cols[j], "value": values[j],
+                                   "contribution": float(contrib[i, j])} for j in order[i]],
+            })
+        return out
@@ -0,0 +1,169 @@
+"""
+feature_store.py
+Content-addressed on-disk cache for engineered feature frames.
+
+The train / evaluate / analysis scripts all run load_data -> basic_cleaning -> create_rolling_features
+on the same CSV with the same parameters. `load_features` keys the resulting frame by the SHA-256 of the
+input file plus the feature parameters, stores it as one `.npy` file per column and, on a cache hit,
+returns a DataFrame backed by read-only memory-mapped arrays instead of recomputing it.
+The cache directory is trimmed to `max_bytes`, evicting the least recently used entries first.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from preprocessing import load_data, basic_cleaning
+from features import create_rolling_features
+
+logger = logging.getLogger("pm")
+
+CACHE_DIR = Path(os.environ.get("FEATURE_CACHE_DIR", "cache/features"))
+CACHE_MAX_BYTES = int(os.environ.get("FEATURE_CACHE_MAX_BYTES", 5 * 1024 ** 3))
+# bump when the cleaning / feature code (or the on-disk format) changes in a way that alters its output
+FEATURE_VERSION = 3
+
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cache_key(path, window_sizes, lag_features, target_horizon):
+    params = {
+        "file": file_digest(path),
+        "window_sizes": list(window_sizes),
+        "lag_features": list(lag_features),
+        "target_horizon": target_horizon if np.isscalar(target_horizon) else list(target_horizon),
+        "version": FEATURE_VERSION,
+    }
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def save_frame(df, entry_dir):
+    """
+    Write `df` as one .npy per column plus meta.json. Non-numeric columns are stored as int32 codes
+    plus their categories (strings in meta.json, typed values in a .npy); columns of other objects are pickled.
+    """
+    entry_dir = Path(entry_dir)
+    tmp_dir = entry_dir.with_name(entry_dir.name + f".tmp{os.getpid()}")
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    columns = []
+    for i, col in enumerate(df.columns):
+        s = df[col]
+        fname = f"c{i}.npy"
+        if pd.api.types.is_numeric_dtype(s.dtype) and not isinstance(s.dtype, pd.CategoricalDtype):
+            np.save(tmp_dir / fname, s.to_numpy())
+            columns.append({"name": col, "file": fname, "dtype": str(s.dtype)})
+        else:
+            # missing values get code -1, mapped back to NaN by load_frame
+            codes, cats = pd.factorize(s, use_na_sentinel=True)
+            entry = {"name": col, "file": fname, "dtype": str(s.dtype)}
+            if all(isinstance(c, str) for c in cats):
+                entry["categories"] = list(cats)
+            elif cats.dtype.kind in "biufmM" and not isinstance(s.dtype, pd.CategoricalDtype):
+                # typed categories (e.g. timestamps) keep their dtype in a .npy of their own
+                entry["categories_file"] = f"c{i}_categories.npy"
+                np.save(tmp_dir / entry["categories_file"], cats.to_numpy())
+            else:
+                # mixed / non-string objects: no faithful column encoding, so the column is pickled
+                entry["file"] = f"c{i}.pkl"
+                s.to_pickle(tmp_dir / entry["file"])
+                columns.append(entry)
+                continue
+            np.save(tmp_dir / fname, codes.astype(np.int32))
+            columns.append(entry)
+    np.save(tmp_dir / "index.npy", df.index.to_numpy())
+    with open(tmp_dir / "meta.json", "w") as f:
+        json.dump({"columns": columns, "rows": len(df)}, f)
+    # publish atomically so concurrent readers never see a half-written entry
+    try:
+        os.replace(tmp_dir, entry_dir)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def load_frame(entry_dir):
+    """Rebuild a frame written by `save_frame`; numeric columns stay memory-mapped (read-only)."""
+    entry_dir = Path(entry_dir)
+    with open(entry_dir / "meta.json") as f:
+        meta = json.load(f)
+    data = {}
+    for c in meta["columns"]:
+        if c["file"].endswith(".pkl"):
+            data[c["name"]] = pd.read_pickle(entry_dir / c["file"]).reset_index(drop=True)
+            continue
+        arr = np.load(entry_dir / c["file"], mmap_mode="r")
+        if "categories" in c:
+            # NaN appended last, so the -1 code of a missing value picks it
+            cats = np.asarray(c["categories"] + [np.nan], dtype=object)
+            data[c["name"]] = pd.Series(cats[arr], dtype=c["dtype"])
+        elif "categories_file" in c:
+            cats = np.load(entry_dir / c["categories_file"])
+            data[c["name"]] = pd.Series(pd.Categorical.from_codes(arr, categories=cats)).astype(c["dtype"])
+        else:
+            # plain ndarray view over the mapping, so the frame behaves like a freshly built one
+            data[c["name"]] = arr.view(np.ndarray)
+    index = pd.Index(np.load(entry_dir / "index.npy"))
+    df = pd.DataFrame(data, copy=False)
+    df.index = index
+    return df
+
+
+def _entry_size(entry_dir):
+    return sum(p.stat().st_size for p in Path(entry_dir).iterdir())
+
+
+def evict(cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, keep=None):
+    """Delete least recently used entries until the cache fits in `max_bytes` (never deletes `keep`)."""
+    cache_dir = Path(cache_dir)
+    if not cache_dir.exists():
+        return
+    entries = [d for d in cache_dir.iterdir() if (d / "meta.json").exists()]
+    sizes = {d: _entry_size(d) for d in entries}
+    total = sum(sizes.values())
+    for d in sorted(entries, key=lambda d: (d / "meta.json").stat().st_mtime):
+        if total <= max_bytes:
+            break
+        if keep is not None and d.name == keep:
+            continue
+        logger.info(f"Evicting feature cache entry {d.name} ({sizes[d] / 1e6:.1f} MB)")
+        shutil.rmtree(d, ignore_errors=True)
+        total -= sizes[d]
+
+
+def load_features(path, window_sizes=[5, 10, 20], lag_features=[1, 3, 5], target_horizon=5,
+                  cache_dir=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, use_cache=True):
+    """
+    Engineered feature frame for the raw telemetry CSV at `path`, served from the cache when possible.
+    Same result as create_rolling_features(basic_cleaning(load_data(path)), ...).
+    """
+    if not use_cache:
+        return create_rolling_features(basic_cleaning(load_data(path)), window_sizes=window_sizes,
+                                       lag_features=lag_features, target_horizon=target_horizon)
+    t0 = time.perf_counter()
+    key = cache_key(path, window_sizes, lag_features, target_horizon)
+    entry_dir = Path(cache_dir) / key
+    if (entry_dir / "meta.json").exists():
+        try:
+            df = load_frame(entry_dir)
+            # refresh the LRU stamp used by eviction
+            os.utime(entry_dir / "meta.json")
+            logger.info(f"Feature cache hit {key} for {path}: {df.shape} in {time.perf_counter() - t0:.2f}s")
+            return df
+        except Exception:
+            logger.exception(f"Feature cache entry {key} unreadable, rebuilding")
+            shutil.rmtree(entry_dir, ignore_errors=True)
+    logger.info(f"Feature cache miss {key} for {path}, building features")
+    df = create_rolling_features(basic_cleaning(load_data(path)), window_sizes=window_sizes,
+                                 lag_features=lag_features, target_horizon=target_horizon)
+    save_frame(df, entry_dir)
+    evict(cache_dir, max_bytes, keep=key)
+    return df
@@ -0,0 +1,308 @@
+"""
+load_test.py
+Localhost load generator for the /predict endpoint, with latency SLO checks.
+
+Starts serve_model.py (--server dev) or serve_production.py (--server production) on 127.0.0.1,
+waits for /health, then drives /predict for --duration seconds from --concurrency client threads,
+each holding a keep-alive connection. A --batch_fraction of the requests carry --batch_size rows,
+the rest a single row; feature names come from /model/info.
+
+With --rate the load is open-loop: requests are scheduled at a fixed rate and latency is measured
+from the scheduled send time, so a stalled server is charged for the queue it causes instead of
+quietly lowering the offered load. Without --rate every thread sends back to back (closed loop),
+which measures peak throughput.
+
+The report gives throughput, error rate and p50/p95/p99/max latency per payload kind. The exit
+code is 1 when an SLO (--slo_p95_ms, --slo_p99_ms, --max_error_rate) is missed. Nothing leaves
+localhost; use --url to drive a server you started yourself on this machine.
+
+Usage:
+  python load_test.py --server production --workers 4 --threads 8 --concurrency 32 --duration 30
+  python load_test.py --server dev --rate 200 --batch_fraction 0.2 --batch_size 100 --slo_p99_ms 50
+  python load_test.py --url http://127.0.0.1:5000 --rate 500 --out load_report.json
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+import numpy as np
+
+HERE = Path(__file__).resolve().parent
+LOCAL_HOSTS = ("127.0.0.1", "localhost", "::1")
+
+
+def start_server(kind, port, workers=1, threads=4, log_path=None):
+    """Start the dev or production server on 127.0.0.1:port; output goes to log_path (or is discarded)."""
+    env = {**os.environ, "PORT": str(port), "HOST": "127.0.0.1"}
+    if kind == "dev":
+        cmd = [sys.executable, str(HERE / "serve_model.py")]
+    else:
+        cmd = [sys.executable, str(HERE / "serve_production.py"), "--host", "127.0.0.1", "--port", str(port),
+               "--workers", str(workers), "--threads", str(threads)]
+    # a file rather than a pipe: nobody reads the pipe during the run, and a full one blocks the server
+    log = open(log_path, "wb") if log_path else subprocess.DEVNULL
+    return subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, env=env, cwd=HERE)
+
+
+def stop_server(proc, timeout=10.0):
+    proc.terminate()
+    try:
+        proc.wait(timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def _get_json(host, port, path, timeout=5.0):
+    conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        conn.request("GET", path)
+        resp = conn.getresponse()
+        return resp.status, json.loads(resp.read() or b"null")
+    finally:
+        conn.close()
+
+
+def wait_for_health(host, port, timeout=60.0, proc=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"Server exited with code {proc.returncode} before becoming healthy")
+        try:
+            status, body = _get_json(host, port, "/health", timeout=2.0)
+            if status == 200:
+                return body
+        except (OSError, http.client.HTTPException, ValueError):
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Server did not become healthy within {timeout:.0f}s")
+
+
+def make_payloads(feature_cols, batch_size, n_variants=64, seed=0):
+    """Pre-encoded request bodies (single row and batch), so JSON encoding stays off the measured path."""
+    rng = np.random.default_rng(seed)
+
+    def row():
+        return {c: round(float(v), 4) for c, v in zip(feature_cols, rng.normal(0, 1, len(feature_cols)))}
+
+    single = [json.dumps(row()).encode() for _ in range(n_variants)]
+    batch = [json.dumps([row() for _ in range(batch_size)]).encode() for _ in range(max(1, n_variants // 8))]
+    return single, batch
+
+
+class _Client(threading.Thread):
+    """One keep-alive connection; takes send slots from a shared schedule and records (kind, latency, ok)."""
+
+    def __init__(self, host, port, schedule, single, batch, batch_fraction, seed, timeout):
+        super().__init__(daemon=True)
+        self.host, self.port, self.timeout = host, port, timeout
+        self.schedule = schedule
+        self.single, self.batch, self.batch_fraction = single, batch, batch_fraction
+        self.rng = np.random.default_rng(seed)
+        self.samples = []  # (start offset s, kind, latency s, ok)
+        self.conn = None
+
+    def _send(self, body):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            self.conn.request("POST", "/predict", body=body, headers={"Content-Type": "application/json"})
+            resp = self.conn.getresponse()
+            resp.read()
+            if resp.will_close:
+                self.conn.close()
+                self.conn = None
+            return 200 <= resp.status < 300
+        except (OSError, http.client.HTTPException):
+            # reconnect on the next request
+            self.conn.close()
+            self.conn = None
+            return False
+
+    def run(self):
+        while True:
+            slot = self.schedule.next()
+            if slot is None:
+                break
+            is_batch = self.rng.random() < self.batch_fraction
+            pool = self.batch if is_batch else self.single
+            body = pool[int(self.rng.integers(len(pool)))]
+            # open loop: measure from the scheduled time; closed loop: slot is "now"
+            ok = self._send(body)
+            self.samples.append((slot - self.schedule.t0, "batch" if is_batch else "single",
+                                 time.perf_counter() - slot, ok))
+        if self.conn is not None:
+            self.conn.close()
+
+
+class _Schedule:
+    """Hands out send times: evenly spaced at `rate` per second, or immediately when rate is None."""
+
+    def __init__(self, duration, rate=None):
+        self.rate = rate
+        self.lock = threading.Lock()
+        self.t0 = time.perf_counter()
+        self.end = self.t0 + duration
+        self.issued = 0
+
+    def next(self):
+        if self.rate is None:
+            now = time.perf_counter()
+            return now if now < self.end else None
+        with self.lock:
+            slot = self.t0 + self.issued / self.rate
+            self.issued += 1
+        if slot >= self.end:
+            return None
+        delay = slot - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        return slot
+
+
+def _summary(samples, rows_per_request, elapsed):
+    if not samples:
+        return {"requests": 0}
+    lat = np.array([s[2] for s in samples]) * 1000
+    ok = np.array([s[3] for s in samples])
+    p50, p95, p99 = np.percentile(lat, [50, 95, 99])
+    return {
+        "requests": len(samples),
+        "errors": int((~ok).sum()),
+        "error_rate": float((~ok).mean()),
+        "throughput_rps": len(samples) / elapsed,
+        "rows_per_sec": int(ok.sum()) * rows_per_request / elapsed,
+        "p50_ms": float(p50), "p95_ms": float(p95), "p99_ms": float(p99), "max_ms": float(lat.max()),
+        "mean_ms": float(lat.mean()),
+    }
+
+
+def run_load(host, port, duration=10.0, concurrency=8, rate=None, batch_fraction=0.0, batch_size=100,
+             warmup=2.0, timeout=10.0, seed=0):
+    """Drive /predict and return the report dict (overall plus per payload kind)."""
+    status, info = _get_json(host, port, "/model/info")
+    if status != 200:
+        raise RuntimeError(f"/model/info returned {status}: {info}")
+    single, batch = make_payloads(info["feature_columns"], batch_size, seed=seed)
+
+    def phase(seconds, samples_from=None):
+        schedule = _Schedule(seconds, rate)
+        clients = [_Client(host, port, schedule, single, batch, batch_fraction, seed + i, timeout)
+                   for i in range(concurrency)]
+        for c in clients:
+            c.start()
+        for c in clients:
+            c.join()
+        return [s for c in clients for s in c.samples], time.perf_counter() - schedule.t0
+
+    if warmup > 0:
+        # first requests pay for lazy model loading, connection setup and allocator growth
+        phase(warmup)
+    samples, elapsed = phase(duration)
+    # in open loop the run lasts as long as the slowest in-flight request; rate it over the schedule
+    elapsed = duration if rate else elapsed
+    kinds = {
+        "single": _summary([s for s in samples if s[1] == "single"], 1, elapsed),
+        "batch": _summary([s for s in samples if s[1] == "batch"], batch_size, elapsed),
+    }
+    overall = _summary(samples, 1, elapsed)
+    overall["rows_per_sec"] = kinds["single"].get("rows_per_sec", 0) + kinds["batch"].get("rows_per_sec", 0)
+    if rate:
+        overall["offered_rps"] = rate
+    return {
+        "config": {"duration_s": duration, "concurrency": concurrency, "rate": rate, "batch_fraction": batch_fraction,
+                   "batch_size": batch_size, "warmup_s": warmup},
+        "overall": overall,
+        "by_kind": {k: v for k, v in kinds.items() if v["requests"]},
+    }
+
+
+def check_slo(report, p95_ms=None, p99_ms=None, max_error_rate=None):
+    """List of human-readable SLO violations (empty when every configured SLO holds)."""
+    failures = []
+    for name, s in [("overall", report["overall"]), *report["by_kind"].items()]:
+        if not s.get("requests"):
+            continue
+        if p95_ms is not None and s["p95_ms"] > p95_ms:
+            failures.append(f"{name}: p95 {s['p95_ms']:.1f} ms > {p95_ms:g} ms")
+        if p99_ms is not None and s["p99_ms"] > p99_ms:
+            failures.append(f"{name}: p99 {s['p99_ms']:.1f} ms > {p99_ms:g} ms")
+        if max_error_rate is not None and s["error_rate"] > max_error_rate:
+            failures.append(f"{name}: error rate {s['error_rate']:.2%} > {max_error_rate:.2%}")
+    if not report["overall"].get("requests"):
+        failures.append("no requests completed")
+    return failures
+
+
+def print_report(report):
+    print(f"{'':<8} {'requests':>9} {'errors':>7} {'req/s':>9} {'rows/s':>10} "
+          f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    for name, s in [("overall", report["overall"]), *report["by_kind"].items()]:
+        if not s.get("requests"):
+            continue
+        print(f"{name:<8} {s['requests']:>9,} {s['errors']:>7,} {s['throughput_rps']:>9,.1f} {s['rows_per_sec']:>10,.0f} "
+              f"{s['p50_ms']:>8.2f} {s['p95_ms']:>8.2f} {s['p99_ms']:>8.2f} {s['max_ms']:>8.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", choices=["dev", "production"], default="production",
+                        help="which server to start on 127.0.0.1")
+    parser.add_argument("--url", default=None, help="drive an already running local server instead of starting one")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--workers", type=int, default=1, help="serve_production.py --workers")
+    parser.add_argument("--threads", type=int, default=8, help="serve_production.py --threads")
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=2.0, help="unmeasured seconds before the run")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads (keep-alive connections)")
+    parser.add_argument("--rate", type=float, default=None, help="requests/sec, open loop (default: as fast as possible)")
+    parser.add_argument("--batch_fraction", type=float, default=0.0, help="share of requests that are batches")
+    parser.add_argument("--batch_size", type=int, default=100, help="rows per batch request")
+    parser.add_argument("--timeout", type=float, default=10.0, help="per-request timeout in seconds")
+    parser.add_argument("--slo_p95_ms", type=float, default=None)
+    parser.add_argument("--slo_p99_ms", type=float, default=None)
+    parser.add_argument("--max_error_rate", type=float, default=0.0, help="allowed error rate (default: none)")
+    parser.add_argument("--server_log", default="load_test_server.log", help="where the started server's output goes")
+    parser.add_argument("--out", default=None, help="write the report as JSON here")
+    args = parser.parse_args(argv)
+
+    proc = None
+    if args.url:
+        parts = urlsplit(args.url)
+        host, port = parts.hostname, parts.port or 80
+        if host not in LOCAL_HOSTS:
+            parser.error("--url must point at this machine (127.0.0.1 / localhost)")
+    else:
+        host, port = "127.0.0.1", args.port
+        proc = start_server(args.server, port, workers=args.workers, threads=args.threads, log_path=args.server_log)
+    try:
+        wait_for_health(host, port, proc=proc)
+        report = run_load(host, port, duration=args.duration, concurrency=args.concurrency, rate=args.rate,
+                          batch_fraction=args.batch_fraction, batch_size=args.batch_size, warmup=args.warmup,
+                          timeout=args.timeout)
+    finally:
+        if proc is not None:
+            stop_server(proc)
+    report["server"] = args.url or f"{args.server} (workers={args.workers}, threads={args.threads})"
+    print_report(report)
+
+    failures = check_slo(report, args.slo_p95_ms, args.slo_p99_ms, args.max_error_rate)
+    report["slo_failures"] = failures
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if failures:
+        print("SLO FAILED:\n  " + "\n  ".join(failures))
+        return 1
+    print("SLO met" if any(v is not None for v in (args.slo_p95_ms, args.slo_p99_ms)) else "Done")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+micro_batcher.py
+Coalesce concurrent scoring calls into one vectorized model call.
+
+Request threads hand their feature matrix to `MicroBatcher.submit`; a single worker thread collects
+pending matrices for up to `max_wait_ms` (or until `max_rows` rows are queued), scores them with one
+call to `score_fn` and hands every caller its own slice of the result.
+Calls submitted with a `context` are only batched with calls carrying the same context object,
+which is then passed on as `score_fn(X, context)`.
+The wait is adaptive: the worker only holds a batch open while requests announced through
+`arriving()` are still on their way (parsing JSON, building features), so a lone request is scored
+immediately and pays no batching delay.
+Batch-size and wait-time histograms are kept for tuning.
+"""
+import bisect
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+import numpy as np
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+WAIT_MS_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 25)
+
+
+class Histogram:
+    """Fixed-bucket histogram (upper bounds, plus an overflow bucket) with a running sum and count."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[i] += 1
+            self._sum += value
+            self._count += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total, n = self._sum, self._count
+        labels = [str(b) for b in self.buckets] + ["+Inf"]
+        return {"buckets": dict(zip(labels, counts)), "sum": total, "count": n}
+
+
+class _Pending:
+    __slots__ = ("X", "context", "t0", "done", "result", "error")
+
+    def __init__(self, X, context=None):
+        self.X = X
+        self.context = context
+        self.t0 = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class MicroBatcher:
+    def __init__(self, score_fn, max_wait_ms=2.0, max_rows=256):
+        self.score_fn = score_fn
+        self.max_wait_ms = float(max_wait_ms)
+        self.max_rows = int(max_rows)
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.wait_ms = Histogram(WAIT_MS_BUCKETS)
+        self._pid = None
+        self._start_worker()
+
+    def _start_worker(self):
+        # threads do not survive fork(), so a batcher created before workers are forked restarts
+        # its queue and worker thread in each child on first use
+        self._pid = os.getpid()
+        self._queue = deque()
+        self._arriving = 0
+        self._cond = threading.Condition()
+        self._worker = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._worker.start()
+
+    @contextmanager
+    def arriving(self):
+        """Announce a request that will call submit() shortly, so open batches wait for it."""
+        if self._pid != os.getpid():
+            self._start_worker()
+        ticket = {"submitted": False}
+        with self._cond:
+            self._arriving += 1
+        try:
+            yield ticket
+        finally:
+            if not ticket["submitted"]:
+                with self._cond:
+                    self._arriving -= 1
+                    self._cond.notify()
+
+    def submit(self, X, ticket=None, context=None):
+        """Score X (2-D array) as part of the next batch; blocks until its own results are ready."""
+        if self._pid != os.getpid():
+            self._start_worker()
+        item = _Pending(X, context)
+        with self._cond:
+            self._queue.append(item)
+            if ticket is not None and not ticket["submitted"]:
+                ticket["submitted"] = True
+                self._arriving -= 1
+            self._cond.notify()
+        item.done.wait()
+        if item.error is not None:
+            raise item.error
+        return item.result
+
+    def stats(self):
+        return {
+            "max_wait_ms": self.max_wait_ms,
+            "max_rows": self.max_rows,
+            "batch_size": self.batch_sizes.snapshot(),
+            "wait_ms": self.wait_ms.snapshot(),
+        }
+
+    def _collect(self):
+        with self._cond:
+            while not self._queue:
+                self._cond.wait()
+            deadline = self._queue[0].t0 + self.max_wait_ms / 1000.0
+            while self._arriving > 0 and sum(len(i.X) for i in self._queue) < self.max_rows:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch, rows = [], 0
+            while self._queue and (not batch or (rows + len(self._queue[0].X) <= self.max_rows
+                                                 and self._queue[0].context is batch[0].context)):
+                item = self._queue.popleft()
+                batch.append(item)
+                rows += len(item.X)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            start = time.perf_counter()
+            for item in batch:
+                self.wait_ms.observe((start - item.t0) * 1000)
+            self.batch_sizes.observe(sum(len(item.X) for item in batch))
+            try:
+                self._score(batch)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0].error = e
+                else:
+                    # retry one by one so only the request that caused the failure gets the error
+                    for item in batch:
+                        try:
+                            self._score([item])
+                        except Exception as item_error:
+                            item.error = item_error
+            for item in batch:
+                item.done.set()
+
+    def _score(self, batch):
+        X = batch[0].X if len(batch) == 1 else np.vstack([item.X for item in batch])
+        ctx = batch[0].context
+        out = self.score_fn(X) if ctx is None else self.score_fn(X, ctx)
+        offset = 0
+        for item in batch:
+            item.result = out[offset:offset + len(item.X)]
+            offset += len(item.X)
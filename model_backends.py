@@ -0,0 +1,118 @@
+"""
+model_backends.py
+Pluggable model backends for training and serving.
+
+- rf:        sklearn RandomForestClassifier (the baseline; served by the flattened-forest engine)
+- hist:      sklearn HistGradientBoostingClassifier, binned histogram boosting (no extra dependency)
+- lightgbm:  lightgbm.LGBMClassifier (optional dependency)
+- xgboost:   xgboost.XGBClassifier with tree_method="hist" (optional dependency)
+
+Boosting backends train on float32 input with early stopping on a validation set supplied by the
+caller (train_model.py holds out whole machines for it). Every backend serializes its model to bytes
+for the model bundle (LightGBM / XGBoost in their own portable formats, sklearn models with joblib),
+and the bundle header records which backend wrote it so the server knows how to load it back.
+"""
+import io
+import joblib
+import numpy as np
+
+try:
+    import lightgbm
+except Exception:
+    lightgbm = None  # type: ignore
+
+try:
+    import xgboost
+except Exception:
+    xgboost = None  # type: ignore
+
+BACKENDS = ("rf", "hist", "lightgbm", "xgboost")
+MAX_ROUNDS = 2000
+EARLY_STOPPING_ROUNDS = 50
+
+
+def available_backends():
+    return [b for b in BACKENDS if b not in ("lightgbm", "xgboost") or globals()[b] is not None]
+
+
+def _require(name):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend {name!r}; expected one of {', '.join(BACKENDS)}")
+    if name in ("lightgbm", "xgboost") and globals()[name] is None:
+        raise ImportError(f"The {name} backend needs the {name} package: pip install {name}")
+
+
+def fit_boosting(name, X_train, y_train, X_val, y_val, random_state=42, **params):
+    """Fit a boosting backend on float32 data, early-stopping on (X_val, y_val). Returns the fitted classifier."""
+    _require(name)
+    X_train = np.asarray(X_train, dtype=np.float32)
+    X_val = np.asarray(X_val, dtype=np.float32)
+    if name == "hist":
+        from sklearn.ensemble import HistGradientBoostingClassifier
+        model = HistGradientBoostingClassifier(
+            max_iter=MAX_ROUNDS, early_stopping=True, n_iter_no_change=EARLY_STOPPING_ROUNDS,
+            scoring="roc_auc", random_state=random_state,
+            **{"learning_rate": 0.05, "max_leaf_nodes": 31, "l2_regularization": 1.0, **params})
+        return model.fit(X_train, y_train, X_val=X_val, y_val=y_val)
+    if name == "lightgbm":
+        model = lightgbm.LGBMClassifier(
+            n_estimators=MAX_ROUNDS, random_state=random_state, verbose=-1,
+            **{"learning_rate": 0.05, "num_leaves": 31, "subsample": 0.8, "subsample_freq": 1,
+               "colsample_bytree": 0.8, **params})
+        return model.fit(X_train, y_train, eval_set=[(X_val, y_val)], eval_metric="auc",
+                         callbacks=[lightgbm.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)])
+    if name == "xgboost":
+        model = xgboost.XGBClassifier(
+            n_estimators=MAX_ROUNDS, tree_method="hist", eval_metric="auc", random_state=random_state,
+            early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+            **{"learning_rate": 0.05, "max_depth": 6, "subsample": 0.8, "colsample_bytree": 0.8, **params})
+        return model.fit(X_train, y_train, eval_set=[(X_val, y_val)], verbose=False)
+    raise ValueError(f"{name} is not a boosting backend")
+
+
+def backend_of(model):
+    """Backend name for a fitted model."""
+    cls = type(model).__name__
+    if cls == "HistGradientBoostingClassifier":
+        return "hist"
+    if cls == "LGBMClassifier":
+        return "lightgbm"
+    if cls == "XGBClassifier":
+        return "xgboost"
+    return "rf"
+
+
+def dump_model(model, name=None):
+    """Serialize a fitted model to bytes in its backend's format."""
+    name = name or backend_of(model)
+    if name == "lightgbm":
+        return model.booster_.model_to_string().encode()
+    if name == "xgboost":
+        return bytes(model.get_booster().save_raw(raw_format="ubj"))
+    buf = io.BytesIO()
+    joblib.dump(model, buf)
+    return buf.getvalue()
+
+
+def load_model(blob, name="rf"):
+    """Inverse of dump_model. Returns an object with predict_proba(X) -> (n, 2)."""
+    _require(name)
+    if name == "lightgbm":
+        return _BoosterClassifier(lightgbm.Booster(model_str=bytes(blob).decode()))
+    if name == "xgboost":
+        model = xgboost.XGBClassifier()
+        model.load_model(bytearray(blob))
+        return model
+    return joblib.load(io.BytesIO(bytes(blob)))
+
+
+class _BoosterClassifier:
+    """predict_proba for a bare LightGBM Booster loaded from its text format."""
+
+    def __init__(self, booster):
+        self.booster = booster
+        self.n_features_in_ = booster.num_feature()
+
+    def predict_proba(self, X):
+        p = self.booster.predict(np.asarray(X, dtype=np.float32))
+        return np.column_stack([1 - p, p])
@@ -0,0 +1,162 @@
+"""
+model_bundle.py
+Single-file, versioned model bundle: model, scaler, feature list, training metrics and metadata together.
+
+Layout (little-endian):
+  8 bytes magic | uint32 format version | uint64 header length | JSON header | padding | data section
+The JSON header describes every numeric array (dtype, shape, offset into the data section) and every
+pickled object blob. Arrays are 64-byte aligned so they can be used in place from a read-only memory
+map: the flattened forest (see tree_engine.py) is served straight from the page cache, so N worker
+processes opening the same bundle share one physical copy and cold start does not grow with the
+forest size. The estimator itself is kept as a blob in its backend's format (see model_backends.py;
+joblib for sklearn models) and only loaded when needed; the header names the backend.
+
+Usage:
+  python model_bundle.py models/model_bundle.pmb     # print the bundle header
+"""
+import io
+import json
+import os
+import struct
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+import joblib
+import numpy as np
+from tree_engine import flatten_forest
+from model_backends import backend_of, dump_model, load_model
+
+MAGIC = b"PMBUNDLE"
+FORMAT_VERSION = 1
+ALIGN = 64
+_PREFIX = struct.Struct("<8sIQ")
+BUNDLE_PATH = "models/model_bundle.pmb"
+
+
+def _align(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def _software_versions(backend):
+    import sklearn
+    versions = {"python": sys.version.split()[0], "numpy": np.__version__, "sklearn": sklearn.__version__}
+    if backend in ("lightgbm", "xgboost"):
+        versions[backend] = __import__(backend).__version__
+    return versions
+
+
+def write_bundle(path, model, scaler, feature_cols, metrics=None, metadata=None, backend=None):
+    """
+    Write model + scaler + feature list (+ metrics / metadata dicts) to `path` atomically.
+    backend: model backend name (model_backends.BACKENDS), inferred from the model when omitted.
+    Random forests also get their flattened, scaler-folded node arrays stored as mmap-able arrays.
+    """
+    backend = backend or backend_of(model)
+    arrays = {}
+    if hasattr(model, "estimators_") and all(hasattr(e, "tree_") for e in model.estimators_):
+        arrays.update({f"forest/{k}": np.asarray(v) for k, v in flatten_forest(model, scaler).items()})
+    buf = io.BytesIO()
+    joblib.dump(scaler, buf)
+    blobs = {"model": dump_model(model, backend), "scaler": buf.getvalue()}
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "model_class": type(model).__name__,
+        "backend": backend,
+        "feature_columns": list(feature_cols),
+        "metrics": {k: float(v) for k, v in (metrics or {}).items()},
+        "metadata": {**(metadata or {}), "software": _software_versions(backend)},
+        "arrays": {},
+        "blobs": {},
+    }
+    offset = 0
+    for name, arr in arrays.items():
+        arr = np.asarray(arr, order="C")
+        header["arrays"][name] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset, "nbytes": arr.nbytes}
+        offset = _align(offset + arr.nbytes)
+    for name, blob in blobs.items():
+        header["blobs"][name] = {"offset": offset, "nbytes": len(blob)}
+        offset = _align(offset + len(blob))
+    header_bytes = json.dumps(header).encode()
+    data_start = _align(_PREFIX.size + len(header_bytes))
+
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + f".tmp{os.getpid()}")
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, arr in arrays.items():
+            f.seek(data_start + header["arrays"][name]["offset"])
+            f.write(np.asarray(arr, order="C").tobytes())
+        for name, blob in blobs.items():
+            f.seek(data_start + header["blobs"][name]["offset"])
+            f.write(blob)
+    # a single rename publishes the new bundle, so readers see either the old or the new one
+    os.replace(tmp, path)
+    return path
+
+
+class ModelBundle:
+    """Read-only view of a bundle file; arrays are memory-mapped, objects are unpickled on demand."""
+
+    def __init__(self, path=BUNDLE_PATH):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            magic, version, header_len = _PREFIX.unpack(f.read(_PREFIX.size))
+            if magic != MAGIC:
+                raise ValueError(f"{self.path} is not a model bundle")
+            if version > FORMAT_VERSION:
+                raise ValueError(f"{self.path} has bundle format {version}, this code reads up to {FORMAT_VERSION}")
+            self.header = json.loads(f.read(header_len))
+        self._data_start = _align(_PREFIX.size + header_len)
+        self._mm = np.memmap(self.path, dtype=np.uint8, mode="r")
+
+    @property
+    def feature_cols(self):
+        return self.header["feature_columns"]
+
+    @property
+    def metrics(self):
+        return self.header["metrics"]
+
+    @property
+    def metadata(self):
+        return self.header["metadata"]
+
+    @property
+    def backend(self):
+        # bundles written before backends existed hold a joblib-pickled sklearn model
+        return self.header.get("backend", "rf")
+
+    def array(self, name):
+        spec = self.header["arrays"][name]
+        start = self._data_start + spec["offset"]
+        raw = self._mm[start:start + spec["nbytes"]]
+        return raw.view(np.dtype(spec["dtype"])).reshape(spec["shape"])
+
+    def has_forest(self):
+        return any(k.startswith("forest/") for k in self.header["arrays"])
+
+    def forest_arrays(self):
+        return {k.split("/", 1)[1]: self.array(k) for k in self.header["arrays"] if k.startswith("forest/")}
+
+    def _blob(self, name):
+        spec = self.header["blobs"][name]
+        start = self._data_start + spec["offset"]
+        return self._mm[start:start + spec["nbytes"]].tobytes()
+
+    def load_object(self, name):
+        return joblib.load(io.BytesIO(self._blob(name)))
+
+    def load_model(self):
+        """The model, loaded with the backend the bundle declares."""
+        return load_model(self._blob("model"), self.backend)
+
+
+if __name__ == "__main__":
+    b = ModelBundle(sys.argv[1] if len(sys.argv) > 1 else BUNDLE_PATH)
+    info = {k: v for k, v in b.header.items() if k != "feature_columns"}
+    info["n_features"] = len(b.feature_cols)
+    print(json.dumps(info, indent=2))
@@ -0,0 +1,174 @@
+"""
+online_features.py
+Incremental (streaming) version of the features in `features.py` for online scoring.
+
+Each machine keeps a bounded ring buffer of its most recent raw sensor readings plus running
+window sums and monotonic min/max queues, so a new reading updates every rolling mean/std/min/max,
+lag and delta column in O(1) (amortized) instead of recomputing the windows from scratch.
+Window sizes and lags are read from the feature column names saved at training time
+(e.g. `sensor_1_rollmean_10`, `sensor_3_lag_5`), so the online features always match the model.
+"""
+import threading
+from collections import OrderedDict, deque
+import numpy as np
+# parse_feature_plan is re-exported here for existing callers
+from features import ROLLING_STATS, parse_feature_plan
+
+# running window sums are recomputed from the ring buffer this often to stop float drift
+RESYNC_EVERY = 4096
+
+
+class MachineState:
+    """Rolling state for one machine: ring buffer of raw readings plus per-window accumulators."""
+    __slots__ = ("buf", "count", "last_cycle", "ref", "sums", "sumsq", "mins", "maxs")
+
+    def __init__(self, n_sensors, size, window_sizes):
+        self.buf = np.zeros((size, n_sensors))
+        self.count = 0
+        self.last_cycle = None
+        # readings are accumulated relative to the first one to keep the variance sums well conditioned
+        self.ref = None
+        self.sums = {w: np.zeros(n_sensors) for w in window_sizes}
+        self.sumsq = {w: np.zeros(n_sensors) for w in window_sizes}
+        self.mins = {w: [deque() for _ in range(n_sensors)] for w in window_sizes}
+        self.maxs = {w: [deque() for _ in range(n_sensors)] for w in window_sizes}
+
+    def update(self, x):
+        size = len(self.buf)
+        i = self.count
+        if self.ref is None:
+            self.ref = x.copy()
+        d = x - self.ref
+        for w in self.sums:
+            if i >= w:
+                old = self.buf[(i - w) % size] - self.ref
+                self.sums[w] += d - old
+                self.sumsq[w] += d * d - old * old
+            else:
+                self.sums[w] += d
+                self.sumsq[w] += d * d
+            for s, v in enumerate(x.tolist()):
+                lo = self.mins[w][s]
+                while lo and lo[-1][1] >= v:
+                    lo.pop()
+                lo.append((i, v))
+                if lo[0][0] <= i - w:
+                    lo.popleft()
+                hi = self.maxs[w][s]
+                while hi and hi[-1][1] <= v:
+                    hi.pop()
+                hi.append((i, v))
+                if hi[0][0] <= i - w:
+                    hi.popleft()
+        self.buf[i % size] = x
+        self.count = i + 1
+        if self.count % RESYNC_EVERY == 0:
+            self._resync()
+
+    def _resync(self):
+        size = len(self.buf)
+        for w in self.sums:
+            n = min(self.count, w)
+            idx = [(self.count - 1 - k) % size for k in range(n)]
+            d = self.buf[idx] - self.ref
+            self.sums[w] = d.sum(axis=0)
+            self.sumsq[w] = (d * d).sum(axis=0)
+
+    def lag(self, l):
+        if self.count <= l:
+            return None
+        return self.buf[(self.count - 1 - l) % len(self.buf)]
+
+
+class OnlineFeatureStore:
+    """
+    Per-machine streaming feature state for a trained feature list.
+    `update(machine_id, cycle, values)` folds one raw reading into the machine's state and returns
+    its feature vector in `feature_cols` order, or None while the machine has too little history
+    for the lag features (the same rows `create_rolling_features` drops).
+    Machines that have not reported recently are evicted once `max_machines` is exceeded.
+    """
+
+    def __init__(self, feature_cols, max_machines=100_000):
+        self.feature_cols = list(feature_cols)
+        self.sensor_cols, self.window_sizes, self.lags = parse_feature_plan(self.feature_cols)
+        self.max_lag = max(self.lags) if self.lags else 0
+        self.size = max(self.window_sizes + [self.max_lag + 1])
+        self.max_machines = max_machines
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+        self._take = self._build_take_index()
+
+    def _build_take_index(self):
+        # layout of the flat vector assembled per reading; unknown feature columns map to the
+        # trailing zero slot, matching the reindex(fill_value=0) behaviour of /predict
+        n = len(self.sensor_cols)
+        slots = {}
+        for s, col in enumerate(self.sensor_cols):
+            slots[col] = s
+        offset = n
+        for w in self.window_sizes:
+            for k, stat in enumerate(ROLLING_STATS):
+                for s, col in enumerate(self.sensor_cols):
+                    slots[f"{col}_{stat}_{w}"] = offset + k * n + s
+            offset += len(ROLLING_STATS) * n
+        for l in self.lags:
+            for s, col in enumerate(self.sensor_cols):
+                slots[f"{col}_lag_{l}"] = offset + s
+            offset += n
+        for s, col in enumerate(self.sensor_cols):
+            slots[f"{col}_delta_1"] = offset + s
+        offset += n
+        self._width = offset + 1
+        return np.array([slots.get(c, offset) for c in self.feature_cols], dtype=np.intp)
+
+    def __len__(self):
+        return len(self._states)
+
+    def _get_state(self, machine_id):
+        st = self._states.get(machine_id)
+        if st is None:
+            st = MachineState(len(self.sensor_cols), self.size, self.window_sizes)
+            self._states[machine_id] = st
+            if len(self._states) > self.max_machines:
+                self._states.popitem(last=False)
+        else:
+            self._states.move_to_end(machine_id)
+        return st
+
+    def update(self, machine_id, cycle, values):
+        """
+        values: raw sensor readings in `sensor_cols` order
+        returns (features, accepted): features is None while warming up or when the reading is stale
+        (cycle not newer than the last one seen for the machine), accepted is False for stale readings.
+        """
+        x = np.asarray(values, dtype=float)
+        with self._lock:
+            st = self._get_state(machine_id)
+            if cycle is not None and st.last_cycle is not None and cycle <= st.last_cycle:
+                return None, False
+            st.update(x)
+            if cycle is not None:
+                st.last_cycle = cycle
+            if st.count <= self.max_lag:
+                return None, True
+            return self._features(st, x), True
+
+    def _features(self, st, x):
+        parts = [x]
+        for w in self.window_sizes:
+            n = min(st.count, w)
+            mean = st.ref + st.sums[w] / n
+            if n > 1:
+                var = (st.sumsq[w] - st.sums[w] * st.sums[w] / n) / (n - 1)
+                std = np.sqrt(np.maximum(var, 0.0))
+            else:
+                std = np.zeros_like(x)
+            mins = np.array([q[0][1] for q in st.mins[w]])
+            maxs = np.array([q[0][1] for q in st.maxs[w]])
+            parts.extend([mean, std, mins, maxs])
+        for l in self.lags:
+            parts.append(st.lag(l))
+        parts.append(x - st.lag(1) if self.lags else np.zeros_like(x))
+        parts.append(np.zeros(1))
+        return np.concatenate(parts)[self._take]
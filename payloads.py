@@ -0,0 +1,160 @@
+"""
+payloads.py
+Request/response codecs for /predict that go straight from the wire format to a float64 matrix in
+`feature_cols` order, without building a pandas DataFrame.
+
+Supported request bodies:
+- JSON rows:      {"sensor_1": ...} | [{...}, ...] | {"rows": [{...}, ...]}
+- JSON columnar:  {"columns": ["sensor_1", ...], "data": [[...], ...]}
+- NumPy:          Content-Type: application/x-npy, a 2-D float array already in feature order
+- Arrow IPC:      Content-Type: application/vnd.apache.arrow.stream (requires pyarrow)
+- CSV stream:     Content-Type: text/csv on /predict/csv, read in fixed-size chunks by `iter_csv_chunks`
+Features that are not supplied are 0 and unknown names are ignored, as with reindex(fill_value=0).
+"""
+import io
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except Exception:
+    pa = None  # type: ignore
+
+CSV_MIMETYPE = "text/csv"
+NDJSON_MIMETYPE = "application/x-ndjson"
+NPY_MIMETYPE = "application/x-npy"
+ARROW_MIMETYPE = "application/vnd.apache.arrow.stream"
+RESULT_DTYPE = np.dtype([("probability", "<f8"), ("prediction", "i1")])
+
+
+class PayloadError(ValueError):
+    """Request body could not be turned into a feature matrix (reported as HTTP 400)."""
+
+
+def build_feature_index(feature_cols):
+    """Column name -> position map, built once per artifact load."""
+    return {c: i for i, c in enumerate(feature_cols)}
+
+
+def _value(v):
+    if v is None:
+        return np.nan
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        raise PayloadError(f"Non-numeric feature value: {v!r}")
+
+
+def rows_to_matrix(rows, feature_index):
+    """
+    Same filling as the DataFrame(rows).reindex(fill_value=0) it replaced: a feature no row has is 0,
+    a feature some rows have is NaN (missing) in the rows without it.
+    """
+    X = np.full((len(rows), len(feature_index)), np.nan)
+    seen = np.zeros(len(feature_index), dtype=bool)
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            raise PayloadError("Each row must be a JSON object")
+        for name, v in row.items():
+            j = feature_index.get(name)
+            if j is not None:
+                X[i, j] = _value(v)
+                seen[j] = True
+    X[:, ~seen] = 0.0
+    return X
+
+
+def columnar_to_matrix(columns, data, feature_index):
+    if not isinstance(columns, list) or not isinstance(data, list):
+        raise PayloadError('Columnar payload needs "columns" and "data" lists')
+    try:
+        values = np.asarray(data, dtype=float)
+    except (TypeError, ValueError):
+        raise PayloadError("Columnar data must be a rectangular list of numbers")
+    if values.ndim == 1 and len(columns) == 1:
+        values = values[:, None]
+    if values.ndim != 2 or values.shape[1] != len(columns):
+        raise PayloadError(f"Columnar data must have {len(columns)} values per row")
+    src = [k for k, c in enumerate(columns) if c in feature_index]
+    dst = [feature_index[columns[k]] for k in src]
+    X = np.zeros((len(values), len(feature_index)))
+    X[:, dst] = values[:, src]
+    return X
+
+
+def npy_to_matrix(body, n_features):
+    try:
+        X = np.load(io.BytesIO(body), allow_pickle=False)
+    except Exception:
+        raise PayloadError("Body is not a valid .npy array")
+    if X.ndim == 1:
+        X = X[None, :]
+    if X.ndim != 2 or X.shape[1] != n_features:
+        raise PayloadError(f".npy payload must be 2-D with {n_features} columns in feature order")
+    try:
+        return np.asarray(X, dtype=np.float64)
+    except (TypeError, ValueError):
+        raise PayloadError(".npy payload must be numeric")
+
+
+def arrow_to_matrix(body, feature_index):
+    if pa is None:
+        raise PayloadError("Arrow payloads need pyarrow installed on the server")
+    try:
+        table = pa.ipc.open_stream(body).read_all()
+    except Exception:
+        raise PayloadError("Body is not a valid Arrow IPC stream")
+    X = np.zeros((table.num_rows, len(feature_index)))
+    for name in table.column_names:
+        j = feature_index.get(name)
+        if j is not None:
+            try:
+                X[:, j] = table.column(name).to_numpy(zero_copy_only=False).astype(np.float64)
+            except (TypeError, ValueError):
+                raise PayloadError(f"Arrow column {name} must be numeric")
+    return X
+
+
+def iter_csv_chunks(stream, feature_index, chunk_rows=5000, passthrough=("machine_id", "cycle", "id")):
+    """
+    Read a CSV file object (header row + one reading per line) `chunk_rows` rows at a time.
+    Yields (X, extra) per chunk: X is the float matrix in feature order, extra a dict of the
+    `passthrough` columns present in the file (identifiers echoed back next to each score).
+    Only one chunk is held in memory, whatever the size of the file.
+    """
+    try:
+        reader = pd.read_csv(stream, chunksize=chunk_rows)
+        for chunk in reader:
+            X = np.zeros((len(chunk), len(feature_index)))
+            for name in chunk.columns:
+                j = feature_index.get(name)
+                if j is None:
+                    continue
+                try:
+                    X[:, j] = pd.to_numeric(chunk[name]).to_numpy(dtype=np.float64)
+                except (TypeError, ValueError):
+                    raise PayloadError(f"Non-numeric values in column {name!r}")
+            extra = {c: chunk[c].astype(object).where(chunk[c].notna(), None).tolist()
+                     for c in passthrough if c in chunk.columns}
+            yield X, extra
+    except pd.errors.EmptyDataError:
+        raise PayloadError("CSV body is empty")
+    except pd.errors.ParserError as e:
+        raise PayloadError(f"Malformed CSV: {e}")
+
+
+def npy_response_body(probs, preds):
+    out = np.empty(len(probs), dtype=RESULT_DTYPE)
+    out["probability"] = probs
+    out["prediction"] = preds
+    buf = io.BytesIO()
+    np.save(buf, out, allow_pickle=False)
+    return buf.getvalue()
+
+
+def arrow_response_body(probs, preds):
+    table = pa.table({"probability": pa.array(probs, pa.float64()), "prediction": pa.array(preds.astype(np.int8))})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -1,5 +1,5 @@
 import axios from "axios";
-const BASE_URL = (import.meta.env.VITE_API_BASE_URL ?? "/api").trim();
+export const BASE_URL = (import.meta.env.VITE_API_BASE_URL ?? "/api").trim();
 
 export const api = axios.create({
   baseURL: BASE_URL,
@@ -1,6 +1,68 @@
-import { api } from "./client";
-import type { PredictInput, PredictResponse } from "../types";
+import { api, BASE_URL } from "./client";
+import type { PredictInput, PredictResponse, CsvScore, Explanation } from "../types";
 export async function predictOne(payload: PredictInput): Promise<PredictResponse> {
 const resp = await api.post("/predict", payload);
 return resp.data as PredictResponse;
-}
\ No newline at end of file
+}
+
+// Top-k feature contributions for each row (the server falls back to a cheaper method past its latency budget).
+export async function explainRows(rows: Record<string, number>[], topK = 5): Promise<Explanation[]> {
+const resp = await api.post(`/explain?top_k=${topK}`, { rows });
+return rows.length === 1 ? [resp.data as Explanation] : (resp.data.explanations as Explanation[]);
+}
+
+// Streams a CSV file to /predict/csv and calls onChunk with each batch of scores as the server
+// sends them back (NDJSON, one line per input row), so large files need a single request.
+export async function predictCsvStream(
+file: File,
+onChunk: (scores: CsvScore[]) => void,
+signal?: AbortSignal,
+): Promise<number> {
+const resp = await fetch(`${BASE_URL}/predict/csv`, {
+method: "POST",
+headers: { "Content-Type": "text/csv", Accept: "application/x-ndjson" },
+body: file,
+signal,
+});
+if (!resp.ok || !resp.body) {
+const detail = await resp.json().catch(() => ({}));
+throw new Error(detail.error ?? `request failed (${resp.status})`);
+}
+const reader = resp.body.getReader();
+const decoder = new TextDecoder();
+let buffered = "";
+let total = 0;
+for (;;) {
+const { done, value } = await reader.read();
+buffered += decoder.decode(value, { stream: !done });
+const lines = buffered.split("\n");
+buffered = done ? "" : lines.pop() ?? "";
+const scores: CsvScore[] = [];
+for (const line of lines) {
+if (!line.trim()) continue;
+const rec = JSON.parse(line);
+if (rec.error) throw new Error(`row ${rec.row}: ${rec.error}`);
+scores.push(rec as CsvScore);
+}
+if (scores.length) {
+total += scores.length;
+onChunk(scores);
+}
+if (done) return total;
+}
+}
+
+// Number of data rows in a CSV file (lines after the header), counted without loading it whole.
+export async function countCsvRows(file: File): Promise<number> {
+const reader = file.stream().getReader();
+let newlines = 0;
+let last = 10;
+for (;;) {
+const { done, value } = await reader.read();
+if (done) break;
+for (let i = 0; i < value.length; i++) if (value[i] === 10) newlines++;
+if (value.length) last = value[value.length - 1];
+}
+// a final line without a trailing newline still counts; the header does not
+return Math.max(0, newlines + (last === 10 ? 0 : 1) - 1);
+}
@@ -1,33 +1,39 @@
-import React, { useCallback } from "react";
+import React, { useCallback, useState } from "react";
 import { useDropzone } from "react-dropzone";
 import Button from "@mui/material/Button";
 import Typography from "@mui/material/Typography";
 import Box from "@mui/material/Box";
-import Papa from "papaparse";
-import { predictOne } from "../api/predict";
-const BatchUpload: React.FC<{ onResults?: (r: any[]) => void }> = ({ onResults }) => {
-const onDrop = useCallback((files: File[]) => {
+import LinearProgress from "@mui/material/LinearProgress";
+import { predictCsvStream, countCsvRows } from "../api/predict";
+import type { BatchResult } from "../types";
+const BatchUpload: React.FC<{ onResults?: (r: BatchResult[]) => void }> = ({ onResults }) => {
+const [progress, setProgress] = useState<{ done: number; total: number } | null>(null);
+const [error, setError] = useState<string | null>(null);
+const onDrop = useCallback(async (files: File[]) => {
 const f = files[0];
-Papa.parse(f, {
-header: true,
-dynamicTyping: true,
-complete: async (results: any) => {
-const rows = results.data;
-const out = [];
-for (const r of rows) {
+if (!f) return;
+setError(null);
+// the whole file goes up in one request; scores stream back chunk by chunk
+const total = await countCsvRows(f);
+setProgress({ done: 0, total });
+const out: BatchResult[] = [];
 try {
-const resp = await predictOne({ features: r });
-out.push({ input: r, resp });
-} catch (e) {
-out.push({ input: r, resp: { error: "request failed" } });
+await predictCsvStream(f, (scores) => {
+for (const s of scores) {
+out.push({
+input: { row: s.row, machine_id: s.machine_id, cycle: s.cycle, id: s.id },
+resp: { failure_probability: s.probability },
+});
 }
+setProgress({ done: out.length, total: Math.max(total, out.length) });
+});
+} catch (e) {
+setError(e instanceof Error ? e.message : "request failed");
 }
 onResults?.(out);
-},
-});
-}, []);
+}, [onResults]);
 
-const { getRootProps, getInputProps, isDragActive } = useDropzone({ onDrop, accept: { 'text/csv': ['.csv'] } });
+const { getRootProps, getInputProps, isDragActive, open } = useDropzone({ onDrop, accept: { 'text/csv': ['.csv'] } });
 
 return (
 <Box sx={{ p: 1 }}>
@@ -36,9 +42,16 @@ return (
 <Typography>{isDragActive ? "Drop CSV here..." : "Drag & drop CSV or click to upload"}</Typography>
 <Typography variant="caption">CSV must have columns matching your model feature names (sensor_1, ...)</Typography>
 </div>
-<Button sx={{ mt: 1 }} variant="outlined">Upload</Button>
+{progress && (
+<Box sx={{ mt: 1 }}>
+<LinearProgress variant="determinate" value={progress.total ? (100 * progress.done) / progress.total : 100} />
+<Typography variant="caption">Scored {progress.done} / {progress.total} rows</Typography>
+</Box>
+)}
+{error && <Typography color="error" variant="caption">Error: {error}</Typography>}
+<Button sx={{ mt: 1 }} variant="outlined" onClick={open}>Upload</Button>
 </Box>
 );
 };
 
-export default BatchUpload;
\ No newline at end of file
+export default BatchUpload;
@@ -5,7 +5,10 @@ import Box from "@mui/material/Box";
 import Button from "@mui/material/Button";
 import Paper from "@mui/material/Paper";
 import Divider from "@mui/material/Divider";
+import TextField from "@mui/material/TextField";
 import { parseCSVToRows } from "../utils/csv";
+import { explainRows } from "../api/predict";
+import type { Explanation } from "../types";
 import { BarChart, Bar, XAxis, YAxis, Tooltip, ResponsiveContainer, CartesianGrid } from "recharts";
 
 type NumericSummary = {
@@ -21,6 +24,23 @@ const FeaturesExplorer: React.FC = () => {
   const [rows, setRows] = useState<Record<string, any>[]>([]);
   const [summaries, setSummaries] = useState<NumericSummary[]>([]);
   const [featureToPlot, setFeatureToPlot] = useState<string | null>(null);
+  const [explainIndex, setExplainIndex] = useState(0);
+  const [explanation, setExplanation] = useState<Explanation | null>(null);
+  const [explainError, setExplainError] = useState<string | null>(null);
+
+  const onExplain = async () => {
+    const row = rows[explainIndex];
+    if (!row) return;
+    setExplainError(null);
+    try {
+      const numeric = Object.fromEntries(Object.entries(row).filter(([, v]) => typeof v === "number"));
+      const [e] = await explainRows([numeric as Record<string, number>], 8);
+      setExplanation(e);
+    } catch (err: any) {
+      setExplanation(null);
+      setExplainError(err?.response?.data?.error ?? err?.message ?? "explain failed");
+    }
+  };
 
   const onUpload = async (e: React.ChangeEvent<HTMLInputElement>) => {
     if (!e.target.files || e.target.files.length === 0) return;
@@ -84,6 +104,7 @@ const FeaturesExplorer: React.FC = () => {
               setRows([]);
               setSummaries([]);
               setFeatureToPlot(null);
+              setExplanation(null);
             }}
           >
             Clear
@@ -138,6 +159,44 @@ const FeaturesExplorer: React.FC = () => {
           </>
         )}
       </Paper>
+
+      <Paper sx={{ p: 2, mt: 2 }}>
+        <Typography variant="h6">Explain a Prediction</Typography>
+        <Divider sx={{ my: 1 }} />
+        <Box sx={{ display: "flex", gap: 2, alignItems: "center", mb: 1 }}>
+          <TextField
+            size="small"
+            type="number"
+            label="Row"
+            value={explainIndex}
+            inputProps={{ min: 0, max: Math.max(0, rows.length - 1) }}
+            onChange={(e) => setExplainIndex(Math.max(0, Number(e.target.value) || 0))}
+          />
+          <Button variant="contained" disabled={rows.length === 0} onClick={onExplain}>
+            Explain
+          </Button>
+        </Box>
+        {explainError && <Typography color="error">{explainError}</Typography>}
+        {explanation && (
+          <>
+            <Typography variant="body2" sx={{ mb: 1 }}>
+              probability {explanation.probability.toFixed(3)} • base {explanation.base_value.toFixed(3)} • method{" "}
+              {explanation.method}
+            </Typography>
+            <Box sx={{ height: 280 }}>
+              <ResponsiveContainer width="100%" height="100%">
+                <BarChart data={explanation.contributions} layout="vertical" margin={{ left: 120 }}>
+                  <CartesianGrid strokeDasharray="3 3" stroke="#112022" />
+                  <XAxis type="number" />
+                  <YAxis type="category" dataKey="feature" tick={{ fontSize: 11 }} />
+                  <Tooltip />
+                  <Bar dataKey="contribution" fill="#f48fb1" />
+                </BarChart>
+              </ResponsiveContainer>
+            </Box>
+          </>
+        )}
+      </Paper>
     </Container>
   );
 };
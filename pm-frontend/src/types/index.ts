@@ -8,6 +8,16 @@ failure_probability?: number;
 error?: string;
 };
 
+// one line of the /predict/csv NDJSON stream
+export type CsvScore = {
+row: number;
+probability: number;
+prediction: number;
+machine_id?: string | number;
+cycle?: number;
+id?: string | number;
+};
+
 export type BatchResult = {
 input: any;
 resp: PredictResponse;
@@ -31,3 +41,12 @@ type: "success" | "error" | "warning" | "info";
 message: string;
 timestamp: number;
 };
+
+// one row of an /explain response: the top-k contributions, strongest first
+export type Explanation = {
+probability: number;
+prediction: number;
+base_value: number;
+method: "tree_shap" | "path" | "occlusion";
+contributions: { feature: string; value: number; contribution: number }[];
+};
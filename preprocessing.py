@@ -2,28 +2,204 @@
 preprocessing.py
 Functions to clean and prepare raw telemetry data for feature engineering.
 """
+import logging
+import tempfile
+import time
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
 import joblib
 from pathlib import Path
+from utils import peak_rss_mb
+
+logger = logging.getLogger("pm")
 
 def load_data(path):
     df = pd.read_csv(path, parse_dates=["timestamp"])
     return df
 
-def basic_cleaning(df):
-    # remove duplicates
-    df = df.drop_duplicates()
+def telemetry_dtypes(columns):
+    """Compact dtypes for raw telemetry: float32 sensors, categorical machine_id, int32 cycle, int8 failure."""
+    dtypes = {}
+    for c in columns:
+        if c.startswith("sensor_"):
+            dtypes[c] = np.float32
+        elif c == "machine_id":
+            dtypes[c] = "category"
+        elif c == "cycle":
+            dtypes[c] = np.int32
+        elif c == "failure":
+            dtypes[c] = np.int8
+    return dtypes
+
+def _typed_reader(path, chunksize, parse_timestamps):
+    columns = pd.read_csv(path, nrows=0).columns.tolist()
+    usecols = [c for c in columns if parse_timestamps or c != "timestamp"]
+    parse_dates = ["timestamp"] if parse_timestamps and "timestamp" in columns else None
+    return pd.read_csv(path, usecols=usecols, dtype=telemetry_dtypes(usecols), parse_dates=parse_dates, chunksize=chunksize)
+
+def _finish_partition(parts):
+    part = pd.concat(parts, ignore_index=True)
+    # chunks carry different category sets; re-encode once per partition
+    part['machine_id'] = part['machine_id'].astype(str).astype("category")
+    return part
+
+def iter_machine_partitions(path, chunksize=500_000, rows_per_partition=1_000_000, parse_timestamps=False,
+                            presorted=True, spill_dir=None, n_buckets=64):
+    """
+    Stream a telemetry CSV with compact dtypes and yield machine-complete DataFrames.
+    Every machine's rows land in exactly one partition, so each partition can go through
+    basic_cleaning / create_rolling_features on its own and peak memory is bounded by
+    max(rows_per_partition, largest machine) instead of the whole file.
+    - presorted=True: the file is grouped by machine_id (historian exports usually are); a single
+      pass with a carry-over of the machine cut at each chunk boundary (only that machine's rows are
+      carried, whatever the chunksize). A machine that reappears
+      after it was emitted raises ValueError.
+    - presorted=False: rows are first spilled to `n_buckets` hash partitions on disk (under
+      `spill_dir`, a temporary directory by default) and each bucket is yielded as one partition.
+    The timestamp column is skipped unless parse_timestamps=True.
+    """
+    reader = _typed_reader(path, chunksize, parse_timestamps)
+    if not presorted:
+        yield from _spill_partitions(reader, spill_dir, n_buckets, parse_timestamps)
+        return
+    emitted = set()
+    # rows of the machine still open at the last chunk boundary; a list, concatenated once when emitted
+    carry, carry_id = [], None
+    pending, pending_rows = [], 0
+
+    def close(frames, ids):
+        nonlocal emitted, pending_rows
+        if ids & emitted:
+            raise ValueError(f"{path} is not grouped by machine_id; use presorted=False")
+        emitted |= ids
+        pending.extend(frames)
+        pending_rows += sum(len(f) for f in frames)
+
+    for chunk in reader:
+        if len(chunk) == 0:
+            continue
+        machine = chunk['machine_id']
+        codes = machine.cat.codes.to_numpy()
+        # leading rows of the open machine extend the carry (chunk category codes differ, so match by value)
+        carry_code = machine.cat.categories.astype(str).get_indexer([carry_id])[0] if carry else -2
+        lead = int(np.argmax(codes != carry_code)) if (codes != carry_code).any() else len(codes)
+        if lead:
+            carry.append(chunk.iloc[:lead])
+        if lead == len(codes):
+            continue
+        if carry:
+            close(carry, {carry_id})
+        rest, codes = chunk.iloc[lead:], codes[lead:]
+        # the trailing machine of a chunk may continue in the next chunk
+        changes = np.flatnonzero(codes != codes[-1])
+        split = changes[-1] + 1 if len(changes) else 0
+        if split:
+            head = rest.iloc[:split]
+            close([head], set(head['machine_id'].astype(str).unique()))
+        carry, carry_id = [rest.iloc[split:]], str(rest['machine_id'].iat[-1])
+        if pending_rows >= rows_per_partition:
+            yield _finish_partition(pending)
+            pending, pending_rows = [], 0
+    if carry:
+        close(carry, {carry_id})
+    if pending:
+        yield _finish_partition(pending)
+
+def _spill_partitions(reader, spill_dir, n_buckets, parse_timestamps):
+    with tempfile.TemporaryDirectory(dir=spill_dir) as tmp:
+        buckets = {}
+        for chunk in reader:
+            ids = chunk['machine_id'].astype(str).to_numpy()
+            bucket = pd.util.hash_array(ids.astype(object)) % n_buckets
+            for b, idx in pd.Series(np.arange(len(chunk))).groupby(bucket).indices.items():
+                out = Path(tmp) / f"bucket_{b}.csv"
+                chunk.iloc[idx].to_csv(out, mode="a", header=b not in buckets, index=False)
+                buckets[b] = out
+        for b in sorted(buckets):
+            cols = pd.read_csv(buckets[b], nrows=0).columns.tolist()
+            part = pd.read_csv(buckets[b], dtype=telemetry_dtypes(cols),
+                               parse_dates=["timestamp"] if "timestamp" in cols else None)
+            yield _finish_partition([part])
+
+def _is_sorted_by_key(machine_ids, cycles):
+    same = machine_ids[1:] == machine_ids[:-1]
+    return bool(np.all((machine_ids[1:] > machine_ids[:-1]) | (same & (cycles[1:] >= cycles[:-1]))))
+
+def _fill_gaps_grouped(values, group_start, group_end):
+    """
+    Per-machine linear interpolation with forward/back fill at the edges, for all sensors at once.
+    values: (n, k) array sorted by machine; group_start/group_end: first/last row of each row's machine.
+    Equivalent to groupby(machine).interpolate().ffill().bfill() but in whole-array operations.
+    """
+    n = len(values)
+    valid = ~np.isnan(values)
+    if valid.all():
+        return values
+    pos = np.arange(n)[:, None]
+    # nearest valid row at or before / at or after each row, limited to the row's own machine
+    prev = np.maximum.accumulate(np.where(valid, pos, -1), axis=0)
+    nxt = np.minimum.accumulate(np.where(valid, pos, n)[::-1], axis=0)[::-1]
+    has_prev = prev >= group_start[:, None]
+    has_next = nxt <= group_end[:, None]
+    cols = np.arange(values.shape[1])[None, :]
+    y0 = values[np.clip(prev, 0, n - 1), cols]
+    y1 = values[np.clip(nxt, 0, n - 1), cols]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slope = (y1 - y0) / (nxt - prev)
+        interp = slope * (pos - prev) + y0
+    out = np.where(has_prev & has_next, interp, np.where(has_prev, y0, np.where(has_next, y1, np.nan)))
+    return np.where(valid, values, out).astype(values.dtype, copy=False)
+
+def basic_cleaning(df, stats=None):
+    """
+    Deduplicate on (machine_id, cycle), order by machine and cycle, fill sensor gaps per machine
+    (interpolate, then forward/back fill) and fall back to the column median.
+    Time and memory per step are logged; pass a dict as `stats` to also collect them.
+    """
+    stats = {} if stats is None else stats
+    t = time.perf_counter()
+
+    def step(name, frame):
+        nonlocal t
+        now = time.perf_counter()
+        stats[name] = {"seconds": now - t, "frame_mb": frame.memory_usage(deep=False).sum() / 1e6, "peak_rss_mb": peak_rss_mb()}
+        logger.info(f"basic_cleaning {name}: {stats[name]['seconds']:.3f}s, frame {stats[name]['frame_mb']:.1f} MB")
+        t = now
+
     # ensure proper dtypes
-    df['machine_id'] = df['machine_id'].astype(str)
-    df = df.sort_values(['machine_id', 'cycle'])
-    # fill tiny missing values per sensor with interpolation
+    df = df.assign(machine_id=df['machine_id'].astype(str))
+    step("dtypes", df)
+    # sort only when the input is not already ordered by (machine_id, cycle); stable so the first
+    # occurrence of a duplicated key stays first
+    machine_ids = df['machine_id'].to_numpy(dtype=object)
+    cycles = df['cycle'].to_numpy()
+    if not _is_sorted_by_key(machine_ids, cycles):
+        df = df.sort_values(['machine_id', 'cycle'], kind="stable")
+        machine_ids = df['machine_id'].to_numpy(dtype=object)
+        cycles = df['cycle'].to_numpy()
+    step("sort", df)
+    # remove duplicates: once sorted, repeated (machine_id, cycle) keys are adjacent
+    new_machine = np.ones(len(df), dtype=bool)
+    new_machine[1:] = machine_ids[1:] != machine_ids[:-1]
+    dup = np.zeros(len(df), dtype=bool)
+    dup[1:] = ~new_machine[1:] & (cycles[1:] == cycles[:-1])
+    if dup.any():
+        df = df[~dup]
+        new_machine = new_machine[~dup]
+    step("dedupe", df)
+    # fill tiny missing values per sensor with interpolation within each machine
     sensor_cols = [c for c in df.columns if c.startswith("sensor_")]
-    # Fix index alignment issue during groupby apply
-    df[sensor_cols] = df.groupby('machine_id')[sensor_cols].apply(lambda x: x.interpolate().ffill().bfill()).reset_index(level=0, drop=True)
+    if sensor_cols:
+        starts = np.flatnonzero(new_machine)
+        lengths = np.diff(np.append(starts, len(df)))
+        group_start = np.repeat(starts, lengths)
+        group_end = group_start + np.repeat(lengths, lengths) - 1
+        df[sensor_cols] = _fill_gaps_grouped(df[sensor_cols].to_numpy(), group_start, group_end)
+    step("interpolate", df)
     # fallback: fill any remaining NaN with median
     df[sensor_cols] = df[sensor_cols].fillna(df[sensor_cols].median())
+    step("median_fill", df)
     return df
 
 def scale_features(X_train, X_test, scaler_path="models/scaler.pkl"):
@@ -1,25 +1,66 @@
+"""
+resave_artifacts.py
+Maintenance for the saved model artifacts.
+
+Usage:
+  python resave_artifacts.py             # re-save model/scaler pickles with the installed joblib/sklearn
+  python resave_artifacts.py --bundle    # convert the pickles (+ metrics.pkl) into models/model_bundle.pmb
+"""
+import argparse
+from datetime import datetime, timezone
 import joblib
 from pathlib import Path
+from model_bundle import write_bundle, BUNDLE_PATH
 
 MODEL_PATH = Path('models/best_model.pkl')
 SCALER_PATH = Path('models/scaler.pkl')
+FEATURES_PATH = Path('models/feature_columns.pkl')
+METRICS_PATH = Path('models/metrics.pkl')
+
+
+def resave():
+    print('Loading existing artifacts...')
+    model = joblib.load(MODEL_PATH)
+    scaler = joblib.load(SCALER_PATH)
+
+    # Backups (will overwrite existing .bak files)
+    MODEL_BAK = MODEL_PATH.with_suffix('.pkl.bak')
+    SCALER_BAK = SCALER_PATH.with_suffix('.pkl.bak')
+
+    print(f'Backing up {MODEL_PATH} -> {MODEL_BAK}')
+    MODEL_PATH.replace(MODEL_BAK)
+
+    print(f'Backing up {SCALER_PATH} -> {SCALER_BAK}')
+    SCALER_PATH.replace(SCALER_BAK)
 
-print('Loading existing artifacts...')
-model = joblib.load(MODEL_PATH)
-scaler = joblib.load(SCALER_PATH)
+    print('Re-saving artifacts with current joblib/sklearn...')
+    joblib.dump(model, MODEL_PATH)
+    joblib.dump(scaler, SCALER_PATH)
 
-# Backups (will overwrite existing .bak files)
-MODEL_BAK = MODEL_PATH.with_suffix('.pkl.bak')
-SCALER_BAK = SCALER_PATH.with_suffix('.pkl.bak')
+    print('Resave complete. Originals backed up with .bak suffix.')
 
-print(f'Backing up {MODEL_PATH} -> {MODEL_BAK}')
-MODEL_PATH.replace(MODEL_BAK)
 
-print(f'Backing up {SCALER_PATH} -> {SCALER_BAK}')
-SCALER_PATH.replace(SCALER_BAK)
+def convert_to_bundle(out=BUNDLE_PATH):
+    print('Loading existing artifacts...')
+    model = joblib.load(MODEL_PATH)
+    scaler = joblib.load(SCALER_PATH)
+    feature_cols = joblib.load(FEATURES_PATH)
+    metrics = joblib.load(METRICS_PATH) if METRICS_PATH.exists() else {}
+    # the pickles do not record when they were trained; the model file's mtime is the closest value
+    metadata = {
+        "trained_at": datetime.fromtimestamp(MODEL_PATH.stat().st_mtime, timezone.utc).isoformat(),
+        "converted_from": [str(MODEL_PATH), str(SCALER_PATH), str(FEATURES_PATH)],
+    }
+    write_bundle(out, model, scaler, feature_cols, metrics=metrics, metadata=metadata)
+    print(f'Wrote bundle {out}')
 
-print('Re-saving artifacts with current joblib/sklearn...')
-joblib.dump(model, MODEL_PATH)
-joblib.dump(scaler, SCALER_PATH)
 
-print('Resave complete. Originals backed up with .bak suffix.')
\ No newline at end of file
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--bundle', action='store_true', help='convert the pickles into a single model bundle')
+    parser.add_argument('--out', default=BUNDLE_PATH, help='bundle path for --bundle')
+    args = parser.parse_args()
+    if args.bundle:
+        convert_to_bundle(args.out)
+    else:
+        resave()
@@ -1,13 +1,27 @@
+import json
 import os
 import logging
+import threading
+import time
+from datetime import datetime, timezone
 from pathlib import Path
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, g, request, jsonify, send_from_directory, stream_with_context
 import joblib
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import StandardScaler
 from flask_cors import CORS
 from typing import Optional, Any
+from online_features import OnlineFeatureStore
+from tree_engine import ForestEngine
+from explainer import Explainer
+from model_bundle import ModelBundle
+from micro_batcher import MicroBatcher
+import serving_metrics as metrics
+from serving_metrics import timed
+from payloads import (PayloadError, CSV_MIMETYPE, NDJSON_MIMETYPE, NPY_MIMETYPE, ARROW_MIMETYPE, build_feature_index,
+                      rows_to_matrix, columnar_to_matrix, npy_to_matrix, arrow_to_matrix, iter_csv_chunks,
+                      npy_response_body, arrow_response_body)
 
 app = Flask(__name__, static_folder="static", static_url_path="/static")
 CORS(app)
@@ -16,70 +30,317 @@ CORS(app)
 MODEL_PATH = Path(os.environ.get("MODEL_PATH", "models/best_model.pkl"))
 SCALER_PATH = Path(os.environ.get("SCALER_PATH", "models/scaler.pkl"))
 FEATURES_PATH = Path(os.environ.get("FEATURES_PATH", "models/feature_columns.pkl"))
+# single-file bundle (see model_bundle.py); used instead of the three pickles when present
+BUNDLE_PATH = Path(os.environ.get("BUNDLE_PATH", "models/model_bundle.pmb"))
+# requests up to this many rows use the flattened-forest engine; larger batches go through sklearn
+ENGINE_MAX_ROWS = int(os.environ.get("ENGINE_MAX_ROWS", 256))
+# coalesce concurrent /predict calls into one model call; 0 disables
+MICRO_BATCH_WAIT_MS = float(os.environ.get("MICRO_BATCH_WAIT_MS", 0))
+MICRO_BATCH_MAX_ROWS = int(os.environ.get("MICRO_BATCH_MAX_ROWS", 256))
+# rows scored per chunk by the streaming /predict/csv endpoint (bounds its memory use)
+CSV_CHUNK_ROWS = int(os.environ.get("CSV_CHUNK_ROWS", 5000))
+MAX_ONLINE_MACHINES = int(os.environ.get("MAX_ONLINE_MACHINES", 100000))
+# /explain: per-request latency budget for exact explanations (rows over budget get the approximation)
+EXPLAIN_BUDGET_MS = float(os.environ.get("EXPLAIN_BUDGET_MS", 50))
+EXPLAIN_TOP_K = int(os.environ.get("EXPLAIN_TOP_K", 5))
+EXPLAIN_MAX_ROWS = int(os.environ.get("EXPLAIN_MAX_ROWS", 1000))
+# poll artifact mtimes every N seconds and hot-reload on change; 0 disables
+RELOAD_POLL_SECONDS = float(os.environ.get("RELOAD_POLL_SECONDS", 0))
+# threads sklearn may use per predict call; the multi-process runner sets 1 so workers don't oversubscribe cores
+MODEL_N_JOBS = int(os.environ["MODEL_N_JOBS"]) if os.environ.get("MODEL_N_JOBS") else None
+# when set, POST /admin/reload requires a matching X-Admin-Token header
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN")
 
-model: Optional[Any] = None
-scaler: Optional[Any] = None
-feature_cols: Optional[list] = None
 logger = logging.getLogger("pm")
 logging.basicConfig(level=logging.INFO)
 
-def load_artifacts():
-    global model, scaler, feature_cols
-    logger.info(f"Loading artifacts from {MODEL_PATH}, {SCALER_PATH}, {FEATURES_PATH}")
-    if not (MODEL_PATH.exists() and SCALER_PATH.exists() and FEATURES_PATH.exists()):
-        raise FileNotFoundError("One or more model artifacts missing")
-    model = joblib.load(MODEL_PATH)
+
+class ArtifactSet:
+    """
+    Everything loaded from one set of artifact files. Handlers take a reference to the current set
+    once per request, and a reload replaces the whole set with a single assignment, so a request
+    never sees a model from one deployment and a scaler or feature list from another.
+    The sklearn model may be given as a loader, in which case it is only unpickled on first use
+    (bundles serve small requests from the memory-mapped forest engine without it).
+    """
+
+    def __init__(self, scaler, feature_cols, signature, model=None, model_loader=None, engine=None,
+                 info=None, online_store=None):
+        self._model = model
+        self._model_loader = model_loader
+        self._model_lock = threading.Lock()
+        self.scaler = scaler
+        self.feature_cols = list(feature_cols)
+        self.feature_index = build_feature_index(self.feature_cols)
+        self.engine = engine
+        if online_store is None:
+            online_store = OnlineFeatureStore(self.feature_cols, max_machines=MAX_ONLINE_MACHINES)
+        self.online_store = online_store
+        self.signature = signature
+        self.info = info or {}
+        self.loaded_at = datetime.now(timezone.utc)
+        self._explainer = None
+        self._explainer_lock = threading.Lock()
+
+    @property
+    def model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = _configure_model(self._model_loader())
+        return self._model
+
+    @property
+    def explainer(self):
+        # built on the first /explain call, not at load: TreeSHAP needs the full sklearn model, which
+        # bundles otherwise only unpickle for large batches (and each forked worker would pay for it)
+        if self._explainer is None:
+            with self._explainer_lock:
+                if self._explainer is None:
+                    self._explainer = Explainer.build(self.scaler, self.feature_cols, engine=self.engine,
+                                                      model_getter=lambda: self.model)
+        return self._explainer
+
+
+artifacts: Optional[ArtifactSet] = None
+batcher: Optional[MicroBatcher] = None
+_reload_lock = threading.Lock()
+reload_status = {"reloads": 0, "last_reload_at": None, "last_error": None}
+_watcher_pid = None
+
+def _artifact_paths():
+    if BUNDLE_PATH.exists():
+        return [BUNDLE_PATH]
+    return [MODEL_PATH, SCALER_PATH, FEATURES_PATH]
+
+def _artifact_signature():
+    # cheap change detection: (mtime, size) of each artifact file, None when missing
+    sig = []
+    for p in _artifact_paths():
+        try:
+            st = p.stat()
+            sig.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            sig.append(None)
+    return tuple(sig)
+
+def _configure_model(model):
+    if MODEL_N_JOBS is not None and hasattr(model, "n_jobs"):
+        model.n_jobs = MODEL_N_JOBS
+    return model
+
+def _load_engine(model, scaler):
+    # always flattened from the model and scaler just loaded (~0.1 s for 200 full-depth trees): an
+    # exported forest_arrays.npz carries nothing tying it to these pickles, and mtimes don't either
+    try:
+        if hasattr(model, "estimators_") and all(hasattr(e, "tree_") for e in model.estimators_):
+            return ForestEngine.from_model(model, scaler)
+    except Exception:
+        logger.exception("Could not build the forest engine; falling back to sklearn")
+    return None
+
+def _load_bundle_set():
+    bundle = ModelBundle(BUNDLE_PATH)
+    scaler = bundle.load_object("scaler")
+    feature_cols = bundle.feature_cols
+    engine = ForestEngine(bundle.forest_arrays()) if bundle.has_forest() else None
+    info = {
+        "artifacts": [str(BUNDLE_PATH)],
+        "model_class": bundle.header["model_class"],
+        "backend": bundle.backend,
+        "bundle_format": bundle.header["format_version"],
+        "trained_at": bundle.metadata.get("trained_at", bundle.header["created_at"]),
+        "metrics": bundle.metrics,
+        "metadata": bundle.metadata,
+    }
+    return dict(scaler=scaler, feature_cols=feature_cols, engine=engine, info=info,
+                model=None if engine is not None else bundle.load_model(),
+                model_loader=bundle.load_model)
+
+def _load_pickle_set():
+    model = _configure_model(joblib.load(MODEL_PATH))
     scaler = joblib.load(SCALER_PATH)
-    feature_cols = joblib.load(FEATURES_PATH)
+    info = {
+        "artifacts": [str(MODEL_PATH), str(SCALER_PATH), str(FEATURES_PATH)],
+        "model_class": type(model).__name__,
+        # the pickles carry no training metadata; the model file's mtime is the best available proxy
+        "trained_at": datetime.fromtimestamp(MODEL_PATH.stat().st_mtime, timezone.utc).isoformat(),
+    }
+    return dict(model=model, scaler=scaler, feature_cols=joblib.load(FEATURES_PATH), info=info,
+                engine=_load_engine(model, scaler))
+
+def _load_artifact_set(previous=None):
+    paths = _artifact_paths()
+    logger.info(f"Loading artifacts from {', '.join(str(p) for p in paths)}")
+    if not all(p.exists() for p in paths):
+        raise FileNotFoundError("One or more model artifacts missing")
+    signature = _artifact_signature()
+    t0 = time.perf_counter()
+    loaded = _load_bundle_set() if paths == [BUNDLE_PATH] else _load_pickle_set()
+    metrics.artifact_load_seconds.observe(time.perf_counter() - t0)
+    if _artifact_signature() != signature:
+        raise RuntimeError("Artifacts changed while loading; retry once the deployment is complete")
+    feature_cols = list(loaded["feature_cols"])
+    for name, obj in (("model", loaded.get("model")), ("scaler", loaded["scaler"]), ("engine", loaded.get("engine"))):
+        n = getattr(obj, "n_features_in_", getattr(obj, "n_features", len(feature_cols)))
+        if n != len(feature_cols):
+            raise ValueError(f"{name} expects {n} features but the feature list has {len(feature_cols)}")
+    # keep per-machine streaming state when the feature layout is unchanged
+    store = previous.online_store if previous is not None and previous.feature_cols == feature_cols else None
+    return ArtifactSet(signature=signature, online_store=store, **loaded)
+
+def load_artifacts():
+    global artifacts
+    artifacts = _load_artifact_set()
     logger.info("Artifacts loaded.")
 
+def reload_artifacts():
+    """
+    Load a fresh artifact set and swap it in atomically. The current set keeps serving while the
+    new one loads, and stays in place if loading fails. Returns True when a new set was installed.
+    """
+    global artifacts
+    with _reload_lock:
+        try:
+            new = _load_artifact_set(previous=artifacts)
+        except Exception as e:
+            logger.exception("Artifact reload failed; keeping the current artifacts")
+            reload_status["last_error"] = str(e)
+            return False
+        artifacts = new
+        reload_status["reloads"] += 1
+        reload_status["last_reload_at"] = new.loaded_at.isoformat()
+        reload_status["last_error"] = None
+        logger.info("Artifacts reloaded.")
+        return True
+
+def reload_in_background():
+    if _reload_lock.locked():
+        return False
+    threading.Thread(target=reload_artifacts, name="artifact-reload", daemon=True).start()
+    return True
+
+def _watch_artifacts(interval):
+    # reload once a changed signature has been stable for one poll, so half-copied files are skipped
+    seen = None
+    while True:
+        time.sleep(interval)
+        current = artifacts
+        sig = _artifact_signature()
+        if current is None or sig == current.signature:
+            seen = None
+        elif sig == seen:
+            reload_artifacts()
+            seen = None
+        else:
+            seen = sig
+
+@app.before_request
+def _start_request_timer():
+    g.request_t0 = time.perf_counter()
+    g.profile = metrics.profiler.start() if request.endpoint in ("predict", "ingest", "explain") else None
+
+@app.after_request
+def _record_request(response):
+    t0 = g.pop("request_t0", None)
+    if t0 is not None:
+        metrics.observe_request(request.endpoint or "unknown", response.status_code, time.perf_counter() - t0)
+    return response
+
+@app.teardown_request
+def _stop_profile(exc):
+    # teardown also runs when the handler raised, so a sampled profile is always closed
+    prof = g.pop("profile", None)
+    if prof is not None:
+        metrics.profiler.stop(prof, request.endpoint)
+
+@app.before_request
+def _ensure_watcher():
+    # started lazily so each forked worker process gets its own watcher thread
+    global _watcher_pid
+    if RELOAD_POLL_SECONDS > 0 and _watcher_pid != os.getpid():
+        _watcher_pid = os.getpid()
+        threading.Thread(target=_watch_artifacts, args=(RELOAD_POLL_SECONDS,), name="artifact-watcher", daemon=True).start()
+
+def _predict_proba(X_np, art=None):
+    # X_np: raw feature matrix in feature_cols order; returns positive-class probabilities
+    art = art or artifacts
+    metrics.batch_rows.observe(len(X_np))
+    if art.engine is not None and len(X_np) <= ENGINE_MAX_ROWS:
+        # scaler is folded into the engine's thresholds, so it takes the raw features
+        with timed("inference"):
+            return art.engine.predict_proba(X_np)
+    with timed("scale"):
+        X_scaled = art.scaler.transform(X_np)
+    with timed("inference"):
+        return art.model.predict_proba(X_scaled)[:, 1]
+
+def enable_micro_batching(max_wait_ms=2.0, max_rows=256):
+    global batcher
+    batcher = MicroBatcher(_predict_proba, max_wait_ms=max_wait_ms, max_rows=max_rows)
+    logger.info(f"Micro-batching enabled (max wait {max_wait_ms} ms, max {max_rows} rows)")
+    return batcher
+
+if MICRO_BATCH_WAIT_MS > 0:
+    enable_micro_batching(MICRO_BATCH_WAIT_MS, MICRO_BATCH_MAX_ROWS)
+
 # utility: scale and predict
-def scale_and_predict(X_df: pd.DataFrame):
+def scale_and_predict(X_df: pd.DataFrame, ticket=None):
     # X_df: pandas DataFrame with columns matching feature_cols (or a subset)
-    global scaler, model, feature_cols
-    assert scaler is not None, "Scaler is not loaded"
-    assert model is not None, "Model is not loaded"
-    assert feature_cols is not None, "Feature columns are not loaded"
+    # ticket: from batcher.arriving(), lets an open micro-batch wait for this request
+    art = artifacts
+    assert art is not None, "Model artifacts are not loaded"
     # Align features to expected order and fill missing with 0
-    X = X_df.reindex(columns=feature_cols, fill_value=0)
-    X_np = X.to_numpy(dtype=float)
-    X_scaled = scaler.transform(X_np)
-    probs = model.predict_proba(X_scaled)[:, 1]
-    preds = (probs >= 0.5).astype(int)
-    out = []
-    for i, p in enumerate(probs):
-        out.append({"probability": float(p), "prediction": int(preds[i])})
-    return out
+    with timed("reindex"):
+        X = X_df.reindex(columns=art.feature_cols, fill_value=0).to_numpy(dtype=float)
+    probs = predict_matrix(X, ticket=ticket, art=art)
+    return [{"probability": p, "prediction": int(p >= 0.5)} for p in probs.tolist()]
 
-# health endpoint (compatible with your repo)
+def predict_matrix(X_np, ticket=None, art=None):
+    # X_np: float matrix already in the artifact set's feature order; returns positive-class probabilities
+    global batcher
+    art = art or artifacts
+    if batcher is not None:
+        # batches never mix artifact sets, so rows are always scored by the model they were built for
+        return batcher.submit(X_np, ticket, context=art)
+    return _predict_proba(X_np, art)
+
+# health endpoint: answered from in-memory state plus a stat() of the artifact files
 @app.route("/health", methods=["GET"])
 def health():
-    ok = True
-    try:
-        if not (MODEL_PATH.exists() and SCALER_PATH.exists() and FEATURES_PATH.exists()):
-            ok = False
-        else:
-            # try load to ensure they are readable
-            _m = joblib.load(MODEL_PATH)
-            _s = joblib.load(SCALER_PATH)
-            _f = joblib.load(FEATURES_PATH)
-            del _m, _s, _f
-    except Exception as e:
-        logger.exception("Health check load failed")
-        ok = False
-    return jsonify({"ok": ok}), (200 if ok else 503)
+    art = artifacts
+    if art is None:
+        return jsonify({"ok": False, "loaded": False}), 503
+    sig = _artifact_signature()
+    return jsonify({
+        "ok": True,
+        "loaded_at": art.loaded_at.isoformat(),
+        "artifacts_on_disk": all(s is not None for s in sig),
+        "reload_pending": sig != art.signature,
+        "last_reload_error": reload_status["last_error"],
+    }), 200
+
+@app.route("/admin/reload", methods=["POST"])
+def admin_reload():
+    if ADMIN_TOKEN and request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+        return jsonify({"error": "Forbidden"}), 403
+    if request.args.get("wait") in ("1", "true"):
+        ok = reload_artifacts()
+        return jsonify({"reloaded": ok, **reload_status}), (200 if ok else 500)
+    started = reload_in_background()
+    return jsonify({"reloading": True, "already_running": not started}), 202
 
 @app.route("/model/info", methods=["GET"])
 def model_info():
-    global model, scaler, feature_cols
-    if model is None or scaler is None or feature_cols is None:
+    art = artifacts
+    if art is None:
         return jsonify({"error": "Model artifacts not loaded"}), 503
     info = {
         "name": "Predictive Maintenance Model",
         "version": "1.0.0",
-        "artifacts": [str(MODEL_PATH), str(SCALER_PATH), str(FEATURES_PATH)],
-        "trained_at": "2025-01-01T00:00:00Z",
-        "feature_columns": feature_cols,
+        **art.info,
+        "loaded_at": art.loaded_at.isoformat(),
+        "feature_columns": art.feature_cols,
     }
     return jsonify(info), 200
 
@@ -90,51 +351,306 @@ def home():
 
 @app.route("/predict", methods=["POST"])
 def predict():
-    global model, scaler, feature_cols
-    if model is None or scaler is None or feature_cols is None:
+    global batcher
+    art = artifacts
+    if art is None:
         return jsonify({"error": "Model artifacts not loaded"}), 503
+    if batcher is None:
+        return _predict(art, None)
+    with batcher.arriving() as ticket:
+        return _predict(art, ticket)
 
-    try:
-        data = request.get_json(force=True)
-    except Exception:
-        return jsonify({"error": "Invalid JSON"}), 400
-
-    # Support two input forms:
+def _predict(art, ticket):
+    feature_index = art.feature_index
+    mimetype = request.mimetype
+    columnar = False
+    # Support these input forms (see payloads.py):
     # 1) single dict of feature_name: value
-    # 2) list of dicts for batch
-    rows = None
-    if isinstance(data, dict):
-        # may contain "rows" key or be direct feature dict
-        if "rows" in data and isinstance(data["rows"], list):
-            rows = data["rows"]
-        else:
-            rows = [data]
-    elif isinstance(data, list):
-        rows = data
-    else:
-        return jsonify({"error": "JSON payload must be an object or list"}), 400
-
-    # Build DataFrame
+    # 2) list of dicts for batch (or {"rows": [...]})
+    # 3) columnar JSON {"columns": [...], "data": [[...]]}
+    # 4) binary .npy / Arrow IPC bodies
+    # "parse" covers reading/decoding the body, "build" turning it into the feature matrix
+    # (columns are placed by name there, which is where the old DataFrame reindex went)
     try:
-        X = pd.DataFrame(rows)
-    except Exception:
-        return jsonify({"error": "Could not parse rows into DataFrame"}), 400
+        if mimetype in (NPY_MIMETYPE, ARROW_MIMETYPE):
+            with timed("parse"):
+                body = request.get_data()
+            with timed("build"):
+                if mimetype == NPY_MIMETYPE:
+                    X_np = npy_to_matrix(body, len(art.feature_cols))
+                else:
+                    X_np = arrow_to_matrix(body, feature_index)
+        else:
+            try:
+                with timed("parse"):
+                    data = request.get_json(force=True)
+            except Exception:
+                return jsonify({"error": "Invalid JSON"}), 400
+            with timed("build"):
+                if isinstance(data, dict) and "columns" in data and "data" in data:
+                    columnar = True
+                    X_np = columnar_to_matrix(data["columns"], data["data"], feature_index)
+                elif isinstance(data, dict):
+                    # may contain "rows" key or be direct feature dict
+                    rows = data["rows"] if isinstance(data.get("rows"), list) else [data]
+                    X_np = rows_to_matrix(rows, feature_index)
+                elif isinstance(data, list):
+                    X_np = rows_to_matrix(data, feature_index)
+                else:
+                    return jsonify({"error": "JSON payload must be an object or list"}), 400
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
 
-    # Basic validation: ensure at least one sensor col present
-    if X.shape[0] == 0:
+    if X_np.shape[0] == 0:
         return jsonify({"error": "No rows provided"}), 400
 
     try:
-        out = scale_and_predict(X)
+        probs = predict_matrix(X_np, ticket=ticket, art=art)
     except Exception as e:
         logger.exception("Prediction failed")
         return jsonify({"error": "Prediction failed", "detail": str(e)}), 500
+    with timed("serialize"):
+        return _predict_response(mimetype, columnar, probs)
 
+def _predict_response(mimetype, columnar, probs):
+    preds = (probs >= 0.5).astype(int)
+    # binary and columnar requests get packed arrays back in the same format
+    if mimetype == NPY_MIMETYPE:
+        return Response(npy_response_body(probs, preds), mimetype=NPY_MIMETYPE)
+    if mimetype == ARROW_MIMETYPE:
+        return Response(arrow_response_body(probs, preds), mimetype=ARROW_MIMETYPE)
+    if columnar:
+        return jsonify({"probability": probs.tolist(), "prediction": preds.tolist()}), 200
+    out = [{"probability": p, "prediction": int(p >= 0.5)} for p in probs.tolist()]
     # If single input, return single object
     if len(out) == 1:
         return jsonify(out[0]), 200
     return jsonify({"predictions": out}), 200
 
+@app.route("/explain", methods=["POST"])
+def explain():
+    """
+    Top-k feature contributions for a row or batch (same JSON forms as /predict).
+    ?top_k= (default EXPLAIN_TOP_K) and ?budget_ms= (default EXPLAIN_BUDGET_MS) per request.
+    Rows the exact explainer cannot finish within the budget get the cheaper approximation;
+    each explanation names its "method" (see explainer.py).
+    """
+    art = artifacts
+    if art is None:
+        return jsonify({"error": "Model artifacts not loaded"}), 503
+    try:
+        top_k = int(request.args.get("top_k", EXPLAIN_TOP_K))
+        budget_ms = float(request.args.get("budget_ms", EXPLAIN_BUDGET_MS))
+    except ValueError:
+        return jsonify({"error": "top_k and budget_ms must be numbers"}), 400
+    if top_k < 1 or budget_ms < 0:
+        return jsonify({"error": "top_k must be >= 1 and budget_ms >= 0"}), 400
+
+    try:
+        with timed("parse"):
+            data = request.get_json(force=True)
+    except Exception:
+        return jsonify({"error": "Invalid JSON"}), 400
+    try:
+        with timed("build"):
+            if isinstance(data, dict) and "columns" in data and "data" in data:
+                X_np = columnar_to_matrix(data["columns"], data["data"], art.feature_index)
+            elif isinstance(data, dict):
+                rows = data["rows"] if isinstance(data.get("rows"), list) else [data]
+                X_np = rows_to_matrix(rows, art.feature_index)
+            elif isinstance(data, list):
+                X_np = rows_to_matrix(data, art.feature_index)
+            else:
+                return jsonify({"error": "JSON payload must be an object or list"}), 400
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
+    if X_np.shape[0] == 0:
+        return jsonify({"error": "No rows provided"}), 400
+    if X_np.shape[0] > EXPLAIN_MAX_ROWS:
+        return jsonify({"error": f"At most {EXPLAIN_MAX_ROWS} rows per /explain request"}), 413
+
+    try:
+        probs = _predict_proba(X_np, art)
+        explainer = art.explainer
+        with timed("explain"):
+            contrib, base, methods = explainer.explain(X_np, budget_s=budget_ms / 1000)
+    except Exception as e:
+        logger.exception("Explanation failed")
+        return jsonify({"error": "Explanation failed", "detail": str(e)}), 500
+    metrics.count_explained(methods)
+    with timed("serialize"):
+        out = explainer.top_k(X_np, contrib, base, methods, probs, k=top_k)
+        if len(out) == 1:
+            return jsonify(out[0]), 200
+        return jsonify({"explanations": out}), 200
+
+@app.route("/predict/csv", methods=["POST"])
+def predict_csv():
+    """
+    Score a CSV upload (raw body, header row of feature names) chunk by chunk and stream the scores
+    back while the body is still being read: NDJSON by default, CSV with ?format=csv or Accept: text/csv.
+    Each output row carries its 0-based row number and any machine_id / cycle / id columns of the input.
+    """
+    art = artifacts
+    if art is None:
+        return jsonify({"error": "Model artifacts not loaded"}), 503
+    fmt = request.args.get("format") or ("csv" if request.accept_mimetypes.best == CSV_MIMETYPE else "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+    chunk_rows = request.args.get("chunk_rows", CSV_CHUNK_ROWS, type=int)
+    if not chunk_rows or chunk_rows <= 0:
+        return jsonify({"error": "chunk_rows must be a positive integer"}), 400
+
+    chunks = iter_csv_chunks(request.stream, art.feature_index, chunk_rows)
+    # read the first chunk up front so a bad header or body is still a plain 400
+    try:
+        first = next(chunks, None)
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
+    if first is None or len(first[0]) == 0:
+        return jsonify({"error": "No rows provided"}), 400
+
+    def error_line(message, row):
+        # headers are already sent, so failures are reported in-band as the last line
+        return (json.dumps({"error": message, "row": row}) + "\n") if fmt == "ndjson" else f"# error: {message}\n"
+
+    def generate():
+        start = 0
+        pending = [first]
+        while True:
+            try:
+                X, extra = pending.pop() if pending else next(chunks)
+            except StopIteration:
+                return
+            except PayloadError as e:
+                yield error_line(str(e), start)
+                return
+            try:
+                probs = predict_matrix(X, art=art)
+            except Exception as e:
+                logger.exception("Prediction failed")
+                yield error_line(f"Prediction failed: {e}", start)
+                return
+            with timed("serialize"):
+                yield _score_chunk(fmt, start, probs, extra, header=start == 0)
+            start += len(X)
+
+    mimetype = NDJSON_MIMETYPE if fmt == "ndjson" else CSV_MIMETYPE
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+def _score_chunk(fmt, start, probs, extra, header=False):
+    preds = (probs >= 0.5).astype(int)
+    out = {"row": np.arange(start, start + len(probs)), **extra, "probability": probs, "prediction": preds}
+    if fmt == "csv":
+        return pd.DataFrame(out).to_csv(index=False, header=header)
+    names = list(out)
+    columns = [out[n].tolist() if isinstance(out[n], np.ndarray) else out[n] for n in names]
+    return "".join(json.dumps(dict(zip(names, values))) + "\n" for values in zip(*columns))
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus-format request counts, per-stage latency histograms, batch sizes and load times."""
+    global batcher
+    art = artifacts
+    extra = []
+    if batcher is not None:
+        extra = [("pm_micro_batch_rows", "Rows per coalesced micro-batch.", batcher.batch_sizes),
+                 ("pm_micro_batch_wait_ms", "Time requests waited for their micro-batch (ms).", batcher.wait_ms)]
+    gauges = [("pm_artifacts_loaded", "1 when model artifacts are loaded.", int(art is not None)),
+              ("pm_artifact_reloads_total", "Successful hot reloads.", reload_status["reloads"])]
+    if art is not None:
+        gauges.append(("pm_artifacts_loaded_timestamp_seconds", "When the current artifacts were loaded.",
+                       art.loaded_at.timestamp()))
+        if art.online_store is not None:
+            gauges.append(("pm_online_machines", "Machines with streaming feature state.", len(art.online_store)))
+    return Response(metrics.render(extra, gauges), mimetype="text/plain; version=0.0.4")
+
+@app.route("/stats/batching", methods=["GET"])
+def batching_stats():
+    global batcher
+    if batcher is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **batcher.stats()}), 200
+
+@app.route("/ingest", methods=["POST"])
+def ingest():
+    """
+    Score raw telemetry readings: {"machine_id", "cycle", "sensor_*"} (single object, list or {"rows": [...]}).
+    Each reading updates the machine's rolling state; readings are scored once the machine has enough
+    history for the lag features, otherwise they are returned with "ready": false.
+    """
+    art = artifacts
+    if art is None:
+        return jsonify({"error": "Model artifacts not loaded"}), 503
+
+    try:
+        with timed("parse"):
+            data = request.get_json(force=True)
+    except Exception:
+        return jsonify({"error": "Invalid JSON"}), 400
+
+    if isinstance(data, dict):
+        readings = data["rows"] if isinstance(data.get("rows"), list) else [data]
+    elif isinstance(data, list):
+        readings = data
+    else:
+        return jsonify({"error": "JSON payload must be an object or list"}), 400
+    if len(readings) == 0:
+        return jsonify({"error": "No rows provided"}), 400
+
+    store = art.online_store
+    results = []
+    t_build = time.perf_counter()
+    # validate the whole batch before touching any machine state, so a rejected batch can be resent as-is
+    parsed = []
+    for i, r in enumerate(readings):
+        if not isinstance(r, dict) or "machine_id" not in r:
+            return jsonify({"error": f"Reading {i} has no machine_id"}), 400
+        try:
+            values = [float(r[c]) for c in store.sensor_cols]
+        except KeyError as e:
+            return jsonify({"error": f"Reading {i} is missing {e.args[0]}"}), 400
+        except (TypeError, ValueError):
+            return jsonify({"error": f"Reading {i} has non-numeric sensor values"}), 400
+        # a NaN/inf would stay in the machine's running window sums until the next resync
+        if not np.isfinite(values).all():
+            return jsonify({"error": f"Reading {i} has non-finite sensor values"}), 400
+        cycle = r.get("cycle")
+        if cycle is not None:
+            try:
+                cycle = int(cycle)
+            except (TypeError, ValueError):
+                return jsonify({"error": f"Reading {i} has a non-integer cycle"}), 400
+        parsed.append((r, cycle, values))
+
+    X = np.empty((len(readings), len(store.feature_cols)))
+    ready_idx = []
+    for i, (r, cycle, values) in enumerate(parsed):
+        feats, accepted = store.update(str(r["machine_id"]), cycle, values)
+        res = {"machine_id": r["machine_id"], "cycle": r.get("cycle"), "ready": feats is not None}
+        if not accepted:
+            res["error"] = "stale reading (cycle not newer than last seen)"
+        if feats is not None:
+            X[len(ready_idx)] = feats
+            ready_idx.append(i)
+        results.append(res)
+
+    metrics.stage_seconds["build"].observe(time.perf_counter() - t_build)
+
+    if ready_idx:
+        try:
+            probs = predict_matrix(X[:len(ready_idx)], art=art)
+        except Exception as e:
+            logger.exception("Prediction failed")
+            return jsonify({"error": "Prediction failed", "detail": str(e)}), 500
+        for i, p in zip(ready_idx, probs.tolist()):
+            results[i].update({"probability": p, "prediction": int(p >= 0.5)})
+
+    with timed("serialize"):
+        if len(results) == 1:
+            return jsonify(results[0]), 200
+        return jsonify({"predictions": results}), 200
+
 if __name__ == "__main__":
     # If artifacts are present on disk, load now (for development server).
     try:
@@ -142,4 +658,4 @@ if __name__ == "__main__":
     except Exception as e:
         logger.warning(f"Artifacts not loaded at startup: {e}")
     port = int(os.environ.get("PORT", 5000))
-    app.run(host="0.0.0.0", port=port, debug=False)
\ No newline at end of file
+    app.run(host=os.environ.get("HOST", "0.0.0.0"), port=port, debug=False)
\ No newline at end of file
@@ -5,11 +5,24 @@ Lightweight production runner using Waitress (works on Windows).
 
 Usage:
   python serve_production.py --port 5000 --threads 4
+  python serve_production.py --port 5000 --threads 16 --micro-batch-ms 2 --micro-batch-rows 256
+  python serve_production.py --port 5000 --workers 8 --threads 4     # Linux/macOS: multi-process
 
 This will import the WSGI app from `wsgi.py` and run it with Waitress.
+
+With --workers N the artifacts are loaded once in a parent process, which binds the listening socket
+and forks N worker processes that each run Waitress on that shared socket. The model pages are
+shared copy-on-write with the parent (fully shared, read-only, when serving from a model bundle),
+so scoring uses N cores instead of being serialized on one GIL. The parent restarts any worker
+that dies and forwards SIGTERM/SIGINT to all workers on shutdown.
 """
 import argparse
+import gc
+import os
+import signal
+import socket
 import sys
+import time
 
 try:
     from waitress import serve
@@ -17,23 +30,109 @@ except Exception:
     serve = None  # type: ignore
 
 from wsgi import app  # this will load artifacts at import-time
+import serve_model
 
 if app is None:
     raise ValueError("The WSGI app could not be loaded. Ensure 'app' is properly defined in 'wsgi.py'.")
 
 
+def _bind(host, port, backlog=2048):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    return sock
+
+
+def run_workers(host, port, workers, threads):
+    """Pre-fork `workers` Waitress processes sharing one listening socket; restart any that die."""
+    if not hasattr(os, "fork"):
+        print("--workers needs fork(); on Windows run a single process with --threads", file=sys.stderr)
+        sys.exit(1)
+    sock = _bind(host, port)
+    # one sklearn thread per predict call in each worker; parallelism comes from the processes
+    serve_model.MODEL_N_JOBS = 1
+    if serve_model.artifacts is not None and serve_model.artifacts._model is not None:
+        serve_model._configure_model(serve_model.artifacts._model)
+    # keep the garbage collector from touching (and so copying) the parent's objects in every worker
+    gc.collect()
+    gc.freeze()
+
+    children = {}
+    stopping = False
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            code = 0
+            try:
+                serve(app, sockets=[sock], threads=threads)
+            except Exception as e:
+                print(f"Worker {os.getpid()} failed: {e}", file=sys.stderr)
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for _ in range(workers):
+        spawn()
+    print(f"Started {workers} workers: {sorted(children)}")
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if stopping or started is None:
+            continue
+        print(f"Worker {pid} exited (status {status}); restarting", file=sys.stderr)
+        # back off when a worker dies right after starting, instead of fork-looping
+        if time.monotonic() - started < 1.0:
+            time.sleep(1.0)
+        spawn()
+    sock.close()
+
+
 def main():
     parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="0.0.0.0", help="Address to bind")
     parser.add_argument("--port", type=int, default=5000, help="Port to bind")
-    parser.add_argument("--threads", type=int, default=4, help="Number of threads for waitress")
+    parser.add_argument("--threads", type=int, default=4, help="Number of threads for waitress (per worker)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of forked worker processes sharing the preloaded model (POSIX only)")
+    parser.add_argument("--micro-batch-ms", type=float, default=0.0,
+                        help="Coalesce concurrent /predict calls for up to this many ms (0 disables)")
+    parser.add_argument("--micro-batch-rows", type=int, default=256, help="Maximum rows per coalesced batch")
     args = parser.parse_args()
 
     if serve is None:
         print("Waitress is not installed. Install it with: pip install waitress", file=sys.stderr)
         sys.exit(1)
 
-    print(f"Starting production server on 0.0.0.0:{args.port} with {args.threads} threads")
-    serve(app, host="0.0.0.0", port=args.port, threads=args.threads)
+    if args.micro_batch_ms > 0 and serve_model.batcher is None:
+        serve_model.enable_micro_batching(args.micro_batch_ms, args.micro_batch_rows)
+
+    if args.workers > 1:
+        print(f"Starting production server on {args.host}:{args.port} with {args.workers} workers x {args.threads} threads")
+        run_workers(args.host, args.port, args.workers, args.threads)
+        return
+
+    print(f"Starting production server on {args.host}:{args.port} with {args.threads} threads")
+    serve(app, host=args.host, port=args.port, threads=args.threads)
 
 
 if __name__ == "__main__":
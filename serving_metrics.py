@@ -0,0 +1,174 @@
+"""
+serving_metrics.py
+Low-overhead latency instrumentation for the serving path, exported in the Prometheus text format.
+
+- Stage timers: `with timed("parse"): ...` records the wall time of one stage of a request
+  (parse, build, reindex, scale, inference, explain, serialize) into a fixed-bucket histogram.
+- Request counters and end-to-end latency per endpoint and status, batch-size distribution of
+  model calls, artifact-load times and /explain rows by explanation method.
+- Opt-in sampling profiler: with PROFILE_EVERY_N=N, one in N requests runs under cProfile and
+  its stats are dumped to PROFILE_DIR (inspect with `python -m pstats <file>` or snakeviz).
+
+Everything is per process: with `serve_production.py --workers N` each scrape reports the worker
+that answered it.
+"""
+import cProfile
+import os
+import threading
+import time
+from pathlib import Path
+from micro_batcher import Histogram, BATCH_SIZE_BUCKETS
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+LOAD_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+STAGES = ("parse", "build", "reindex", "scale", "inference", "explain", "serialize")
+
+PROFILE_EVERY_N = int(os.environ.get("PROFILE_EVERY_N", 0))
+PROFILE_DIR = Path(os.environ.get("PROFILE_DIR", "profiles"))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", 100))
+
+stage_seconds = {s: Histogram(LATENCY_BUCKETS) for s in STAGES}
+request_seconds = {}
+requests_total = {}
+batch_rows = Histogram(BATCH_SIZE_BUCKETS)
+artifact_load_seconds = Histogram(LOAD_BUCKETS)
+explain_rows = {}
+_lock = threading.Lock()
+
+
+class timed:
+    """Context manager adding the elapsed wall time of its block to the `stage` histogram."""
+    __slots__ = ("hist", "t0")
+
+    def __init__(self, stage):
+        self.hist = stage_seconds[stage]
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0)
+        return False
+
+
+def observe_request(endpoint, status, seconds):
+    key = (endpoint, int(status))
+    with _lock:
+        requests_total[key] = requests_total.get(key, 0) + 1
+        hist = request_seconds.get(endpoint)
+        if hist is None:
+            hist = request_seconds[endpoint] = Histogram(LATENCY_BUCKETS)
+    hist.observe(seconds)
+
+
+def count_explained(methods):
+    """methods: the explanation method of each row of an /explain call"""
+    with _lock:
+        for m in methods:
+            explain_rows[m] = explain_rows.get(m, 0) + 1
+
+
+class SamplingProfiler:
+    """Profiles one in `every_n` calls of `start()` (one at a time per process) and dumps .prof files."""
+
+    def __init__(self, every_n=PROFILE_EVERY_N, out_dir=PROFILE_DIR, keep=PROFILE_KEEP):
+        self.every_n = int(every_n)
+        self.out_dir = Path(out_dir)
+        self.keep = int(keep)
+        self.dumps = 0
+        self._seen = 0
+        self._busy = threading.Lock()
+
+    def start(self):
+        """Returns a running profiler for sampled requests, otherwise None."""
+        if self.every_n <= 0:
+            return None
+        with _lock:
+            self._seen += 1
+            sampled = self._seen % self.every_n == 0
+        # cProfile hooks the calling thread only, and only one profiler can be active at a time
+        if not sampled or not self._busy.acquire(blocking=False):
+            return None
+        prof = cProfile.Profile()
+        try:
+            prof.enable()
+        except ValueError:
+            self._busy.release()
+            return None
+        return prof
+
+    def stop(self, prof, name):
+        try:
+            prof.disable()
+            self.out_dir.mkdir(parents=True, exist_ok=True)
+            path = self.out_dir / f"{name}-{os.getpid()}-{time.time_ns()}.prof"
+            prof.dump_stats(path)
+            self.dumps += 1
+            self._trim()
+            return path
+        finally:
+            self._busy.release()
+
+    def _trim(self):
+        files = sorted(self.out_dir.glob("*.prof"), key=lambda p: p.stat().st_mtime)
+        for p in files[:max(0, len(files) - self.keep)]:
+            p.unlink(missing_ok=True)
+
+
+profiler = SamplingProfiler()
+
+
+def _esc(v):
+    return str(v).replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _render_histogram(lines, name, hist, labels=""):
+    snap = hist.snapshot()
+    sep = "," if labels else ""
+    cumulative = 0
+    for le, count in snap["buckets"].items():
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels}{sep}le="{le}"}} {cumulative}')
+    suffix = f"{{{labels}}}" if labels else ""
+    lines.append(f"{name}_sum{suffix} {snap['sum']}")
+    lines.append(f"{name}_count{suffix} {snap['count']}")
+
+
+def render(extra_histograms=(), gauges=()):
+    """
+    Prometheus text exposition of all metrics.
+    extra_histograms: (name, help, Histogram) triples, e.g. the micro-batcher's
+    gauges: (name, help, value) triples
+    """
+    lines = []
+    lines += ["# HELP pm_requests_total HTTP requests by endpoint and status code.", "# TYPE pm_requests_total counter"]
+    with _lock:
+        counts = sorted(requests_total.items())
+        per_endpoint = sorted(request_seconds.items())
+    for (endpoint, status), n in counts:
+        lines.append(f'pm_requests_total{{endpoint="{_esc(endpoint)}",status="{status}"}} {n}')
+    lines += ["# HELP pm_request_seconds End-to-end request latency.", "# TYPE pm_request_seconds histogram"]
+    for endpoint, hist in per_endpoint:
+        _render_histogram(lines, "pm_request_seconds", hist, f'endpoint="{_esc(endpoint)}"')
+    lines += ["# HELP pm_stage_seconds Latency of each serving stage.", "# TYPE pm_stage_seconds histogram"]
+    for stage, hist in stage_seconds.items():
+        _render_histogram(lines, "pm_stage_seconds", hist, f'stage="{stage}"')
+    lines += ["# HELP pm_batch_rows Rows per model call.", "# TYPE pm_batch_rows histogram"]
+    _render_histogram(lines, "pm_batch_rows", batch_rows)
+    lines += ["# HELP pm_artifact_load_seconds Time to load an artifact set.", "# TYPE pm_artifact_load_seconds histogram"]
+    _render_histogram(lines, "pm_artifact_load_seconds", artifact_load_seconds)
+    lines += ["# HELP pm_explain_rows_total Rows explained, by method (exact or fallback).",
+              "# TYPE pm_explain_rows_total counter"]
+    with _lock:
+        explained = sorted(explain_rows.items())
+    for method, n in explained:
+        lines.append(f'pm_explain_rows_total{{method="{_esc(method)}"}} {n}')
+    for name, help_text, hist in extra_histograms:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        _render_histogram(lines, name, hist)
+    for name, help_text, value in gauges:
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge", f"{name} {value}"]
+    lines += ["# HELP pm_profiles_written_total Sampled cProfile dumps written.", "# TYPE pm_profiles_written_total counter",
+              f"pm_profiles_written_total {profiler.dumps}"]
+    return "\n".join(lines) + "\n"
@@ -2,75 +2,153 @@
 simulate_data.py
 Generates synthetic telemetry data for multiple machines with occasional failures.
 Produces CSV with columns: timestamp, machine_id, cycle, sensor_1...sensor_n, failure (0/1)
+
+Every machine draws from its own generator seeded by (seed, machine_id), so a machine's data is the
+same whichever worker simulates it and in whatever order. Large fleets can be written as partitioned,
+compressed files generated in parallel (one file per block of machines, written machine by machine),
+e.g. 10k machines x 100k cycles:
+  python simulate_data.py --machines 10000 --cycles 100000 --out data/fleet/ --workers 16
+Optional defects (missing sensor values, duplicated rows, several failures per machine) exercise the
+cleaning path.
 """
 import numpy as np
 import pandas as pd
 from pathlib import Path
 import argparse
-import random
-from datetime import datetime, timedelta
+import gzip
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+SENSOR_COLS = ["sensor_1", "sensor_2", "sensor_3", "sensor_4", "sensor_5"]
+
+def machine_rng(seed, machine_id):
+    """Independent, reproducible random stream per machine (fresh entropy when seed is None)."""
+    if seed is None:
+        return np.random.default_rng()
+    return np.random.default_rng(np.random.SeedSequence([int(seed), int(machine_id)]))
 
-def simulate_machine(machine_id, n_cycles=2000, seed=None):
+def simulate_machine(machine_id, n_cycles=2000, seed=None, end_time=None, missing_rate=0.0,
+                     duplicate_rate=0.0, max_failures=1):
     """
     Simulate telemetry for a single machine.
     We simulate gradual degradation in some sensors and occasional spikes/noise.
     We'll produce an RUL (remaining useful life) concept and mark a failure when degradation crosses threshold.
+    end_time: timestamp of the last cycle (default: now); cycles are one minute apart
+    missing_rate: fraction of sensor values replaced by NaN
+    duplicate_rate: fraction of rows written twice
+    max_failures: up to this many failure events for machines that fail (1 = the original behaviour)
     """
-    if seed is not None:
-        np.random.seed(seed + int(machine_id))
+    rng = machine_rng(seed, machine_id)
     cycles = np.arange(n_cycles)
-    timestamps = [datetime.now() - timedelta(minutes=(n_cycles - i)) for i in range(n_cycles)]
+    end_time = pd.Timestamp.now() if end_time is None else pd.Timestamp(end_time)
+    timestamps = end_time - pd.to_timedelta(n_cycles - cycles, unit="min")
     # Sensors: baseline + noise + degradation trend
-    sensor_1 = 50 + 0.01 * cycles + np.random.normal(0, 0.5, n_cycles)  # slowly drifting
-    sensor_2 = 80 + 0.005 * cycles + np.random.normal(0, 1.0, n_cycles)
-    sensor_3 = 100 + np.sin(cycles / 50.0) * 2 + np.random.normal(0, 0.3, n_cycles)  # cyclic
-    sensor_4 = 30 + (cycles ** 0.5) * 0.1 + np.random.normal(0, 0.2, n_cycles)
-    sensor_5 = 250 + np.random.normal(0, 5, n_cycles)  # noisy but stationary
+    sensor_1 = 50 + 0.01 * cycles + rng.normal(0, 0.5, n_cycles)  # slowly drifting
+    sensor_2 = 80 + 0.005 * cycles + rng.normal(0, 1.0, n_cycles)
+    sensor_3 = 100 + np.sin(cycles / 50.0) * 2 + rng.normal(0, 0.3, n_cycles)  # cyclic
+    sensor_4 = 30 + (cycles ** 0.5) * 0.1 + rng.normal(0, 0.2, n_cycles)
+    sensor_5 = 250 + rng.normal(0, 5, n_cycles)  # noisy but stationary
 
-    # Degradation combined signal
-    degradation = 0.02 * cycles + np.random.normal(0, 0.5, n_cycles)
-    # Choose failure cycle randomly per machine but biased to later cycles
-    failure_cycle = int(n_cycles * np.clip(np.random.beta(2, 20), 0.1, 0.95))
-    # Safety: some machines may not fail within this simulation window
-    will_fail = np.random.rand() < 0.6  # 60% machines fail
     failure_signal = np.zeros(n_cycles, dtype=int)
-    if will_fail:
-        # increase sensors after failure point to simulate warning signs
-        fail_idx = failure_cycle
-        sensor_1[fail_idx:] += np.linspace(0, 10, n_cycles - fail_idx)
-        sensor_2[fail_idx:] += np.linspace(0, 20, n_cycles - fail_idx)
-        # Mark one failure event at fail_idx
-        failure_signal[fail_idx] = 1
+    # Safety: some machines may not fail within this simulation window
+    will_fail = rng.random() < 0.6  # 60% machines fail
+    if will_fail and n_cycles > 1:
+        # Choose failure cycles randomly per machine but biased to later cycles
+        n_fail = int(rng.integers(1, max_failures + 1))
+        fail_at = np.unique((n_cycles * np.clip(rng.beta(2, 20, n_fail), 0.1, 0.95)).astype(int))
+        # increase sensors after each failure point (up to the next one) to simulate warning signs
+        bounds = np.append(fail_at, n_cycles)
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            sensor_1[start:stop] += np.linspace(0, 10, n_cycles - start)[:stop - start]
+            sensor_2[start:stop] += np.linspace(0, 20, n_cycles - start)[:stop - start]
+        failure_signal[fail_at] = 1
+
+    sensors = np.column_stack([sensor_1, sensor_2, sensor_3, sensor_4, sensor_5])
+    if missing_rate > 0:
+        sensors[rng.random(sensors.shape) < missing_rate] = np.nan
+    rows = np.arange(n_cycles)
+    if duplicate_rate > 0:
+        rows = np.repeat(rows, 1 + (rng.random(n_cycles) < duplicate_rate))
 
     df = pd.DataFrame({
-        "timestamp": timestamps,
+        "timestamp": timestamps[rows],
         "machine_id": f"machine_{machine_id}",
-        "cycle": cycles,
-        "sensor_1": sensor_1,
-        "sensor_2": sensor_2,
-        "sensor_3": sensor_3,
-        "sensor_4": sensor_4,
-        "sensor_5": sensor_5,
-        "failure": failure_signal
+        "cycle": cycles[rows],
+        **{c: sensors[rows, i] for i, c in enumerate(SENSOR_COLS)},
+        "failure": failure_signal[rows],
     })
     return df
 
-def generate_dataset(n_machines=50, cycles_per_machine=2000, out_path="machine_data_1000.csv", seed=42):
-    np.random.seed(seed)
-    rows = []
-    for m in range(n_machines):
-        dfm = simulate_machine(m, n_cycles=cycles_per_machine, seed=seed)
-        rows.append(dfm)
-    data = pd.concat(rows, ignore_index=True)
-    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-    data.to_csv(out_path, index=False)
-    print(f"Saved synthetic dataset to {out_path}, shape={data.shape}")
+def _write_partition(out_path, machine_ids, n_cycles, seed, end_time, fmt, knobs):
+    """Simulate `machine_ids` one machine at a time into a single file; returns (path, rows)."""
+    tmp = out_path.with_name(out_path.name + f".tmp{os.getpid()}")
+    rows = 0
+    if fmt == "parquet":
+        frames = [simulate_machine(m, n_cycles, seed, end_time, **knobs) for m in machine_ids]
+        rows = sum(len(f) for f in frames)
+        pd.concat(frames, ignore_index=True).to_parquet(tmp, index=False)
+    else:
+        # fast gzip level: text formatting already dominates, and level 9 would double the write time
+        f = gzip.open(tmp, "wt", newline="", compresslevel=1) if fmt == "csv.gz" else open(tmp, "w", newline="")
+        with f:
+            for i, m in enumerate(machine_ids):
+                dfm = simulate_machine(m, n_cycles, seed, end_time, **knobs)
+                dfm.to_csv(f, index=False, header=i == 0)
+                rows += len(dfm)
+    os.replace(tmp, out_path)
+    return out_path, rows
+
+def generate_dataset(n_machines=50, cycles_per_machine=2000, out_path="machine_data_1000.csv", seed=42,
+                     workers=1, machines_per_file=None, fmt="csv.gz", missing_rate=0.0, duplicate_rate=0.0,
+                     max_failures=1):
+    """
+    out_path ending in .csv: one CSV, written machine by machine.
+    Otherwise out_path is a directory of part-NNNNN.<fmt> files (fmt: csv.gz, csv or parquet), each
+    holding `machines_per_file` machines (default: about one million rows per file), generated by
+    `workers` processes.
+    """
+    knobs = {"missing_rate": missing_rate, "duplicate_rate": duplicate_rate, "max_failures": max_failures}
+    end_time = pd.Timestamp.now().floor("s")
+    t0 = time.perf_counter()
+    out_path = Path(out_path)
+    if out_path.suffix == ".csv":
+        out_path.parent.mkdir(parents=True, exist_ok=True)
+        _, rows = _write_partition(out_path, range(n_machines), cycles_per_machine, seed, end_time, "csv", knobs)
+        print(f"Saved synthetic dataset to {out_path}, {rows:,} rows in {time.perf_counter() - t0:.1f}s")
+        return out_path
+
+    out_path.mkdir(parents=True, exist_ok=True)
+    per_file = machines_per_file or max(1, 1_000_000 // max(cycles_per_machine, 1))
+    blocks = [range(s, min(s + per_file, n_machines)) for s in range(0, n_machines, per_file)]
+    paths = [out_path / f"part-{i:05d}.{fmt}" for i in range(len(blocks))]
+    total = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(_write_partition, p, b, cycles_per_machine, seed, end_time, fmt, knobs)
+                   for p, b in zip(paths, blocks)]
+        for f in futures:
+            path, rows = f.result()
+            total += rows
+            elapsed = time.perf_counter() - t0
+            print(f"{path.name}: {rows:,} rows | total {total:,} rows, {total / max(elapsed, 1e-9):,.0f} rows/sec")
+    print(f"Saved synthetic dataset to {out_path}/ ({len(paths)} files, {total:,} rows) in {time.perf_counter() - t0:.1f}s")
     return out_path
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--machines", type=int, default=50)
     parser.add_argument("--cycles", type=int, default=2000)
-    parser.add_argument("--out", type=str, default="machine_data_1000.csv")
+    parser.add_argument("--out", type=str, default="machine_data_1000.csv",
+                        help="a .csv file, or a directory for partitioned output")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="processes for partitioned output")
+    parser.add_argument("--machines_per_file", type=int, default=None)
+    parser.add_argument("--format", choices=["csv.gz", "csv", "parquet"], default="csv.gz")
+    parser.add_argument("--missing_rate", type=float, default=0.0, help="fraction of sensor values left empty")
+    parser.add_argument("--duplicate_rate", type=float, default=0.0, help="fraction of rows written twice")
+    parser.add_argument("--max_failures", type=int, default=1, help="failure events per failing machine, at most")
     args = parser.parse_args()
-    generate_dataset(n_machines=args.machines, cycles_per_machine=args.cycles, out_path=args.out)
\ No newline at end of file
+    generate_dataset(n_machines=args.machines, cycles_per_machine=args.cycles, out_path=args.out, seed=args.seed,
+                     workers=args.workers, machines_per_file=args.machines_per_file, fmt=args.format,
+                     missing_rate=args.missing_rate, duplicate_rate=args.duplicate_rate,
+                     max_failures=args.max_failures)
@@ -0,0 +1,59 @@
+"""
+Checks for the mergeable feature moments in `analysis_model.py`.
+
+Run from the project root:
+  python -m pytest tests/test_analysis_model.py
+"""
+import numpy as np
+import pandas as pd
+
+from analysis_model import FeatureMoments, frame_moments, stream_moments
+from simulate_data import generate_dataset
+from preprocessing import load_data, basic_cleaning
+from features import create_rolling_features
+
+
+def _data(n=5000, d=6, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(loc=50, scale=3, size=(n, d))
+    X[:, 1] = 2 * X[:, 0] + rng.normal(scale=0.01, size=n)
+    X[:, 3] = 7.0
+    # gaps only where they cannot blur the f0 / f1 pair
+    X[:, [2, 4, 5]] = np.where(rng.random((n, 3)) < 0.05, np.nan, X[:, [2, 4, 5]])
+    y = (np.nan_to_num(X[:, 0]) + rng.normal(size=n) > 51).astype(int)
+    return X, y
+
+
+def test_chunked_merge_matches_numpy():
+    X, y = _data()
+    cols = [f"f{i}" for i in range(X.shape[1])]
+    whole = FeatureMoments(cols).update(X, y)
+    # uneven chunks, merged in a tree rather than left to right
+    cuts = [0, 7, 1000, 1001, 3500, len(X)]
+    parts = [FeatureMoments(cols).update(X[a:b], y[a:b]) for a, b in zip(cuts[:-1], cuts[1:])]
+    merged = parts[0].merge(parts[1]).merge(parts[2].merge(parts[3]).merge(parts[4]))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        expected = np.corrcoef(np.column_stack([np.nan_to_num(X), y]), rowvar=False)
+    for state in (whole, merged):
+        stats = state.feature_stats()
+        np.testing.assert_allclose(stats["mean"], np.nanmean(X, axis=0), rtol=1e-10)
+        np.testing.assert_allclose(stats["variance"], np.nanvar(X, axis=0, ddof=1), rtol=1e-8, atol=1e-12)
+        np.testing.assert_allclose(stats["missing_rate"], np.isnan(X).mean(axis=0))
+        corr = state.correlation()
+        live = [0, 1, 2, 4, 5, 6]
+        np.testing.assert_allclose(corr[np.ix_(live, live)], expected[np.ix_(live, live)], atol=1e-10)
+        assert np.isnan(stats["corr"][3]) and stats["variance"][3] == 0
+    pairs = merged.redundant_pairs(0.95)
+    assert pairs[["feature_a", "feature_b"]].values.tolist() == [["f0", "f1"]]
+
+
+def test_streaming_pass_matches_in_memory_frame(tmp_path):
+    path = generate_dataset(n_machines=6, cycles_per_machine=250, out_path=tmp_path / "fleet.csv", seed=4)
+    cols = ["sensor_1", "sensor_1_rollmean_10", "sensor_2_rollstd_5", "sensor_3_lag_3", "sensor_4_delta_1"]
+    feats = create_rolling_features(basic_cleaning(load_data(path)), window_sizes=[5, 10, 20], lag_features=[1, 3, 5])
+    full = frame_moments(feats, cols, chunk_rows=333)
+    streamed = stream_moments(path, cols, workers=2, rows_per_partition=500, chunksize=400)
+    assert streamed.n == full.n == len(feats)
+    # the partition reader parses sensors as float32, the feature cache path as float64
+    pd.testing.assert_frame_equal(streamed.feature_stats(), full.feature_stats(), rtol=1e-6, atol=1e-5)
+    np.testing.assert_allclose(streamed.correlation(), full.correlation(), atol=1e-5)
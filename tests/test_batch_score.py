@@ -0,0 +1,81 @@
+"""
+Checks for the offline scorer in `batch_score.py`: same scores as scoring the whole file in memory,
+and an interrupted run resumes without redoing finished partitions.
+
+Run from the project root:
+  python -m pytest tests/test_batch_score.py
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+import batch_score
+from simulate_data import simulate_machine
+from preprocessing import basic_cleaning
+from features import create_rolling_features
+from model_bundle import write_bundle
+
+
+def _read(out_dir):
+    parts = sorted(out_dir.glob(f"part-*.{batch_score.OUTPUT_FORMAT}"))
+    read = pd.read_parquet if batch_score.OUTPUT_FORMAT == "parquet" else pd.read_csv
+    return pd.concat([read(p) for p in parts], ignore_index=True), parts
+
+
+@pytest.fixture()
+def setup(tmp_path):
+    raw = pd.concat([simulate_machine(m, n_cycles=120, seed=3) for m in range(9)], ignore_index=True)
+    raw.to_csv(tmp_path / "raw.csv", index=False)
+    feats = create_rolling_features(basic_cleaning(raw), window_sizes=[5, 10], lag_features=[1, 3])
+    feature_cols = [c for c in feats.columns if c.startswith("sensor_")]
+    X = feats[feature_cols].to_numpy()
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=8, max_depth=6, random_state=0)
+    model.fit(scaler.transform(X), feats["failure_within_horizon"])
+    write_bundle(tmp_path / "b.pmb", model, scaler, feature_cols)
+    expected = pd.DataFrame({"machine_id": feats["machine_id"].to_numpy(), "cycle": feats["cycle"].to_numpy(),
+                             "probability": model.predict_proba(scaler.transform(X))[:, 1]})
+    return tmp_path, expected
+
+
+def test_matches_in_memory_scoring_and_resumes(setup):
+    tmp_path, expected = setup
+    out = tmp_path / "scores"
+    summary = batch_score.run(tmp_path / "raw.csv", out, bundle_path=tmp_path / "b.pmb", workers=2,
+                              rows_per_partition=250, chunksize=100)
+    got, parts = _read(out)
+    assert len(parts) == summary["partitions"] > 1
+    assert summary["rows_in"] == 9 * 120 and summary["rows_scored"] == len(expected)
+    got = got.astype({"machine_id": str}).sort_values(["machine_id", "cycle"]).reset_index(drop=True)
+    expected = expected.sort_values(["machine_id", "cycle"]).reset_index(drop=True)
+    np.testing.assert_array_equal(got["cycle"], expected["cycle"])
+    np.testing.assert_allclose(got["probability"], expected["probability"])
+
+    # simulate an interruption: the last partition was never written
+    parts[-1].unlink()
+    summary = batch_score.run(tmp_path / "raw.csv", out, bundle_path=tmp_path / "b.pmb", workers=2,
+                              rows_per_partition=250, chunksize=100)
+    assert summary["skipped"] == len(parts) - 1 and summary["partitions"] == 1
+    assert len(_read(out)[0]) == len(expected)
+
+
+def test_refuses_to_mix_runs(setup):
+    tmp_path, _ = setup
+    out = tmp_path / "scores"
+    batch_score.run(tmp_path / "raw.csv", out, bundle_path=tmp_path / "b.pmb", workers=1, rows_per_partition=500)
+    with pytest.raises(ValueError):
+        batch_score.run(tmp_path / "raw.csv", out, bundle_path=tmp_path / "b.pmb", workers=1, rows_per_partition=300)
+    batch_score.run(tmp_path / "raw.csv", out, bundle_path=tmp_path / "b.pmb", workers=1, rows_per_partition=300,
+                    resume=False)
+
+
+def test_workers_score_with_the_mapped_forest(setup):
+    tmp_path, _ = setup
+    batch_score._init_worker(str(tmp_path / "b.pmb"))
+    try:
+        assert batch_score._worker["model"] is None
+        assert isinstance(batch_score._worker["engine"].feature, np.memmap)
+    finally:
+        batch_score._worker.clear()
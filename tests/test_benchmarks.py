@@ -0,0 +1,41 @@
+"""
+Checks for the offline micro-benchmark suite in `benchmarks.py`.
+
+Run from the project root:
+  python -m pytest tests/test_benchmarks.py
+"""
+import json
+
+import serve_model
+import benchmarks
+
+
+def test_tiny_suite_writes_results_and_compares_clean(tmp_path, monkeypatch):
+    monkeypatch.setattr(serve_model, "artifacts", serve_model.artifacts)
+    monkeypatch.setattr(benchmarks, "FLEET_SIZES", {"tiny": (3, 200)})
+    out = tmp_path / "results.json"
+    rc = benchmarks.main(["--sizes", "tiny", "--repeat", "1", "--data_dir", str(tmp_path / "data"),
+                          "--out", str(out)])
+    assert rc == 0
+    doc = json.loads(out.read_text())
+    names = {r["name"] for r in doc["results"]}
+    assert {"load_data", "basic_cleaning", "create_rolling_features", "scaler_fit", "scaler_transform",
+            "model_fit", "scale_and_predict"} <= names
+    assert [r["batch"] for r in doc["results"] if r["name"] == "scale_and_predict"] == [1, 10, 100]
+    assert all(r["median_s"] > 0 and r["peak_rss_mb"] for r in doc["results"])
+    assert doc["environment"]["sklearn"]
+    # a run compared with itself has nothing to report
+    assert benchmarks.compare(doc["results"], doc["results"]) == []
+
+
+def test_compare_flags_slowdowns_and_ignores_noise():
+    base = [{"name": "load_data", "size": "small", "median_s": 0.100, "peak_delta_mb": 50.0},
+            {"name": "scale_and_predict", "size": "small", "batch": 1, "median_s": 0.0003, "peak_delta_mb": 0.0}]
+    new = [{"name": "load_data", "size": "small", "median_s": 0.150, "peak_delta_mb": 120.0},
+           # 2x slower but well under the 1 ms noise floor
+           {"name": "scale_and_predict", "size": "small", "batch": 1, "median_s": 0.0006, "peak_delta_mb": 1.0},
+           {"name": "model_fit", "size": "small", "median_s": 9.0, "peak_delta_mb": None}]
+    regressions = benchmarks.compare(new, base, tolerance=0.25)
+    assert [(r["case"], r["metric"]) for r in regressions] == [
+        (("load_data", "small", None), "median_s"), (("load_data", "small", None), "peak_delta_mb")]
+    assert benchmarks.compare(new, base, tolerance=0.6)[0]["metric"] == "peak_delta_mb"
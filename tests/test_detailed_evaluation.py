@@ -0,0 +1,95 @@
+"""
+Checks for the grouped per-machine metrics and the bootstrap intervals in `detailed_evaluation.py`.
+
+The reference below is the original loop over machines with sklearn's metrics.
+
+Run from the project root:
+  python -m pytest tests/test_detailed_evaluation.py
+"""
+import numpy as np
+import pytest
+import pandas as pd
+from sklearn.metrics import roc_auc_score, average_precision_score, confusion_matrix
+
+from detailed_evaluation import per_machine_metrics, grouped_metrics, bootstrap_fleet_metrics
+
+
+def reference_per_machine_metrics(df_test, probs, preds, target_col='failure_within_horizon'):
+    rows = []
+    for m in df_test['machine_id'].unique():
+        mask = df_test['machine_id'] == m
+        y_true = df_test.loc[mask, target_col].to_numpy(dtype=int)
+        y_prob = probs[mask.values]
+        y_pred = preds[mask.values]
+        both = len(np.unique(y_true)) > 1
+        cm = confusion_matrix(y_true, y_pred)
+        rows.append({
+            'machine_id': m,
+            'n_samples': int(mask.sum()),
+            'positives': int(y_true.sum()),
+            'roc_auc': float(roc_auc_score(y_true, y_prob)) if both else None,
+            'avg_precision': float(average_precision_score(y_true, y_prob)) if both else None,
+            'tn': int(cm[0, 0]) if cm.shape == (2, 2) else None,
+            'fp': int(cm[0, 1]) if cm.shape == (2, 2) else None,
+            'fn': int(cm[1, 0]) if cm.shape == (2, 2) else None,
+            'tp': int(cm[1, 1]) if cm.shape == (2, 2) else None,
+        })
+    return pd.DataFrame(rows)
+
+
+def _holdout(n_machines=40, seed=0):
+    rng = np.random.default_rng(seed)
+    sizes = rng.integers(1, 120, n_machines)
+    machine = np.repeat([f"machine_{i}" for i in range(n_machines)], sizes)
+    rate = rng.choice([0.0, 0.05, 0.3, 1.0], n_machines, p=[0.2, 0.4, 0.3, 0.1])
+    y = (rng.random(len(machine)) < np.repeat(rate, sizes)).astype(int)
+    # coarse scores so there are plenty of ties within and across classes
+    probs = np.round(np.clip(0.3 * y + rng.normal(0.3, 0.2, len(y)), 0, 1), 1)
+    df = pd.DataFrame({"machine_id": machine, "failure_within_horizon": y})
+    shuffle = rng.permutation(len(df))
+    return df.iloc[shuffle].reset_index(drop=True), probs[shuffle]
+
+
+@pytest.mark.filterwarnings("ignore:A single label")
+def test_matches_per_machine_sklearn_loop():
+    df, probs = _holdout()
+    preds = (probs >= 0.5).astype(int)
+    result = per_machine_metrics(df, probs, preds)
+    expected = reference_per_machine_metrics(df, probs, preds)
+    pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-12)
+    assert result["tn"].isna().any() and result["roc_auc"].isna().any()
+
+
+def test_single_group_is_the_fleet_metric():
+    df, probs = _holdout(seed=1)
+    y = df["failure_within_horizon"].to_numpy()
+    g = grouped_metrics(y, probs, probs >= 0.5, np.zeros(len(y)))
+    assert abs(g["roc_auc"][0] - roc_auc_score(y, probs)) < 1e-12
+    assert abs(g["avg_precision"][0] - average_precision_score(y, probs)) < 1e-12
+
+
+def test_bootstrap_is_reproducible_across_worker_counts():
+    df, probs = _holdout(seed=2)
+    args = (df["failure_within_horizon"], probs, probs >= 0.5, df["machine_id"])
+    one = bootstrap_fleet_metrics(*args, n_boot=120, workers=1, chunk_size=25)
+    two = bootstrap_fleet_metrics(*args, n_boot=120, workers=2, chunk_size=25)
+    pd.testing.assert_frame_equal(one, two)
+    assert abs(one.loc["roc_auc", "estimate"] - roc_auc_score(df["failure_within_horizon"], probs)) < 1e-12
+    assert (one["ci_low"] <= one["estimate"]).all() and (one["estimate"] <= one["ci_high"]).all()
+    assert (one["ci_high"] - one["ci_low"] > 0).all()
+
+
+def test_replicate_matches_sklearn_with_machine_weights():
+    import detailed_evaluation as de
+    df, probs = _holdout(seed=3)
+    y = df["failure_within_horizon"].to_numpy()
+    preds = (probs >= 0.5).astype(int)
+    codes = pd.factorize(df["machine_id"])[0]
+    de._init_bootstrap(y, probs, preds, codes)
+    weights = np.random.default_rng(0).integers(0, 3, codes.max() + 1).astype(float)
+    auc, ap, precision, recall, _ = de._fleet_metrics(weights)
+    w = weights[codes]
+    assert abs(auc - roc_auc_score(y, probs, sample_weight=w)) < 1e-12
+    assert abs(ap - average_precision_score(y, probs, sample_weight=w)) < 1e-12
+    tp = np.sum(w * y * preds)
+    assert abs(precision - tp / np.sum(w * preds)) < 1e-12 and abs(recall - tp / np.sum(w * y)) < 1e-12
@@ -0,0 +1,102 @@
+"""
+Checks for `explainer.py`: the occlusion fallback for models without a forest engine, and the
+latency budget sending rows the exact explainer cannot finish in time to the cheaper method
+(a slow stand-in replaces shap.TreeExplainer, which is an optional dependency).
+
+Run from the project root:
+  python -m pytest tests/test_explainer.py
+"""
+import time
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+import explainer
+from explainer import Explainer, EXPLAIN_THREADS
+from tree_engine import ForestEngine
+
+
+def _fit(seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(600, 4))
+    y = (X[:, 0] - X[:, 2] > 0).astype(int)
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=10, max_depth=5, random_state=seed).fit(scaler.transform(X), y)
+    return model, scaler, rng.normal(size=(40, 4))
+
+
+class _SlowTreeExplainer:
+    """Stands in for shap.TreeExplainer: constant values, `delay` seconds per call."""
+    expected_value = [0.6, 0.4]
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = 0
+
+    def shap_values(self, X, check_additivity=False):
+        self.calls += 1
+        time.sleep(self.delay)
+        return [np.full(X.shape, -1.0), np.full(X.shape, 1.0)]
+
+
+@pytest.fixture(autouse=True)
+def _drain_pool():
+    # chunks abandoned by an earlier test keep pool threads busy until they finish
+    yield
+    deadline = time.perf_counter() + 5
+    while explainer._outstanding and time.perf_counter() < deadline:
+        time.sleep(0.01)
+
+
+def test_occlusion_without_engine():
+    model, scaler, X = _fit()
+    ex = Explainer(scaler, ["a", "b", "c", "d"], model_getter=lambda: model)
+    contrib, base, methods = ex.explain(X)
+    assert methods == ["occlusion"] * len(X)
+    assert contrib.shape == X.shape
+    # b and d do not affect the label
+    assert np.abs(contrib[:, [0, 2]]).sum() > 5 * np.abs(contrib[:, [1, 3]]).sum()
+    probs = model.predict_proba(scaler.transform(X))[:, 1]
+    out = ex.top_k(X, contrib, base, methods, probs, k=2)
+    assert {c["feature"] for c in out[0]["contributions"]} <= {"a", "b", "c", "d"}
+    assert out[0]["probability"] == probs[0]
+
+
+def test_exact_rows_within_budget():
+    model, scaler, X = _fit()
+    engine = ForestEngine.from_model(model, scaler)
+    ex = Explainer(scaler, ["a", "b", "c", "d"], engine=engine, tree_explainer=_SlowTreeExplainer(0.0))
+    contrib, base, methods = ex.explain(X, budget_s=None)
+    assert methods == ["tree_shap"] * len(X)
+    np.testing.assert_allclose(contrib, 1.0)
+    np.testing.assert_allclose(base, 0.4)
+
+
+def test_budget_falls_back_to_path():
+    model, scaler, X = _fit()
+    engine = ForestEngine.from_model(model, scaler)
+    ex = Explainer(scaler, ["a", "b", "c", "d"], engine=engine, tree_explainer=_SlowTreeExplainer(0.5))
+    t0 = time.perf_counter()
+    contrib, base, methods = ex.explain(X, budget_s=0.05)
+    assert time.perf_counter() - t0 < 0.4
+    assert methods == ["path"] * len(X)
+    np.testing.assert_allclose(base + contrib.sum(axis=1), engine.predict_proba(X), atol=1e-12)
+
+
+def test_abandoned_chunks_are_bounded():
+    model, scaler, X = _fit()
+    engine = ForestEngine.from_model(model, scaler)
+    slow = _SlowTreeExplainer(0.3)
+    ex = Explainer(scaler, ["a", "b", "c", "d"], engine=engine, tree_explainer=slow)
+    X = np.vstack([X] * 5)  # 200 rows = 13 chunks
+    # cold start: one chunk per pool thread, not the whole batch
+    ex.explain(X, budget_s=0.02)
+    assert 1 <= slow.calls <= EXPLAIN_THREADS
+    assert 0 < explainer._outstanding <= EXPLAIN_THREADS
+    # while every thread is busy with abandoned chunks, the next request does not queue behind them
+    calls = slow.calls
+    t0 = time.perf_counter()
+    _, _, methods = ex.explain(X, budget_s=0.02)
+    assert time.perf_counter() - t0 < 0.1
+    assert methods == ["path"] * len(X) and slow.calls == calls
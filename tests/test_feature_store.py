@@ -0,0 +1,70 @@
+"""
+Round-trip and eviction checks for the feature cache in `feature_store.py`.
+
+Run from the project root:
+  python -m pytest tests/test_feature_store.py
+"""
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+
+from simulate_data import simulate_machine
+from feature_store import load_features, cache_key, evict, save_frame, load_frame
+
+
+def _write_csv(path, n_machines=3, n_cycles=150, seed=1):
+    df = pd.concat([simulate_machine(m, n_cycles=n_cycles, seed=seed) for m in range(n_machines)], ignore_index=True)
+    df.to_csv(path, index=False)
+    return path
+
+
+def test_cache_hit_matches_fresh_build_and_is_memory_mapped(tmp_path):
+    csv = _write_csv(tmp_path / "telemetry.csv")
+    cache = tmp_path / "cache"
+    fresh = load_features(csv, use_cache=False)
+    first = load_features(csv, cache_dir=cache)
+    second = load_features(csv, cache_dir=cache)
+    pdt.assert_frame_equal(first, fresh)
+    pdt.assert_frame_equal(second, fresh)
+    arr = second['sensor_1_rollmean_5'].to_numpy()
+    while arr is not None and not isinstance(arr, np.memmap):
+        arr = arr.base
+    assert isinstance(arr, np.memmap)
+
+
+def test_key_depends_on_content_and_parameters(tmp_path):
+    a = _write_csv(tmp_path / "a.csv", seed=1)
+    b = _write_csv(tmp_path / "b.csv", seed=2)
+    assert cache_key(a, [5], [1], 5) != cache_key(b, [5], [1], 5)
+    assert cache_key(a, [5], [1], 5) != cache_key(a, [5], [1], 10)
+    assert cache_key(a, [5], [1], 5) == cache_key(tmp_path / "a.csv", [5], [1], 5)
+
+
+def test_eviction_keeps_cache_under_budget(tmp_path):
+    cache = tmp_path / "cache"
+    for seed in (1, 2, 3):
+        load_features(_write_csv(tmp_path / f"{seed}.csv", seed=seed), cache_dir=cache)
+    assert len(list(cache.iterdir())) == 3
+    evict(cache, max_bytes=1)
+    assert list(cache.iterdir()) == []
+
+
+def test_missing_values_in_non_numeric_columns_round_trip(tmp_path):
+    df = pd.DataFrame({"machine_id": pd.Series(["M1", np.nan, "M2", "M1"], dtype=object),
+                       "status": pd.Categorical(["ok", "fault", None, "ok"]),
+                       "x": [1.0, np.nan, 3.0, 4.0]})
+    save_frame(df, tmp_path / "entry")
+    out = load_frame(tmp_path / "entry")
+    assert out["machine_id"].isna().tolist() == [False, True, False, False]
+    assert out["status"].isna().tolist() == [False, False, True, False]
+    pdt.assert_frame_equal(out, df)
+
+
+def test_non_string_columns_round_trip(tmp_path):
+    df = pd.DataFrame({"when": pd.to_datetime(["2024-01-01", None, "2024-01-02", "2024-01-01"]),
+                       "code": pd.Series([1, 2, None, 1], dtype=object),
+                       "flag": pd.Series([True, False, None, True], dtype=object)})
+    save_frame(df, tmp_path / "entry")
+    out = load_frame(tmp_path / "entry")
+    pdt.assert_frame_equal(out, df)
+    assert out["code"].iloc[0] == 1 and out["flag"].iloc[1] is False
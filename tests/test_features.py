@@ -0,0 +1,97 @@
+"""
+Equivalence tests for the grouped feature engine in `features.py`.
+
+The reference below is the original per-machine loop; the grouped engine must reproduce
+its output exactly (columns, row order, index and values).
+
+Run from the project root:
+  python -m pytest tests/test_features.py
+"""
+import numpy as np
+import pandas as pd
+import pandas.testing as pdt
+
+from simulate_data import simulate_machine
+from preprocessing import basic_cleaning
+from features import create_rolling_features
+
+
+def reference_rolling_features(df, window_sizes=[5, 10, 20], lag_features=[1, 3, 5], target_horizon=5):
+    sensor_cols = [c for c in df.columns if c.startswith("sensor_")]
+    features = []
+    for m in df['machine_id'].unique():
+        sub = df[df['machine_id'] == m].copy()
+        sub = sub.sort_values('cycle').reset_index(drop=True)
+        for w in window_sizes:
+            rolled = sub[sensor_cols].rolling(window=w, min_periods=1)
+            for col in sensor_cols:
+                sub[f"{col}_rollmean_{w}"] = rolled[col].mean()
+                sub[f"{col}_rollstd_{w}"] = rolled[col].std().fillna(0)
+                sub[f"{col}_rollmin_{w}"] = rolled[col].min()
+                sub[f"{col}_rollmax_{w}"] = rolled[col].max()
+        for l in lag_features:
+            for col in sensor_cols:
+                sub[f"{col}_lag_{l}"] = sub[col].shift(l)
+        for col in sensor_cols:
+            sub[f"{col}_delta_1"] = sub[col] - sub[f"{col}_lag_1"]
+        fw = np.zeros(len(sub), dtype=int)
+        fail_idx = sub.index[sub['failure'] == 1].tolist()
+        for i in range(len(sub)):
+            for fidx in fail_idx:
+                if i + 1 <= fidx <= i + target_horizon:
+                    fw[i] = 1
+                    break
+        sub['failure_within_horizon'] = fw
+        features.append(sub)
+    df_feat = pd.concat(features, ignore_index=True)
+    df_feat = df_feat.dropna(axis=0, subset=[c for c in df_feat.columns if "lag" in c])
+    return df_feat.drop(columns=[c for c in ['timestamp', 'failure'] if c in df_feat.columns])
+
+
+def make_fleet(n_machines=6, n_cycles=300, seed=7):
+    frames = [simulate_machine(m, n_cycles=n_cycles, seed=seed) for m in range(n_machines)]
+    df = pd.concat(frames, ignore_index=True)
+    # extra failures so the look-ahead label sees several events per machine
+    rng = np.random.default_rng(seed)
+    df.loc[rng.choice(len(df), size=20, replace=False), 'failure'] = 1
+    # interleave machines so the engine cannot rely on pre-grouped input
+    return df.sample(frac=1.0, random_state=seed).reset_index(drop=True)
+
+
+def test_matches_reference_loop():
+    df = make_fleet()
+    expected = reference_rolling_features(df)
+    result = create_rolling_features(df)
+    pdt.assert_frame_equal(result, expected)
+
+
+def test_matches_reference_after_cleaning_with_custom_windows():
+    df = basic_cleaning(make_fleet(n_machines=4, n_cycles=120, seed=3))
+    kwargs = dict(window_sizes=[3, 7], lag_features=[1, 2], target_horizon=10)
+    pdt.assert_frame_equal(create_rolling_features(df, **kwargs), reference_rolling_features(df, **kwargs))
+
+
+def test_multiple_horizons_match_single_horizon_runs():
+    df = make_fleet(n_machines=3, n_cycles=200, seed=11)
+    multi = create_rolling_features(df, target_horizon=[1, 5, 25])
+    for k in (1, 5, 25):
+        single = create_rolling_features(df, target_horizon=k)
+        np.testing.assert_array_equal(multi[f"failure_within_horizon_{k}"], single['failure_within_horizon'])
+    assert 'failure_within_horizon' not in multi.columns
+
+
+def test_planned_columns_match_the_full_build():
+    df = make_fleet(n_machines=4, n_cycles=150, seed=5)
+    # a gap in one sensor must drop the same rows as the full build does
+    df.loc[df.sample(15, random_state=1).index, 'sensor_3'] = np.nan
+    wanted = ["sensor_1_rollmean_20", "sensor_2_rollstd_10", "sensor_2_rollmean_10", "sensor_4_rollmax_5",
+              "sensor_1_lag_3", "sensor_5_delta_1", "sensor_2", "not_a_feature"]
+    full = create_rolling_features(df)
+    part = create_rolling_features(df, columns=wanted)
+    engineered = [c for c in part.columns if c not in df.columns and c != "failure_within_horizon"]
+    assert engineered == ["sensor_4_rollmax_5", "sensor_2_rollmean_10", "sensor_2_rollstd_10",
+                          "sensor_1_rollmean_20", "sensor_1_lag_3", "sensor_5_delta_1"]
+    pdt.assert_frame_equal(part, full[part.columns.tolist()])
+    clean = basic_cleaning(df)
+    pdt.assert_frame_equal(create_rolling_features(clean, columns=wanted),
+                           create_rolling_features(clean)[part.columns.tolist()])
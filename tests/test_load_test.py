@@ -0,0 +1,63 @@
+"""
+Checks for the localhost load harness in `load_test.py`, against an in-process Waitress server
+serving a small model trained on the fly.
+
+Run from the project root:
+  python -m pytest tests/test_load_test.py
+"""
+import threading
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+import serve_model
+import load_test
+
+waitress = pytest.importorskip("waitress")
+FEATURES = ["sensor_1", "sensor_2", "sensor_1_lag_1"]
+
+
+@pytest.fixture()
+def server(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(300, len(FEATURES)))
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=5, max_depth=4, random_state=0).fit(scaler.transform(X), X[:, 0] > 0)
+    for name, obj in [("MODEL_PATH", model), ("SCALER_PATH", scaler), ("FEATURES_PATH", FEATURES)]:
+        joblib.dump(obj, tmp_path / name)
+        monkeypatch.setattr(serve_model, name, tmp_path / name)
+    monkeypatch.setattr(serve_model, "BUNDLE_PATH", tmp_path / "bundle.pmb")
+    serve_model.load_artifacts()
+    srv = waitress.create_server(serve_model.app, host="127.0.0.1", port=0, threads=4)
+    thread = threading.Thread(target=srv.run, daemon=True)
+    thread.start()
+    yield "127.0.0.1", srv.effective_port
+    srv.close()
+
+
+def test_open_loop_run_reports_both_kinds(server):
+    host, port = server
+    load_test.wait_for_health(host, port, timeout=10)
+    report = load_test.run_load(host, port, duration=1.0, concurrency=4, rate=80, batch_fraction=0.5,
+                                batch_size=20, warmup=0.2)
+    overall = report["overall"]
+    assert overall["errors"] == 0
+    # the schedule is fixed, so the request count is too
+    assert overall["requests"] == 80
+    assert set(report["by_kind"]) == {"single", "batch"}
+    assert overall["p50_ms"] <= overall["p95_ms"] <= overall["p99_ms"] <= overall["max_ms"]
+    assert load_test.check_slo(report, p99_ms=10_000, max_error_rate=0.0) == []
+    assert any("p95" in f for f in load_test.check_slo(report, p95_ms=0.0))
+
+
+def test_errors_count_against_the_slo():
+    samples = [(0.0, "single", 0.010, True)] * 98 + [(0.0, "single", 0.500, False)] * 2
+    s = load_test._summary(samples, 1, elapsed=1.0)
+    assert s["errors"] == 2 and s["error_rate"] == pytest.approx(0.02)
+    assert s["max_ms"] == pytest.approx(500)
+    report = {"overall": s, "by_kind": {"single": s}}
+    assert load_test.check_slo(report, max_error_rate=0.05) == []
+    assert len(load_test.check_slo(report, max_error_rate=0.01)) == 2
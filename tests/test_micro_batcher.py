@@ -0,0 +1,91 @@
+"""
+Checks for the request coalescer in `micro_batcher.py`.
+
+Run from the project root:
+  python -m pytest tests/test_micro_batcher.py
+"""
+import threading
+import numpy as np
+import pytest
+
+from micro_batcher import MicroBatcher
+
+
+def test_concurrent_callers_get_their_own_rows():
+    calls = []
+
+    def score(X):
+        calls.append(len(X))
+        return X[:, 0] * 2
+
+    batcher = MicroBatcher(score, max_wait_ms=50, max_rows=64)
+    results = {}
+    start = threading.Barrier(16)
+
+    def worker(i):
+        with batcher.arriving() as ticket:
+            start.wait()
+            X = np.full((i % 3 + 1, 4), float(i))
+            results[i] = batcher.submit(X, ticket)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(16)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    for i in range(16):
+        np.testing.assert_array_equal(results[i], np.full(i % 3 + 1, 2.0 * i))
+    # announced requests are coalesced instead of scored one by one
+    assert len(calls) < 16
+    stats = batcher.stats()
+    assert stats["batch_size"]["count"] == len(calls)
+    assert stats["wait_ms"]["count"] == 16
+
+
+def test_lone_request_is_not_delayed_and_errors_propagate():
+    def score(X):
+        if np.isnan(X).any():
+            raise ValueError("bad row")
+        return X[:, 0]
+
+    batcher = MicroBatcher(score, max_wait_ms=10_000)
+    with batcher.arriving() as ticket:
+        np.testing.assert_array_equal(batcher.submit(np.ones((2, 3)), ticket), [1.0, 1.0])
+    with pytest.raises(ValueError):
+        batcher.submit(np.full((1, 3), np.nan))
+
+
+def test_failing_request_does_not_fail_its_batch():
+    calls = []
+
+    def score(X):
+        calls.append(len(X))
+        if np.isnan(X).any():
+            raise ValueError("bad row")
+        return X[:, 0]
+
+    batcher = MicroBatcher(score, max_wait_ms=5_000, max_rows=64)
+    results = {}
+    start = threading.Barrier(4)
+
+    def worker(i):
+        with batcher.arriving() as ticket:
+            start.wait()
+            X = np.full((2, 3), np.nan if i == 0 else float(i))
+            try:
+                results[i] = batcher.submit(X, ticket)
+            except ValueError as e:
+                results[i] = e
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert isinstance(results[0], ValueError)
+    for i in range(1, 4):
+        np.testing.assert_array_equal(results[i], [float(i), float(i)])
+    # the four requests were scored together first, then retried one by one
+    assert calls[0] == 8 and len(calls) == 5
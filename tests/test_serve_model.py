@@ -0,0 +1,305 @@
+"""
+Flask test-client checks for the /predict request formats in `serve_model.py`,
+using a small model trained on the fly.
+
+Run from the project root:
+  python -m pytest tests/test_serve_model.py
+"""
+import io
+import json
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+import serve_model
+from model_bundle import write_bundle, ModelBundle
+from payloads import ARROW_MIMETYPE
+
+FEATURES = ["sensor_1", "sensor_2", "sensor_1_rollmean_3", "sensor_1_lag_1", "sensor_1_delta_1"]
+
+
+@pytest.fixture()
+def client(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(400, len(FEATURES)))
+    y = (X[:, 0] + X[:, 2] > 0.5).astype(int)
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=10, max_depth=5, random_state=0).fit(scaler.transform(X), y)
+    paths = {"MODEL_PATH": tmp_path / "m.pkl", "SCALER_PATH": tmp_path / "s.pkl", "FEATURES_PATH": tmp_path / "f.pkl"}
+    joblib.dump(model, paths["MODEL_PATH"])
+    joblib.dump(scaler, paths["SCALER_PATH"])
+    joblib.dump(FEATURES, paths["FEATURES_PATH"])
+    for name, p in paths.items():
+        monkeypatch.setattr(serve_model, name, p)
+    monkeypatch.setattr(serve_model, "BUNDLE_PATH", tmp_path / "bundle.pmb")
+    serve_model.load_artifacts()
+    client = serve_model.app.test_client()
+    client.expected = lambda rows: model.predict_proba(scaler.transform(rows))[:, 1]
+    return client
+
+
+def test_row_payloads(client):
+    r = client.post("/predict", json={"sensor_1": 1.0, "sensor_2": -0.5, "unknown": 3})
+    assert r.status_code == 200
+    np.testing.assert_allclose(r.json["probability"], client.expected([[1.0, -0.5, 0, 0, 0]]))
+    r = client.post("/predict", json={"rows": [{"sensor_1": 1.0}, {"sensor_1_rollmean_3": 2.0}]})
+    probs = [p["probability"] for p in r.json["predictions"]]
+    # a key only some rows have is missing (NaN) in the others, as with the old DataFrame path
+    np.testing.assert_allclose(probs, client.expected([[1.0, 0, np.nan, 0, 0], [np.nan, 0, 2.0, 0, 0]]))
+
+
+def test_columnar_payload(client):
+    body = {"columns": ["sensor_1_rollmean_3", "sensor_1", "ignored"], "data": [[2.0, 1.0, 9.0], [0.0, -1.0, 9.0]]}
+    r = client.post("/predict", json=body)
+    assert r.status_code == 200
+    np.testing.assert_allclose(r.json["probability"], client.expected([[1.0, 0, 2.0, 0, 0], [-1.0, 0, 0, 0, 0]]))
+    assert r.json["prediction"] == [int(p >= 0.5) for p in r.json["probability"]]
+
+
+def test_npy_payload(client):
+    X = np.random.default_rng(1).normal(size=(7, len(FEATURES)))
+    buf = io.BytesIO()
+    np.save(buf, X)
+    r = client.post("/predict", data=buf.getvalue(), content_type="application/x-npy")
+    assert r.status_code == 200 and r.mimetype == "application/x-npy"
+    out = np.load(io.BytesIO(r.data), allow_pickle=False)
+    np.testing.assert_allclose(out["probability"], client.expected(X))
+    bad = io.BytesIO()
+    np.save(bad, X[:, :2])
+    assert client.post("/predict", data=bad.getvalue(), content_type="application/x-npy").status_code == 400
+    strings = io.BytesIO()
+    np.save(strings, np.array([["a"] * len(FEATURES)]))
+    r = client.post("/predict", data=strings.getvalue(), content_type="application/x-npy")
+    assert r.status_code == 400 and "numeric" in r.json["error"]
+
+
+def test_arrow_payload(client):
+    pa = pytest.importorskip("pyarrow")
+
+    def body(table):
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    r = client.post("/predict", data=body(pa.table({"sensor_1": [1.0, 0.0], "sensor_2": [-0.5, 2.0]})),
+                    content_type=ARROW_MIMETYPE)
+    assert r.status_code == 200
+    r = client.post("/predict", data=body(pa.table({"sensor_1": ["abc", "x"]})), content_type=ARROW_MIMETYPE)
+    assert r.status_code == 400 and "numeric" in r.json["error"]
+
+
+def test_bad_payloads(client):
+    assert client.post("/predict", json={"sensor_1": "abc"}).status_code == 400
+    assert client.post("/predict", json=[]).status_code == 400
+    assert client.post("/predict", json={"columns": ["sensor_1"], "data": [[1, 2]]}).status_code == 400
+
+
+def test_health_does_not_load_artifacts(client, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("health must not unpickle artifacts")
+    monkeypatch.setattr(serve_model.joblib, "load", fail)
+    r = client.get("/health")
+    assert r.status_code == 200 and r.json["ok"] and not r.json["reload_pending"]
+
+
+def test_reload_swaps_whole_artifact_set(client):
+    before = serve_model.artifacts
+    # retrain with flipped labels so the probabilities visibly change
+    rng = np.random.default_rng(3)
+    X = rng.normal(size=(400, len(FEATURES)))
+    y = (X[:, 0] + X[:, 2] <= 0.5).astype(int)
+    model = RandomForestClassifier(n_estimators=10, max_depth=5, random_state=0).fit(before.scaler.transform(X), y)
+    joblib.dump(model, serve_model.MODEL_PATH)
+    assert client.get("/health").json["reload_pending"]
+
+    r = client.post("/admin/reload?wait=1")
+    assert r.status_code == 200 and r.json["reloaded"]
+    after = serve_model.artifacts
+    assert after is not before and after.model is not before.model
+    p = client.post("/predict", json={"sensor_1": 1.0}).json["probability"]
+    np.testing.assert_allclose(p, model.predict_proba(after.scaler.transform([[1.0, 0, 0, 0, 0]]))[:, 1])
+    assert not client.get("/health").json["reload_pending"]
+
+
+def test_failed_reload_keeps_serving(client):
+    before = serve_model.artifacts
+    joblib.dump(FEATURES[:2], serve_model.FEATURES_PATH)
+    r = client.post("/admin/reload?wait=1")
+    assert r.status_code == 500 and not r.json["reloaded"]
+    assert serve_model.artifacts is before
+    assert client.post("/predict", json={"sensor_1": 1.0}).status_code == 200
+
+
+def test_bundle_is_preferred_and_reports_training_metadata(client):
+    old = serve_model.artifacts
+    write_bundle(serve_model.BUNDLE_PATH, old.model, old.scaler, old.feature_cols,
+                 metrics={"roc_auc": 0.9}, metadata={"trained_at": "2026-01-02T03:04:05+00:00"})
+    bundle = ModelBundle(serve_model.BUNDLE_PATH)
+    assert isinstance(bundle.array("forest/threshold").base, np.memmap)
+
+    serve_model.load_artifacts()
+    art = serve_model.artifacts
+    assert art._model is None  # the sklearn model stays pickled until a large batch needs it
+    X = np.random.default_rng(2).normal(size=(3, len(FEATURES)))
+    r = client.post("/predict", json={"columns": FEATURES, "data": X.tolist()})
+    np.testing.assert_allclose(r.json["probability"], client.expected(X))
+    info = client.get("/model/info").json
+    assert info["trained_at"] == "2026-01-02T03:04:05+00:00" and info["metrics"] == {"roc_auc": 0.9}
+    assert info["artifacts"] == [str(serve_model.BUNDLE_PATH)]
+    np.testing.assert_allclose(art.model.predict_proba(art.scaler.transform(X))[:, 1], client.expected(X))
+
+
+def test_serves_the_backend_the_bundle_declares(client):
+    from sklearn.ensemble import HistGradientBoostingClassifier
+    old = serve_model.artifacts
+    rng = np.random.default_rng(3)
+    X = rng.normal(size=(400, len(FEATURES)))
+    y = (X[:, 0] + X[:, 2] > 0.5).astype(int)
+    gbm = HistGradientBoostingClassifier(max_iter=20, random_state=0).fit(old.scaler.transform(X).astype(np.float32), y)
+    write_bundle(serve_model.BUNDLE_PATH, gbm, old.scaler, old.feature_cols)
+    serve_model.load_artifacts()
+    art = serve_model.artifacts
+    assert art.engine is None and art.info["backend"] == "hist"
+    r = client.post("/predict", json={"columns": FEATURES, "data": X[:4].tolist()})
+    np.testing.assert_allclose(r.json["probability"], gbm.predict_proba(old.scaler.transform(X[:4]))[:, 1])
+
+
+def test_metrics_endpoint(client):
+    client.post("/predict", json={"sensor_1": 1.0})
+    client.post("/predict", data="not json", content_type="application/json")
+    r = client.get("/metrics")
+    assert r.status_code == 200
+    text = r.get_data(as_text=True)
+    assert 'pm_requests_total{endpoint="predict",status="200"}' in text
+    assert 'pm_requests_total{endpoint="predict",status="400"}' in text
+    for stage in ("parse", "build", "inference", "serialize"):
+        count = [l for l in text.splitlines() if l.startswith(f'pm_stage_seconds_count{{stage="{stage}"}}')]
+        assert count and float(count[0].split()[-1]) >= 1
+    assert 'pm_stage_seconds_bucket{stage="parse",le="+Inf"}' in text
+    assert "pm_artifact_load_seconds_count" in text
+
+
+def test_sampling_profiler(client, tmp_path, monkeypatch):
+    from serving_metrics import SamplingProfiler
+    profiler = SamplingProfiler(every_n=2, out_dir=tmp_path / "profiles", keep=2)
+    monkeypatch.setattr(serve_model.metrics, "profiler", profiler)
+    for _ in range(8):
+        assert client.post("/predict", json={"sensor_1": 1.0}).status_code == 200
+    assert profiler.dumps == 4
+    assert len(list((tmp_path / "profiles").glob("predict-*.prof"))) == 2
+
+
+def test_csv_stream_ndjson(client):
+    rng = np.random.default_rng(2)
+    X = rng.normal(size=(23, len(FEATURES)))
+    lines = ["machine_id," + ",".join(FEATURES) + ",ignored"]
+    lines += [f"M{i % 3}," + ",".join(str(float(v)) for v in row) + ",x" for i, row in enumerate(X)]
+    r = client.post("/predict/csv?chunk_rows=5", data="\n".join(lines) + "\n", content_type="text/csv")
+    assert r.status_code == 200 and r.mimetype == "application/x-ndjson"
+    out = [json.loads(l) for l in r.get_data(as_text=True).splitlines()]
+    assert [o["row"] for o in out] == list(range(23))
+    assert [o["machine_id"] for o in out] == [f"M{i % 3}" for i in range(23)]
+    np.testing.assert_allclose([o["probability"] for o in out], client.expected(X))
+
+
+def test_csv_stream_csv_output(client):
+    body = "sensor_1,sensor_2\n1.0,-0.5\n0.0,2.0\n3.0,\n"
+    r = client.post("/predict/csv?format=csv&chunk_rows=2", data=body, content_type="text/csv")
+    assert r.status_code == 200
+    out = pd.read_csv(io.StringIO(r.get_data(as_text=True)))
+    assert list(out.columns) == ["row", "probability", "prediction"]
+    np.testing.assert_allclose(out["probability"][:2], client.expected([[1.0, -0.5, 0, 0, 0], [0, 2.0, 0, 0, 0]]))
+    assert len(out) == 3
+
+
+def test_csv_stream_errors(client):
+    assert client.post("/predict/csv", data="", content_type="text/csv").status_code == 400
+    assert client.post("/predict/csv", data="sensor_1\nabc\n", content_type="text/csv").status_code == 400
+    # a bad value after the first chunk is reported in-band
+    r = client.post("/predict/csv?chunk_rows=1", data="sensor_1\n1.0\nabc\n", content_type="text/csv")
+    lines = [json.loads(l) for l in r.get_data(as_text=True).splitlines()]
+    assert "probability" in lines[0] and lines[-1]["row"] == 1 and "error" in lines[-1]
+
+
+def test_csv_stream_reports_prediction_failures(client, monkeypatch):
+    real = serve_model.predict_matrix
+    calls = []
+
+    def failing(X, **kw):
+        calls.append(len(X))
+        if len(calls) > 1:
+            raise RuntimeError("boom")
+        return real(X, **kw)
+
+    monkeypatch.setattr(serve_model, "predict_matrix", failing)
+    body = "sensor_1\n1.0\n2.0\n3.0\n"
+    r = client.post("/predict/csv?chunk_rows=2", data=body, content_type="text/csv")
+    lines = [json.loads(l) for l in r.get_data(as_text=True).splitlines()]
+    assert len(lines) == 3 and lines[-1]["row"] == 2 and "boom" in lines[-1]["error"]
+    r = client.post("/predict/csv?chunk_rows=2&format=csv", data=body, content_type="text/csv")
+    assert r.get_data(as_text=True).splitlines()[-1].startswith("# error: Prediction failed")
+
+
+def test_explain_endpoint(client):
+    # the explainer is not built at load time, only on the first /explain call
+    assert serve_model.artifacts._explainer is None
+    r = client.post("/explain?top_k=3", json={"sensor_1": 1.0, "sensor_2": -0.5, "sensor_1_rollmean_3": 2.0})
+    assert r.status_code == 200
+    out = r.json
+    np.testing.assert_allclose(out["probability"], client.expected([[1.0, -0.5, 2.0, 0, 0]]))
+    assert len(out["contributions"]) == 3
+    assert out["method"] in ("path", "tree_shap")
+    assert serve_model.artifacts._explainer is not None
+    mags = [abs(c["contribution"]) for c in out["contributions"]]
+    assert mags == sorted(mags, reverse=True)
+    # explaining all features: base value plus contributions give the probability back
+    r = client.post("/explain?top_k=10&budget_ms=0", json=[{"sensor_1": 1.0}, {"sensor_1_rollmean_3": -2.0}])
+    for e in r.json["explanations"]:
+        assert e["method"] == "path" and len(e["contributions"]) == len(FEATURES)
+        total = e["base_value"] + sum(c["contribution"] for c in e["contributions"])
+        assert total == pytest.approx(e["probability"], abs=1e-9)
+    assert 'pm_explain_rows_total{method="path"}' in client.get("/metrics").get_data(as_text=True)
+
+
+def test_explain_missing_values_are_null(client):
+    r = client.post("/explain?top_k=10", json={"sensor_1": 1.0, "sensor_2": None})
+    assert r.status_code == 200
+    values = {c["feature"]: c["value"] for c in json.loads(r.get_data(as_text=True))["contributions"]}
+    assert values["sensor_2"] is None and values["sensor_1"] == 1.0
+
+
+def test_explain_bad_requests(client):
+    assert client.post("/explain", json={"sensor_1": "abc"}).status_code == 400
+    assert client.post("/explain", json=[]).status_code == 400
+    assert client.post("/explain?top_k=0", json={"sensor_1": 1.0}).status_code == 400
+    assert client.post("/explain?budget_ms=x", json={"sensor_1": 1.0}).status_code == 400
+
+
+def test_ingest_rejects_whole_batch_before_updating_state(client):
+    good = [{"machine_id": "M1", "cycle": c, "sensor_1": 1.0, "sensor_2": 2.0} for c in (1, 2)]
+    bad = good + [{"machine_id": "M1", "cycle": 3, "sensor_1": "x", "sensor_2": 2.0}]
+    assert client.post("/ingest", json=bad).status_code == 400
+    # nothing from the rejected batch was stored, so resending the valid readings is not "stale"
+    r = client.post("/ingest", json=good)
+    assert r.status_code == 200
+    assert all("error" not in p for p in r.json["predictions"])
+    assert client.post("/ingest", json={"machine_id": "M1", "cycle": "ten", "sensor_1": 1.0,
+                                        "sensor_2": 2.0}).status_code == 400
+    # numeric strings are accepted and compared as numbers ("10" is newer than 9)
+    r = client.post("/ingest", json=[{"machine_id": "M2", "cycle": 9, "sensor_1": 1.0, "sensor_2": 2.0},
+                                     {"machine_id": "M2", "cycle": "10", "sensor_1": 1.0, "sensor_2": 2.0}])
+    assert r.status_code == 200 and all("error" not in p for p in r.json["predictions"])
+
+
+def test_ingest_rejects_non_finite_readings(client):
+    for bad in ("nan", "Infinity", float("nan")):
+        readings = [{"machine_id": "M3", "cycle": 1, "sensor_1": 1.0, "sensor_2": 2.0},
+                    {"machine_id": "M3", "cycle": 2, "sensor_1": bad, "sensor_2": 2.0}]
+        r = client.post("/ingest", data=json.dumps(readings), content_type="application/json")
+        assert r.status_code == 400 and "non-finite" in r.json["error"]
+    # nothing was stored, so the machine's state is clean for the corrected batch
+    assert "M3" not in serve_model.artifacts.online_store._states
@@ -0,0 +1,43 @@
+"""
+Checks for the fleet simulator in `simulate_data.py`.
+
+Run from the project root:
+  python -m pytest tests/test_simulate_data.py
+"""
+import pandas as pd
+
+from simulate_data import simulate_machine, generate_dataset
+from preprocessing import basic_cleaning
+
+
+def test_partitioned_parallel_output_matches_single_file(tmp_path):
+    generate_dataset(n_machines=5, cycles_per_machine=300, out_path=tmp_path / "one.csv", seed=7)
+    generate_dataset(n_machines=5, cycles_per_machine=300, out_path=tmp_path / "parts", seed=7,
+                     workers=2, machines_per_file=2)
+    parts = sorted((tmp_path / "parts").glob("part-*.csv.gz"))
+    assert len(parts) == 3
+    one = pd.read_csv(tmp_path / "one.csv").drop(columns="timestamp")
+    many = pd.concat([pd.read_csv(p) for p in parts], ignore_index=True).drop(columns="timestamp")
+    pd.testing.assert_frame_equal(one, many)
+
+
+def test_machine_is_reproducible_and_timestamps_are_minutes():
+    a = simulate_machine(3, n_cycles=500, seed=1, end_time="2026-01-01")
+    b = simulate_machine(3, n_cycles=500, seed=1, end_time="2026-01-01")
+    pd.testing.assert_frame_equal(a, b)
+    assert not a["sensor_1"].equals(simulate_machine(4, n_cycles=500, seed=1)["sensor_1"])
+    assert a["timestamp"].iloc[-1] == pd.Timestamp("2026-01-01") - pd.Timedelta(minutes=1)
+    assert (a["timestamp"].diff().dropna() == pd.Timedelta(minutes=1)).all()
+
+
+def test_defect_knobs():
+    df = pd.concat([simulate_machine(m, n_cycles=1000, seed=2, missing_rate=0.05, duplicate_rate=0.02,
+                                     max_failures=4) for m in range(20)], ignore_index=True)
+    sensors = [c for c in df.columns if c.startswith("sensor_")]
+    assert 0.03 < df[sensors].isna().to_numpy().mean() < 0.07
+    n_dupes = df.duplicated(["machine_id", "cycle"]).sum()
+    assert 0.01 * 20_000 < n_dupes < 0.03 * 20_000
+    failures = df.drop_duplicates(["machine_id", "cycle"]).groupby("machine_id")["failure"].sum()
+    assert failures.max() > 1
+    clean = basic_cleaning(df)
+    assert len(clean) == 20_000 and not clean[sensors].isna().any().any()
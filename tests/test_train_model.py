@@ -0,0 +1,100 @@
+"""
+Checks for the model search in `train_model.py`.
+
+Run from the project root:
+  python -m pytest tests/test_train_model.py
+"""
+import numpy as np
+
+import os
+
+from train_model import (successive_halving_search, grid_search, SharedTrainingData, _open_shared,
+                         _grouped_folds, SEARCH_SPACE, select_features, feature_importances)
+
+
+SMALL_SPACE = {**SEARCH_SPACE, "n_estimators": [10, 20], "max_depth": [4, 6, 8, None]}
+
+
+def _data(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n, 6))
+    y = (X[:, 0] + 0.5 * X[:, 1] + rng.normal(scale=0.5, size=n) > 1.2).astype(int)
+    return X, y
+
+
+def test_halving_narrows_candidates_and_refits():
+    X, y = _data()
+    model, result = successive_halving_search(X, y, n_candidates=9, factor=3, min_samples=300,
+                                                 space=SMALL_SPACE)
+    rungs = [h["rung"] for h in result.history]
+    counts = [rungs.count(r) for r in sorted(set(rungs))]
+    assert counts == [9, 3, 1]
+    rows = [h["n_rows"] for h in result.history]
+    assert rows[0] == 300 and rows[-1] == len(y)
+    assert all(h["seconds"] > 0 for h in result.history)
+    assert set(result.best_params_) == set(SMALL_SPACE)
+    assert result.best_score_ == result.history[-1]["roc_auc"] > 0.8
+    assert model.predict_proba(X[:5]).shape == (5, 2)
+
+
+def test_time_budget_stops_early():
+    X, y = _data()
+    _, result = successive_halving_search(X, y, n_candidates=27, factor=3, min_samples=300, time_budget_s=0.0,
+                                           space=SMALL_SPACE, n_jobs=1)
+    # the first batch (one candidate per worker) always runs so there is something to return
+    assert len(result.history) == 1
+
+
+def test_grouped_folds_keep_machines_apart():
+    X, y = _data(1200)
+    machines = np.repeat([f"M{i}" for i in range(40)], 30)
+    with SharedTrainingData(X, y, machines) as shared:
+        data = _open_shared(shared.path)
+        assert data["X"].dtype == np.float32 and isinstance(data["X"], np.memmap)
+        rows, folds = _grouped_folds(data, 1200, 3, 42)
+        assert len(rows) == 1200
+        for tr, va in folds:
+            assert not set(machines[tr]) & set(machines[va])
+            assert y[va].sum() > 0
+    assert not os.path.exists(shared.path)
+
+
+def test_grid_search_reports_worker_rss():
+    X, y = _data(1500)
+    machines = np.repeat(np.arange(50), 30)
+    model, result = grid_search(X, y, machines, param_grid={"n_estimators": [10], "max_depth": [3, 6]}, n_jobs=2)
+    assert len(result.history) == 2
+    assert result.best_score_ == max(h["roc_auc"] for h in result.history)
+    assert result.worker_peak_rss_mb and all(mb > 0 for mb in result.worker_peak_rss_mb.values())
+    assert os.getpid() not in result.worker_peak_rss_mb
+
+
+def test_boosting_backend_round_trips_through_bundle(tmp_path):
+    from sklearn.preprocessing import StandardScaler
+    from train_model import train_boosting
+    from model_bundle import write_bundle, ModelBundle
+    X, y = _data(3000)
+    machines = np.repeat(np.arange(100), 30)
+    scaler = StandardScaler().fit(X)
+    model, result = train_boosting(scaler.transform(X), y, machines, backend="hist")
+    assert result.best_params_["backend"] == "hist" and result.best_score_ > 0.8
+    assert model.n_iter_ < 2000  # early stopping kicked in
+    write_bundle(tmp_path / "b.pmb", model, scaler, [f"f{i}" for i in range(6)])
+    bundle = ModelBundle(tmp_path / "b.pmb")
+    assert bundle.backend == "hist" and not bundle.has_forest()
+    np.testing.assert_allclose(bundle.load_model().predict_proba(scaler.transform(X[:50])),
+                               model.predict_proba(scaler.transform(X[:50])))
+
+
+def test_select_features_keeps_top_importance_in_column_order():
+    cols = ["a", "b", "c", "d", "e"]
+    assert select_features(cols, [0.05, 0.5, 0.05, 0.3, 0.1], keep=0.75) == ["b", "d"]
+    assert select_features(cols, [0.05, 0.5, 0.05, 0.3, 0.1], keep=0.85) == ["b", "d", "e"]
+    assert select_features(cols, [0, 0, 0, 0, 0]) == cols
+
+
+def test_permutation_importance_for_models_without_impurity_importances():
+    from sklearn.linear_model import LogisticRegression
+    X, y = _data()
+    imp = feature_importances(LogisticRegression().fit(X, y), X, y, n_rows=1000)
+    assert imp.shape == (6,) and imp.argmax() == 0 and imp[1] > imp[2:].max()
@@ -0,0 +1,49 @@
+"""
+Checks that the flattened forest in `tree_engine.py` (scaler folded into the thresholds)
+returns the same probabilities as scaler.transform + RandomForestClassifier.predict_proba.
+
+Run from the project root:
+  python -m pytest tests/test_tree_engine.py
+"""
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from tree_engine import ForestEngine, flatten_forest, save_forest_arrays
+
+
+def _fit(max_depth, seed=0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(loc=[50, 80, 100, 30, 250], scale=[1, 5, 0.3, 2, 20], size=(2000, 5))
+    y = ((X[:, 0] - 50) + (X[:, 1] - 80) / 5 + rng.normal(0, 0.5, len(X)) > 1).astype(int)
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=25, max_depth=max_depth, random_state=seed).fit(scaler.transform(X), y)
+    X_new = rng.normal(loc=[50, 80, 100, 30, 250], scale=[1, 5, 0.3, 2, 20], size=(500, 5))
+    return model, scaler, X_new
+
+
+def test_matches_sklearn_with_scaler_folded():
+    for max_depth in (4, None):
+        model, scaler, X = _fit(max_depth)
+        expected = model.predict_proba(scaler.transform(X))[:, 1]
+        engine = ForestEngine.from_model(model, scaler)
+        np.testing.assert_allclose(engine.predict_proba(X), expected, atol=1e-12)
+        np.testing.assert_allclose(engine.predict_proba(X[0]), expected[:1], atol=1e-12)
+
+
+def test_saved_arrays_round_trip(tmp_path):
+    model, scaler, X = _fit(6)
+    save_forest_arrays(flatten_forest(model, scaler), tmp_path / "forest.npz")
+    engine = ForestEngine.load(tmp_path / "forest.npz")
+    np.testing.assert_allclose(engine.predict_proba(X), model.predict_proba(scaler.transform(X))[:, 1], atol=1e-12)
+
+
+def test_contributions_add_up_to_probability():
+    model, scaler, X = _fit(6)
+    engine = ForestEngine.from_model(model, scaler)
+    contrib, bias = engine.contributions(X[:50])
+    assert contrib.shape == (50, 5)
+    np.testing.assert_allclose(bias + contrib.sum(axis=1), engine.predict_proba(X[:50]), atol=1e-12)
+    # the label depends on features 0 and 1 only, so they carry most of the attribution
+    share = np.abs(contrib).sum(axis=0) / np.abs(contrib).sum()
+    assert share[:2].sum() > 0.8
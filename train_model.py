@@ -4,16 +4,30 @@ Orchestrates preprocessing, feature engineering, train/test split (by machine),
 and saves best model and scaler.
 """
 import argparse
+import math
+import shutil
+import tempfile
+import time
 import pandas as pd
 import numpy as np
 from pathlib import Path
-from sklearn.model_selection import GroupShuffleSplit, GridSearchCV
+from joblib import Parallel, delayed, effective_n_jobs
+from sklearn.model_selection import (GroupShuffleSplit, ParameterGrid, ParameterSampler, StratifiedGroupKFold,
+                                     StratifiedKFold)
+from sklearn.base import clone
 from sklearn.ensemble import RandomForestClassifier
+from sklearn.inspection import permutation_importance
 from sklearn.metrics import roc_auc_score, average_precision_score
 import joblib
 import os
-from preprocessing import load_data, basic_cleaning, scale_features
+from preprocessing import scale_features, load_data, basic_cleaning
 from features import create_rolling_features
+from feature_store import load_features
+from model_bundle import write_bundle
+from model_backends import BACKENDS, fit_boosting, dump_model
+from tree_engine import ForestEngine
+from utils import peak_rss_mb
+from datetime import datetime, timezone
 
 def split_by_machine(df, test_size=0.2, random_state=42):
     machines = df['machine_id'].unique()
@@ -25,25 +39,265 @@ def split_by_machine(df, test_size=0.2, random_state=42):
     test_df = df[df['machine_id'].isin(test_machines)].reset_index(drop=True)
     return train_df, test_df
 
-def prepare_data(path, target_horizon=5):
-    df_raw = load_data(path)
-    df_clean = basic_cleaning(df_raw)
-    df_feat = create_rolling_features(df_clean, window_sizes=[5,10,20], lag_features=[1,3,5], target_horizon=target_horizon)
+def prepare_data(path, target_horizon=5, use_cache=True):
+    # cached by input file hash + feature parameters, shared with the evaluation/analysis scripts
+    df_feat = load_features(path, window_sizes=[5,10,20], lag_features=[1,3,5], target_horizon=target_horizon, use_cache=use_cache)
     return df_feat
 
-def train_and_select_model(X_train, y_train):
-    # baseline: RandomForest with GridSearch
-    rf = RandomForestClassifier(random_state=42, n_jobs=-1)
-    param_grid = {
-        "n_estimators": [100, 200],
-        "max_depth": [10, 20, None],
-        "min_samples_split": [2, 5],
-    }
-    grid = GridSearchCV(rf, param_grid, cv=3, scoring="roc_auc", n_jobs=-1, verbose=1)
-    grid.fit(X_train, y_train)
-    best = grid.best_estimator_
-    print("Best params:", grid.best_params_)
-    return best, grid
+# wider space for the budgeted search; the grid below is a 12-point corner of it
+SEARCH_SPACE = {
+    "n_estimators": [50, 100, 200, 400],
+    "max_depth": [8, 10, 14, 20, None],
+    "min_samples_split": [2, 5, 10],
+    "min_samples_leaf": [1, 2, 4, 8],
+    "max_features": ["sqrt", "log2", 0.3, 0.5],
+    "class_weight": [None, "balanced", "balanced_subsample"],
+}
+PARAM_GRID = {
+    "n_estimators": [100, 200],
+    "max_depth": [10, 20, None],
+    "min_samples_split": [2, 5],
+}
+
+class SearchResult:
+    """
+    What main() needs from a search: best_params_, best_score_ (mean grouped-CV ROC-AUC),
+    per-candidate history and the peak RSS of every worker process that fitted a fold.
+    """
+
+    def __init__(self, best_params_, best_score_, history, elapsed, worker_peak_rss_mb=None):
+        self.best_params_ = best_params_
+        self.best_score_ = best_score_
+        self.history = history
+        self.elapsed = elapsed
+        self.worker_peak_rss_mb = worker_peak_rss_mb or {}
+
+class SharedTrainingData:
+    """
+    The training matrix (float32, the dtype the trees split on), labels, machine codes and a row order,
+    written once as .npy files that every CV worker memory-maps read-only. Tasks only carry the
+    directory name, so nothing proportional to the data is pickled per fold, and the matrix pages
+    are shared through the page cache (tmpfs under /dev/shm where available) however many workers run.
+    """
+
+    def __init__(self, X, y, groups=None, random_state=42, dir=None):
+        if dir is None and os.path.isdir("/dev/shm"):
+            dir = "/dev/shm"
+        self.path = tempfile.mkdtemp(prefix="pm_cv_", dir=dir)
+        y = np.asarray(y).astype(np.int8)
+        np.save(os.path.join(self.path, "X.npy"), np.asarray(X, dtype=np.float32))
+        np.save(os.path.join(self.path, "y.npy"), y)
+        if groups is not None:
+            np.save(os.path.join(self.path, "groups.npy"), pd.factorize(np.asarray(groups))[0].astype(np.int32))
+        np.save(os.path.join(self.path, "order.npy"), _stratified_order(y, random_state))
+        self.n_rows = len(y)
+
+    def close(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _stratified_order(y, random_state):
+    # one fixed shuffle with the classes interleaved by rank, so every prefix has the overall class balance
+    # and each halving rung's rows extend the previous rung's
+    rng = np.random.default_rng(random_state)
+    classes = np.unique(y)
+    order = np.concatenate([rng.permutation(np.flatnonzero(y == c)) for c in classes])
+    rank = np.concatenate([np.arange((y == c).sum()) / max((y == c).sum(), 1) for c in classes])
+    return order[np.argsort(rank, kind="stable")].astype(np.int64)
+
+_shared_cache = {}
+
+def _open_shared(path):
+    data = _shared_cache.get(path)
+    if data is None:
+        data = {k: np.load(os.path.join(path, f"{k}.npy"), mmap_mode="r")
+                for k in ("X", "y", "groups", "order") if os.path.exists(os.path.join(path, f"{k}.npy"))}
+        _shared_cache.clear()  # one search at a time per worker
+        _shared_cache[path] = data
+    return data
+
+def _grouped_folds(data, n_rows, n_splits, random_state):
+    rows = np.sort(data["order"][:n_rows])
+    y = data["y"][rows]
+    if "groups" not in data:
+        cv = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+        return rows, [(rows[tr], rows[va]) for tr, va in cv.split(rows, y)]
+    # machine-grouped folds (no machine on both sides), stratified so rare failures reach every fold
+    cv = StratifiedGroupKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    return rows, [(rows[tr], rows[va]) for tr, va in cv.split(rows, y, data["groups"][rows])]
+
+def _fit_fold(path, params, n_rows, fold, n_splits, random_state):
+    """Fit one candidate on one grouped fold of the shared matrix; runs inside a joblib worker."""
+    start = time.perf_counter()
+    data = _open_shared(path)
+    _, folds = _grouped_folds(data, n_rows, n_splits, random_state)
+    tr, va = folds[fold]
+    X, y = data["X"], data["y"]
+    model = RandomForestClassifier(random_state=random_state, n_jobs=1, **params).fit(X[tr], y[tr])
+    yv = np.asarray(y[va])
+    score = roc_auc_score(yv, model.predict_proba(X[va])[:, 1]) if len(np.unique(yv)) > 1 else np.nan
+    return score, time.perf_counter() - start, os.getpid(), peak_rss_mb()
+
+def grouped_cv_scores(shared, candidates, n_rows=None, n_splits=3, n_jobs=-1, random_state=42, rss=None):
+    """
+    Mean ROC-AUC of each parameter setting over machine-grouped folds of the first `n_rows` rows
+    (in the shared stratified order), fitting candidate x fold tasks in parallel.
+    rss: dict updated with {worker pid: peak RSS in MB}.
+    returns list of (score, seconds) in candidate order; seconds is the summed fit time of the candidate's folds
+    """
+    n_rows = shared.n_rows if n_rows is None else n_rows
+    out = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_fold)(shared.path, params, n_rows, fold, n_splits, random_state)
+        for params in candidates for fold in range(n_splits)
+    )
+    results = []
+    for i in range(len(candidates)):
+        folds = out[i * n_splits:(i + 1) * n_splits]
+        scores = [f[0] for f in folds]
+        results.append((float(np.nanmean(scores)) if not np.all(np.isnan(scores)) else np.nan,
+                        float(sum(f[1] for f in folds))))
+    if rss is not None:
+        for _, _, pid, mb in out:
+            rss[pid] = max(rss.get(pid, 0.0), mb or 0.0)
+    return results
+
+def _report_rss(rss):
+    if rss:
+        per_worker = ", ".join(f"{mb:.0f}" for mb in rss.values())
+        print(f"Peak RSS per CV worker (MB): {per_worker} (parent {peak_rss_mb():.0f})")
+
+def grid_search(X, y, groups=None, param_grid=PARAM_GRID, n_splits=3, n_jobs=-1, random_state=42):
+    """Exhaustive grouped-CV search over `param_grid`. Returns (model refit on all rows, SearchResult)."""
+    t0 = time.perf_counter()
+    candidates = list(ParameterGrid(param_grid))
+    rss = {}
+    print(f"Grid search: {len(candidates)} candidates x {n_splits} machine-grouped folds")
+    with SharedTrainingData(X, y, groups, random_state) as shared:
+        results = grouped_cv_scores(shared, candidates, n_splits=n_splits, n_jobs=n_jobs,
+                                    random_state=random_state, rss=rss)
+    history = []
+    for params, (score, seconds) in zip(candidates, results):
+        history.append({"rung": 0, "n_rows": len(y), "params": params, "roc_auc": score, "seconds": seconds})
+        print(f"  roc_auc {score:.4f} in {seconds:.1f}s  {params}")
+    best = max(history, key=lambda h: -np.inf if np.isnan(h["roc_auc"]) else h["roc_auc"])
+    model = RandomForestClassifier(random_state=random_state, n_jobs=-1, **best["params"]).fit(X, y)
+    _report_rss(rss)
+    return model, SearchResult(best["params"], best["roc_auc"], history, time.perf_counter() - t0, rss)
+
+def successive_halving_search(X, y, groups=None, n_candidates=32, factor=3, min_samples=2000, n_splits=3,
+                              time_budget_s=None, space=SEARCH_SPACE, n_jobs=-1, random_state=42):
+    """
+    Budgeted random search: sample `n_candidates` settings from `space`, score them all by grouped-CV
+    ROC-AUC on a small stratified subsample, keep the best 1/`factor` and repeat on `factor` times
+    more rows, until the survivors are scored on the full training set.
+    With `time_budget_s`, no new batch of candidates is started once the budget is spent; the best
+    setting from the deepest rung reached wins. Returns (model refit on all rows, SearchResult).
+    """
+    t0 = time.perf_counter()
+    n_jobs_eff = effective_n_jobs(n_jobs)
+    candidates = list(ParameterSampler(space, n_iter=n_candidates, random_state=random_state))
+    n_rungs = max(1, math.ceil(math.log(len(candidates), factor)) + 1)
+    history = []
+    rss = {}
+    survivors = candidates
+    best = None
+    with SharedTrainingData(X, y, groups, random_state) as shared:
+        for rung in range(n_rungs):
+            n_rows = len(y) if rung == n_rungs - 1 else min(len(y), int(min_samples * factor ** rung))
+            scored = []
+            # candidates go out in batches of one per worker so the time budget is checked between batches
+            for b in range(0, len(survivors), n_jobs_eff):
+                if history and time_budget_s is not None and time.perf_counter() - t0 > time_budget_s:
+                    print(f"Time budget of {time_budget_s:.0f}s reached in rung {rung}")
+                    break
+                batch = survivors[b:b + n_jobs_eff]
+                for params, (score, seconds) in zip(batch, grouped_cv_scores(
+                        shared, batch, n_rows, n_splits, n_jobs, random_state, rss)):
+                    history.append({"rung": rung, "n_rows": int(n_rows), "params": params, "roc_auc": score,
+                                    "seconds": seconds})
+                    print(f"  rung {rung} ({n_rows:,} rows): roc_auc {score:.4f} in {seconds:.1f}s  {params}")
+                    if not np.isnan(score):
+                        scored.append((score, params))
+            if not scored:
+                break
+            scored.sort(key=lambda sp: sp[0], reverse=True)
+            best = scored[0]
+            if len(scored) < len(survivors) or n_rows == len(y):
+                break
+            survivors = [p for _, p in scored[:max(1, math.ceil(len(scored) / factor))]]
+    if best is None:
+        raise ValueError("No candidate could be scored; does every fold contain both classes?")
+    best_score, best_params = best
+    model = RandomForestClassifier(random_state=random_state, n_jobs=-1, **best_params).fit(X, y)
+    elapsed = time.perf_counter() - t0
+    print(f"Successive halving: {len(history)} candidate evaluations in {elapsed:.1f}s")
+    _report_rss(rss)
+    return model, SearchResult(best_params, best_score, history, elapsed, rss)
+
+def train_and_select_model(X_train, y_train, groups=None, search="grid", time_budget_s=None, n_candidates=32, n_jobs=-1):
+    """
+    groups: machine_id per training row; CV folds never split a machine between fit and validation.
+    search="grid": exhaustive 3-fold search over the 12-point PARAM_GRID.
+    search="halving": successive halving over the wider SEARCH_SPACE (see successive_halving_search),
+    optionally capped at `time_budget_s` seconds.
+    """
+    if search == "halving":
+        best, result = successive_halving_search(X_train, y_train, groups, n_candidates=n_candidates,
+                                                 time_budget_s=time_budget_s, n_jobs=n_jobs)
+    else:
+        best, result = grid_search(X_train, y_train, groups, n_jobs=n_jobs)
+    print("Best params:", result.best_params_)
+    return best, result
+
+def train_boosting(X_train, y_train, groups, backend="hist", val_size=0.15, random_state=42):
+    """
+    Histogram gradient boosting (see model_backends.py) on float32 input, early-stopped on a validation
+    set of whole machines held out from the training rows. Returns (model, SearchResult-like summary).
+    """
+    t0 = time.perf_counter()
+    gss = GroupShuffleSplit(n_splits=1, test_size=val_size, random_state=random_state)
+    fit_idx, val_idx = next(gss.split(X_train, y_train, groups))
+    X = np.asarray(X_train, dtype=np.float32)
+    y = np.asarray(y_train)
+    model = fit_boosting(backend, X[fit_idx], y[fit_idx], X[val_idx], y[val_idx], random_state=random_state)
+    val_auc = roc_auc_score(y[val_idx], model.predict_proba(X[val_idx])[:, 1])
+    rounds = getattr(model, "n_iter_", None) or getattr(model, "best_iteration_", None) or getattr(model, "best_iteration", None)
+    params = {"backend": backend, "rounds": int(rounds) if rounds is not None else None}
+    print(f"{backend}: {params['rounds']} boosting rounds, validation roc_auc {val_auc:.4f} in {time.perf_counter() - t0:.1f}s")
+    return model, SearchResult(params, float(val_auc), [], time.perf_counter() - t0)
+
+def serving_latency_ms(model, scaler, X_raw, n=200):
+    """p50 / p99 single-row latency of the path serve_model uses for this model (flattened engine for forests)."""
+    if hasattr(model, "estimators_") and all(hasattr(e, "tree_") for e in model.estimators_):
+        engine = ForestEngine.from_model(model, scaler)
+        fn = engine.predict_proba
+    else:
+        fn = lambda row: model.predict_proba(scaler.transform(row))[:, 1]
+    X_raw = np.asarray(X_raw, dtype=np.float64)[:n]
+    fn(X_raw[:1])
+    lat = []
+    for i in range(len(X_raw)):
+        t = time.perf_counter()
+        fn(X_raw[i:i + 1])
+        lat.append((time.perf_counter() - t) * 1000)
+    return float(np.percentile(lat, 50)), float(np.percentile(lat, 99))
+
+def backend_report(name, model, scaler, train_seconds, X_test_raw, X_test_scaled, y_test):
+    p50, p99 = serving_latency_ms(model, scaler, X_test_raw)
+    return {"backend": name, "train_seconds": train_seconds, "model_mb": len(dump_model(model)) / 1e6,
+            "single_row_p50_ms": p50, "single_row_p99_ms": p99,
+            **evaluate_model_on_holdout(model, X_test_scaled, y_test)}
+
+def print_backend_reports(reports):
+    print(f"{'backend':>9} {'train s':>9} {'model MB':>9} {'p50 ms':>8} {'p99 ms':>8} {'roc_auc':>8} {'avg_prec':>8}")
+    for r in reports:
+        print(f"{r['backend']:>9} {r['train_seconds']:9.1f} {r['model_mb']:9.2f} {r['single_row_p50_ms']:8.3f} "
+              f"{r['single_row_p99_ms']:8.3f} {r['roc_auc']:8.4f} {r['avg_precision']:8.4f}")
 
 def evaluate_model_on_holdout(model, X_test, y_test):
     p_proba = model.predict_proba(X_test)[:, 1]
@@ -51,10 +305,73 @@ def evaluate_model_on_holdout(model, X_test, y_test):
     ap = average_precision_score(y_test, p_proba)
     return {"roc_auc": auc, "avg_precision": ap}
 
+def feature_importances(model, X, y, n_rows=5000, random_state=42):
+    """Impurity importances where the model has them, else permutation importance (ROC-AUC drop) on a row sample."""
+    imp = getattr(model, "feature_importances_", None)
+    if imp is not None:
+        return np.asarray(imp, dtype=float)
+    X = np.asarray(X)
+    y = np.asarray(y)
+    idx = np.random.default_rng(random_state).permutation(len(y))[:n_rows]
+    result = permutation_importance(model, X[idx], y[idx], scoring="roc_auc", n_repeats=3, random_state=random_state)
+    return np.clip(result.importances_mean, 0, None)
+
+def select_features(feature_cols, importances, keep=0.95):
+    """Smallest set of columns holding `keep` of the total importance, in their original order."""
+    importances = np.asarray(importances, dtype=float)
+    order = np.argsort(-importances, kind="stable")
+    total = importances.sum()
+    if total <= 0:
+        return list(feature_cols)
+    k = int(np.searchsorted(np.cumsum(importances[order]) / total, keep) + 1)
+    kept = set(order[:min(k, len(order))].tolist())
+    return [c for i, c in enumerate(feature_cols) if i in kept]
+
+def feature_build_seconds(data_path, columns, target_horizon=5):
+    """Rolling-feature build time for the full feature set and for `columns` only, on the training data."""
+    df = basic_cleaning(load_data(data_path))
+    t0 = time.perf_counter()
+    create_rolling_features(df, window_sizes=[5, 10, 20], lag_features=[1, 3, 5], target_horizon=target_horizon)
+    t1 = time.perf_counter()
+    create_rolling_features(df, window_sizes=[5, 10, 20], lag_features=[1, 3, 5], target_horizon=target_horizon,
+                            columns=columns)
+    return t1 - t0, time.perf_counter() - t1
+
+def prune_and_retrain(model, backend, X_train, X_train_scaled, y_train, X_test, X_test_scaled, y_test, groups, keep=0.95):
+    """
+    Drop the least important columns (keeping `keep` of the total importance) and refit the same
+    configuration on the rest: the forest with its searched parameters, a boosting backend with early
+    stopping again. Importances come from the training rows; the holdout only measures what was lost.
+    Returns (model, scaler, kept columns, pruned X_test_scaled, summary dict).
+    """
+    importances = feature_importances(model, X_train_scaled, y_train)
+    kept = select_features(X_train.columns.tolist(), importances, keep)
+    X_train_kept, X_test_kept, scaler = scale_features(X_train[kept], X_test[kept], scaler_path="models/scaler.pkl")
+    t0 = time.perf_counter()
+    if backend == "rf":
+        pruned = clone(model).fit(X_train_kept, y_train)
+    else:
+        pruned, _ = train_boosting(X_train_kept, y_train, groups, backend=backend)
+    train_seconds = time.perf_counter() - t0
+    before = evaluate_model_on_holdout(model, X_test_scaled, y_test)
+    after = evaluate_model_on_holdout(pruned, X_test_kept, y_test)
+    summary = {
+        "keep_importance": keep,
+        "features_before": int(X_train.shape[1]),
+        "features_after": len(kept),
+        "roc_auc_before": before["roc_auc"], "roc_auc_after": after["roc_auc"],
+        "roc_auc_lost": before["roc_auc"] - after["roc_auc"],
+        "avg_precision_before": before["avg_precision"], "avg_precision_after": after["avg_precision"],
+        "avg_precision_lost": before["avg_precision"] - after["avg_precision"],
+        "retrain_seconds": train_seconds,
+        "importance": {c: float(importances[i]) for i, c in enumerate(X_train.columns) if c in kept},
+    }
+    return pruned, scaler, kept, X_test_kept, summary
+
 def main(args):
     Path("models").mkdir(exist_ok=True)
     print("Preparing data...")
-    df_feat = prepare_data(args.data_path, target_horizon=args.horizon)
+    df_feat = prepare_data(args.data_path, target_horizon=args.horizon, use_cache=not args.no_cache)
     print("Splitting by machine for train/test")
     train_df, test_df = split_by_machine(df_feat, test_size=args.test_size)
     target_col = "failure_within_horizon"
@@ -69,22 +386,87 @@ def main(args):
     X_train_scaled, X_test_scaled, scaler = scale_features(X_train, X_test, scaler_path="models/scaler.pkl")
 
     # train
-    print("Training model with GridSearch...")
-    best_model, grid = train_and_select_model(X_train_scaled, y_train)
+    groups = train_df["machine_id"].to_numpy()
+    t_train = time.perf_counter()
+    if args.backend == "rf":
+        print(f"Training model ({args.search} search)...")
+        best_model, grid = train_and_select_model(X_train_scaled, y_train, groups=groups, search=args.search,
+                                                  time_budget_s=args.time_budget, n_candidates=args.n_candidates,
+                                                  n_jobs=args.n_jobs)
+    else:
+        print(f"Training {args.backend} gradient boosting with early stopping on held-out machines...")
+        best_model, grid = train_boosting(X_train_scaled, y_train, groups, backend=args.backend)
+    train_seconds = time.perf_counter() - t_train
     metrics = evaluate_model_on_holdout(best_model, X_test_scaled, y_test)
     print("Holdout metrics:", metrics)
+    reports = [backend_report(args.backend, best_model, scaler, train_seconds, X_test, X_test_scaled, y_test)]
+    if args.compare_rf and args.backend != "rf":
+        # untuned forest with the grid's usual winner, as a reference point
+        t0 = time.perf_counter()
+        rf = RandomForestClassifier(n_estimators=100, max_depth=20, random_state=42, n_jobs=-1).fit(X_train_scaled, y_train)
+        reports.append(backend_report("rf", rf, scaler, time.perf_counter() - t0, X_test, X_test_scaled, y_test))
+    pruning = None
+    feature_cols = X_train.columns.tolist()
+    if args.prune_importance:
+        print(f"Pruning to {args.prune_importance:.0%} of total feature importance and retraining...")
+        best_model, scaler, feature_cols, X_test_scaled, pruning = prune_and_retrain(
+            best_model, args.backend, X_train, X_train_scaled, y_train, X_test, X_test_scaled, y_test, groups,
+            keep=args.prune_importance)
+        metrics = evaluate_model_on_holdout(best_model, X_test_scaled, y_test)
+        pruning["feature_build_seconds_before"], pruning["feature_build_seconds_after"] = feature_build_seconds(
+            args.data_path, feature_cols, target_horizon=args.horizon)
+        reports.append(backend_report(f"{args.backend}-pruned", best_model, scaler, pruning["retrain_seconds"],
+                                      X_test[feature_cols], X_test_scaled, y_test))
+        print(f"Kept {pruning['features_after']} of {pruning['features_before']} features: roc_auc "
+              f"{pruning['roc_auc_before']:.4f} -> {pruning['roc_auc_after']:.4f} (lost {pruning['roc_auc_lost']:.4f}), "
+              f"feature build {pruning['feature_build_seconds_before']:.2f}s -> {pruning['feature_build_seconds_after']:.2f}s")
+    print_backend_reports(reports)
 
     # save model & metadata
     joblib.dump(best_model, "models/best_model.pkl")
     joblib.dump(metrics, "models/metrics.pkl")
     # also save column order
-    joblib.dump(X_train.columns.tolist(), "models/feature_columns.pkl")
-    print("Saved model, scaler, metrics, feature list under models/")
+    joblib.dump(feature_cols, "models/feature_columns.pkl")
+    # single memory-mappable bundle used by the server (model, scaler, features, metrics, metadata)
+    metadata = {
+        "trained_at": datetime.now(timezone.utc).isoformat(),
+        "data_path": str(args.data_path),
+        "horizon": args.horizon,
+        "test_size": args.test_size,
+        "window_sizes": [5, 10, 20],
+        "lag_features": [1, 3, 5],
+        "n_train": int(len(X_train)),
+        "n_test": int(len(X_test)),
+        "positives_train": int(y_train.sum()),
+        "backend": args.backend,
+        "search": args.search if args.backend == "rf" else "early_stopping",
+        "backend_reports": reports,
+        "best_params": grid.best_params_,
+        "cv_roc_auc": float(grid.best_score_),
+        "cv": "StratifiedGroupKFold(3) on machine_id" if args.backend == "rf" else "GroupShuffleSplit(0.15) on machine_id",
+        "cv_worker_peak_rss_mb": max(grid.worker_peak_rss_mb.values(), default=None),
+        "pruning": pruning,
+    }
+    write_bundle("models/model_bundle.pmb", best_model, scaler, feature_cols, metrics=metrics, metadata=metadata,
+                 backend=args.backend)
+    print("Saved model, scaler, metrics, feature list and model_bundle.pmb under models/")
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--data_path", default="machine_data_1000.csv")
     parser.add_argument("--test_size", type=float, default=0.2)
     parser.add_argument("--horizon", type=int, default=5, help="predict failure within next K cycles")
+    parser.add_argument("--no_cache", action="store_true", help="rebuild features instead of using the feature cache")
+    parser.add_argument("--search", choices=["grid", "halving"], default="grid",
+                        help="grid: 12-point GridSearchCV; halving: budgeted successive halving over a wider space")
+    parser.add_argument("--time_budget", type=float, default=None, help="wall-clock cap in seconds for --search halving")
+    parser.add_argument("--n_candidates", type=int, default=32, help="settings sampled by --search halving")
+    parser.add_argument("--n_jobs", type=int, default=-1, help="CV worker processes (-1: all cores)")
+    parser.add_argument("--backend", choices=BACKENDS, default="rf",
+                        help="rf: RandomForest + search; hist/lightgbm/xgboost: histogram boosting with early stopping")
+    parser.add_argument("--compare_rf", action="store_true",
+                        help="with a boosting backend, also fit a RandomForest and report both side by side")
+    parser.add_argument("--prune_importance", type=float, default=None,
+                        help="keep the fewest features holding this share of total importance (e.g. 0.95) and retrain")
     args = parser.parse_args()
     main(args)
\ No newline at end of file
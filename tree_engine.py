@@ -0,0 +1,204 @@
+"""
+tree_engine.py
+Array-based inference for the trained RandomForest, used by the serving path for small requests.
+
+`flatten_forest` packs every tree of the forest into contiguous node arrays (feature, threshold,
+left, right, leaf probability) and folds the StandardScaler into the split thresholds, so raw
+(unscaled) feature rows can be scored directly:  (x - mean) / scale <= t  <=>  x <= t * scale + mean.
+Leaves point back to themselves, so `ForestEngine` walks all trees for all rows in lock-step with a
+handful of numpy operations per tree level instead of sklearn's per-call dispatch.
+
+Usage:
+  python tree_engine.py --export      # write models/forest_arrays.npz from the saved model + scaler
+  python tree_engine.py --benchmark   # compare single-row latency (p50/p99) against sklearn
+"""
+import argparse
+import time
+from pathlib import Path
+import joblib
+import numpy as np
+
+FOREST_ARRAYS_PATH = "models/forest_arrays.npz"
+
+
+def flatten_forest(model, scaler=None):
+    """
+    model: fitted RandomForestClassifier / ExtraTreesClassifier (binary)
+    scaler: fitted StandardScaler applied before the model, folded into the thresholds (optional)
+    returns dict of contiguous arrays describing all trees
+    """
+    features, thresholds, lefts, rights, values, missing_left, roots = [], [], [], [], [], [], []
+    max_depth = 0
+    offset = 0
+    for est in model.estimators_:
+        t = est.tree_
+        n = t.node_count
+        leaf = t.children_left == -1
+        feat = np.where(leaf, 0, t.feature).astype(np.int32)
+        thr = t.threshold.astype(np.float64)
+        if scaler is not None:
+            scale = np.asarray(scaler.scale_ if scaler.scale_ is not None else np.ones(scaler.n_features_in_))
+            mean = np.asarray(scaler.mean_ if scaler.mean_ is not None else np.zeros(scaler.n_features_in_))
+            thr = thr * scale[feat] + mean[feat]
+        # leaves loop back onto themselves whatever the input, so every row can take the same number of steps
+        thr = np.where(leaf, np.inf, thr)
+        idx = np.arange(n, dtype=np.int32) + offset
+        left = np.where(leaf, idx, t.children_left + offset).astype(np.int32)
+        right = np.where(leaf, idx, t.children_right + offset).astype(np.int32)
+        counts = t.value[:, 0, :]
+        proba = counts / counts.sum(axis=1, keepdims=True)
+        mleft = getattr(t, "missing_go_to_left", np.zeros(n, dtype=np.uint8)).astype(bool)
+        features.append(feat)
+        thresholds.append(thr)
+        lefts.append(left)
+        rights.append(right)
+        values.append(proba[:, 1] if proba.shape[1] > 1 else np.zeros(n))
+        missing_left.append(mleft & ~leaf)
+        roots.append(offset)
+        max_depth = max(max_depth, est.get_depth())
+        offset += n
+    return {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "left": np.concatenate(lefts),
+        "right": np.concatenate(rights),
+        "value": np.concatenate(values),
+        "missing_left": np.concatenate(missing_left),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "max_depth": np.int32(max_depth),
+        "n_features": np.int32(model.n_features_in_),
+    }
+
+
+def save_forest_arrays(arrays, path=FOREST_ARRAYS_PATH):
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    np.savez(path, **arrays)
+
+
+def load_forest_arrays(path=FOREST_ARRAYS_PATH):
+    with np.load(path) as data:
+        return {k: data[k] for k in data.files}
+
+
+class ForestEngine:
+    """Scores raw feature rows with the flattened forest; returns the positive-class probability per row."""
+
+    def __init__(self, arrays):
+        self.feature = arrays["feature"]
+        self.threshold = arrays["threshold"]
+        self.left = arrays["left"]
+        self.right = arrays["right"]
+        self.value = arrays["value"]
+        self.missing_left = arrays["missing_left"]
+        self.roots = arrays["roots"]
+        self.max_depth = int(arrays["max_depth"])
+        self.n_features = int(arrays["n_features"])
+
+    @classmethod
+    def from_model(cls, model, scaler=None):
+        return cls(flatten_forest(model, scaler))
+
+    @classmethod
+    def load(cls, path=FOREST_ARRAYS_PATH):
+        return cls(load_forest_arrays(path))
+
+    def predict_proba(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features, the forest expects {self.n_features}")
+        rows = np.arange(len(X))[:, None]
+        node = np.broadcast_to(self.roots, (len(X), len(self.roots)))
+        has_nan = np.isnan(X).any()
+        for _ in range(self.max_depth):
+            x = X[rows, self.feature[node]]
+            go_left = x <= self.threshold[node]
+            if has_nan:
+                go_left |= np.isnan(x) & self.missing_left[node]
+            nxt = np.where(go_left, self.left[node], self.right[node])
+            if np.array_equal(nxt, node):
+                break
+            node = nxt
+        return self.value[node].mean(axis=1)
+
+    def contributions(self, X):
+        """
+        Path attribution (Saabas): on every tree's root-to-leaf path the change in positive-class
+        probability at each split is credited to the split's feature. Same lock-step walk as
+        predict_proba. returns (contributions (rows x features), bias) with
+        bias + contributions.sum(axis=1) == predict_proba(X).
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"X has {X.shape[1]} features, the forest expects {self.n_features}")
+        n, n_trees = len(X), len(self.roots)
+        rows = np.arange(n)[:, None]
+        node = np.broadcast_to(self.roots, (n, n_trees))
+        has_nan = np.isnan(X).any()
+        # one flat accumulator; (row, feature) pairs are summed with bincount instead of np.add.at
+        total = np.zeros(n * self.n_features)
+        for _ in range(self.max_depth):
+            feat = self.feature[node]
+            x = X[rows, feat]
+            go_left = x <= self.threshold[node]
+            if has_nan:
+                go_left |= np.isnan(x) & self.missing_left[node]
+            nxt = np.where(go_left, self.left[node], self.right[node])
+            if np.array_equal(nxt, node):
+                break
+            # leaves step onto themselves, so finished trees add zero
+            total += np.bincount((rows * self.n_features + feat).ravel(),
+                                 weights=(self.value[nxt] - self.value[node]).ravel(), minlength=n * self.n_features)
+            node = nxt
+        bias = float(self.value[self.roots].mean())
+        return total.reshape(n, self.n_features) / n_trees, bias
+
+
+def export_forest(model, scaler, path=FOREST_ARRAYS_PATH):
+    arrays = flatten_forest(model, scaler)
+    save_forest_arrays(arrays, path)
+    print(f"Saved flattened forest ({len(arrays['roots'])} trees, {len(arrays['feature'])} nodes) to {path}")
+    return arrays
+
+
+def benchmark(model, scaler, engine, n_features, n_iter=500, seed=0):
+    """Single-row latency of sklearn (scaler.transform + predict_proba) vs the array engine, in ms."""
+    rng = np.random.default_rng(seed)
+    X = scaler.mean_ + rng.standard_normal((n_iter, n_features)) * scaler.scale_
+    results = {}
+    for name, fn in [
+        ("sklearn", lambda row: model.predict_proba(scaler.transform(row))[:, 1]),
+        ("engine", lambda row: engine.predict_proba(row)),
+    ]:
+        fn(X[:1])  # warm-up
+        lat = np.empty(n_iter)
+        for i in range(n_iter):
+            t0 = time.perf_counter()
+            fn(X[i:i + 1])
+            lat[i] = (time.perf_counter() - t0) * 1000
+        results[name] = {"p50_ms": float(np.percentile(lat, 50)), "p99_ms": float(np.percentile(lat, 99))}
+    diff = np.abs(model.predict_proba(scaler.transform(X))[:, 1] - engine.predict_proba(X)).max()
+    results["max_abs_diff"] = float(diff)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model_path", default="models/best_model.pkl")
+    parser.add_argument("--scaler_path", default="models/scaler.pkl")
+    parser.add_argument("--out", default=FOREST_ARRAYS_PATH)
+    parser.add_argument("--export", action="store_true", help="flatten the saved model into --out")
+    parser.add_argument("--benchmark", action="store_true", help="compare single-row latency against sklearn")
+    parser.add_argument("--iterations", type=int, default=500)
+    args = parser.parse_args()
+    model = joblib.load(args.model_path)
+    scaler = joblib.load(args.scaler_path)
+    arrays = export_forest(model, scaler, args.out) if args.export else flatten_forest(model, scaler)
+    if args.benchmark:
+        res = benchmark(model, scaler, ForestEngine(arrays), int(arrays["n_features"]), n_iter=args.iterations)
+        for name in ("sklearn", "engine"):
+            print(f"{name:>8}: p50 {res[name]['p50_ms']:.3f} ms  p99 {res[name]['p99_ms']:.3f} ms")
+        print(f"max |p_sklearn - p_engine| = {res['max_abs_diff']:.2e}")
@@ -4,8 +4,13 @@ Common helper functions: persistence, basic metrics, logging
 """
 import joblib
 import json
+import sys
 from pathlib import Path
 import logging
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
 
 def save_json(obj, path):
     Path(path).parent.mkdir(parents=True, exist_ok=True)
@@ -25,4 +30,21 @@ def load_model(path):
 
 def get_logger(name="pm"):
     logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
-    return logging.getLogger(name)
\ No newline at end of file
+    return logging.getLogger(name)
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where the platform does not report it)."""
+    # Linux keeps ru_maxrss across fork/exec, so a worker would report its parent's peak; the
+    # high-water mark in /proc belongs to the process's own address space
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1e3
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes on Linux
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
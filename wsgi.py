@@ -3,6 +3,8 @@ WSGI entrypoint for production servers (gunicorn / waitress).
 
 This module exposes a Flask `app` object that production WSGI servers can use.
 It ensures model artifacts are loaded on import so the server is ready to serve requests.
+When models/model_bundle.pmb exists it is used instead of the pickles: its forest arrays are
+memory-mapped read-only, so every worker shares one copy through the page cache.
 """
 from serve_model import app, load_artifacts
 